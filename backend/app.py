@@ -1,36 +1,302 @@
-from flask import Flask, jsonify, request
+# Imported first, so the startup report times every other import
+import startup
+from flask import Flask, Response, jsonify, request
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
-import ee
-import json
 from datetime import datetime
+import json
+import logging
+import math
 import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+
+from cache import CURRENT_YEAR_TTL, DEFAULT_CACHE_PATH, ResultCache, cache_key, ttl_for_year
+import ee_client
+import logs
+import metrics
+import rules
+from ee_client import call_count, reset_call_count
+from ee_health import EEHealth
+from geometry import ZOOM_LEVELS, build_topology, snap_zoom
+from http_cache import ResponseCache, format_timestamp, set_freshness
+from jobs import JobQueue
+from ee_engine import CATCHMENT_BUFFER_M, INDEX_BANDS
+from lake_registry import LakeRegistry
+from periods import annual_period, check_years, data_years, granularity_name, is_final, periods_between
+from revalidate import RefreshPending, Revalidator
+from scheduler import PrecomputeScheduler
+from singleflight import SingleFlight
+from streaming import stream_format, stream_response
+from timeseries_store import DEFAULT_TIMESERIES_PATH, TimeSeriesStore
+from vector_tiles import MAX_ZOOM, TileSource
+
+logs.configure()
+log = logging.getLogger('neer.app')
+startup.checkpoint('imports')
+
+# The Earth Engine client takes seconds to import; nothing needs it before
+# the first computation or the background initialization
+ee = startup.lazy_import('ee')
+
+def request_route():
+    """Route pattern of the current request (low-cardinality metrics label)"""
+    rule = request.url_rule if request else None
+    return rule.rule if rule is not None else 'unmatched'
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON encoding, timed per request and route"""
+
+    def dumps(self, obj, **kwargs):
+        started = time.perf_counter()
+        try:
+            return super().dumps(obj, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - started
+            logs.add_timing('serialize', elapsed * 1000)
+            metrics.JSON_SERIALIZE_SECONDS.observe(elapsed, route=request_route())
 
 app = Flask(__name__)
-CORS(app)
+app.json = TimedJSONProvider(app)
+# Browsers only let the dashboard read response headers that are listed here
+CORS(app, expose_headers=['X-Data-As-Of', 'X-Data-Stale', 'X-Request-ID'])
+
+# Serialized, pre-compressed response bodies with ETags
+response_cache = ResponseCache(max_entries=int(os.environ.get('NEER_RESPONSE_CACHE_SIZE', 256)))
+
+# Where reductions run: 'ee' (Google Earth Engine) or 'local' (NumPy on
+# composites exported to disk, see local_engine)
+ENGINE = os.environ.get('NEER_ENGINE', 'ee').lower()
+if ENGINE == 'local':
+    import local_engine as engine
+else:
+    import ee_engine as engine
+
+# Shared result cache (in-process LRU + SQLite on disk)
+result_cache = ResultCache(
+    path=os.environ.get('NEER_CACHE_PATH', DEFAULT_CACHE_PATH),
+    max_entries=int(os.environ.get('NEER_CACHE_SIZE', 512))
+)
+
+# Endpoint payloads are served from the result cache, stale ones while they
+# refresh in the background, so requests never wait on the engine for long
+revalidator = Revalidator(result_cache, on_refresh=response_cache.discard)
+
+# How long (seconds) a stale response is reused before the result cache is checked again
+STALE_RESPONSE_TTL = 30
+
+# Serve mock data when no real result is available (otherwise such requests get a 503)
+DEMO_MODE = os.environ.get('NEER_DEMO_MODE', '0') == '1'
+
+# Per-lake index observations, read by history and alerts with range scans
+timeseries = TimeSeriesStore(
+    path=os.environ.get('NEER_TIMESERIES_PATH', DEFAULT_TIMESERIES_PATH),
+    engine=engine.NAME
+)
+startup.checkpoint('caches')
+
+# Periods reduced per engine call when filling a time series
+PERIOD_BATCH_SIZE = int(os.environ.get('NEER_PERIOD_BATCH_SIZE', 24))
+
+# Time series kept up to date by background precomputation
+INGEST_GRANULARITIES = [
+    name.strip() for name in os.environ.get('NEER_INGEST_GRANULARITIES', 'annual,monthly').split(',')
+    if name.strip()
+]
 
 # Initialize Google Earth Engine
-def initialize_earth_engine():
-    """Initialize Google Earth Engine with proper authentication"""
+def initialize_earth_engine(interactive=True):
+    """Initialize Google Earth Engine with proper authentication.
+
+    Only interactive initialization may prompt (ee.Authenticate), so it is
+    reserved for the development server on a terminal.
+    """
+    with startup.phase('ee_initialize'):
+        return _initialize_earth_engine(interactive)
+
+def _initialize_earth_engine(interactive):
     try:
         # Try to initialize with service account
         ee.Initialize(project='neer2025')
-        print("Google Earth Engine initialized successfully with existing credentials")
+        log.info("Google Earth Engine initialized successfully with existing credentials")
         return True
     except Exception as e:
-        print(f"Standard initialization failed: {e}")
+        log.warning("Standard initialization failed: %s", e)
+        if not interactive:
+            return False
         try:
             # Try to authenticate interactively
             ee.Authenticate()
             ee.Initialize(project='neer2025')
-            print("Google Earth Engine initialized successfully after authentication")
+            log.info("Google Earth Engine initialized successfully after authentication")
             return True
         except Exception as auth_error:
-            print(f"Earth Engine authentication failed: {auth_error}")
-            print("Will use mock data as fallback")
+            log.error("Earth Engine authentication failed, will serve cached results only: %s", auth_error)
             return False
 
-# Global variable to track EE status
-EE_INITIALIZED = initialize_earth_engine()
+# Shared EE availability, fed by the outcome of every real call. Background
+# probes re-initialize non-interactively, so they can never block on a prompt.
+# Earth Engine itself is initialized per process, in the background, by create_app().
+ee_health = EEHealth(
+    probe=lambda: ee.Number(1).getInfo(),
+    initialize=lambda: initialize_earth_engine(interactive=False),
+    initialized=False
+)
+ee_client.set_health_monitor(ee_health)
+
+def engine_available():
+    """Whether endpoints can compute real data right now (the local engine always can)"""
+    return engine.NAME == 'local' or ee_health.available()
+
+def engine_unavailable_reason():
+    return 'initializing' if ee_health.initializing else 'engine_unavailable'
+
+# Set once create_app() has finished starting up, Earth Engine initialization included
+startup_finished = threading.Event()
+
+# Lakes are parsed once here and shared by every endpoint
+lake_registry = LakeRegistry()
+startup.checkpoint('lake_registry')
+
+@app.before_request
+def start_ee_call_count():
+    reset_call_count()
+    logs.start_request(request.headers.get('X-Request-ID'))
+
+@app.after_request
+def report_ee_call_count(response):
+    """Expose how many Earth Engine round trips the request needed"""
+    response.headers['X-EE-Calls'] = str(call_count())
+    return response
+
+@app.after_request
+def record_request(response):
+    """Request latency metrics, the request id header and the slow request log.
+
+    Streamed bodies are produced after this, so their time is not included.
+    """
+    timings = logs.current_timings()
+    if timings is None:
+        return response
+    elapsed_ms = timings.elapsed_ms()
+    route = request_route()
+    metrics.HTTP_REQUEST_SECONDS.observe(
+        elapsed_ms / 1000, method=request.method, route=route, status=response.status_code
+    )
+    response.headers['X-Request-ID'] = logs.request_id()
+    if logs.SLOW_REQUEST_MS and elapsed_ms > logs.SLOW_REQUEST_MS:
+        log.warning("Slow request %s %s took %.0f ms", request.method, request.full_path.rstrip('?'), elapsed_ms, extra={
+            'fields': {
+                'route': route,
+                'status': response.status_code,
+                'total_ms': round(elapsed_ms, 1),
+                'ee_calls': call_count(),
+                **timings.breakdown()
+            }
+        })
+    return response
+
+def mock_fallback(endpoint, reason, error=None):
+    """Count and log a response served from mock data (demo mode), and why"""
+    metrics.MOCK_FALLBACKS.inc(endpoint=endpoint, reason=reason)
+    logs.note('mock_fallback', reason)
+    if error is not None:
+        log.warning("Serving mock data for %s: %s", endpoint, error, exc_info=error,
+                    extra={'fields': {'endpoint': endpoint, 'reason': reason}})
+    else:
+        log.info("Serving mock data for %s: %s", endpoint, reason,
+                 extra={'fields': {'endpoint': endpoint, 'reason': reason}})
+
+def error_reason(error):
+    return type(error).__name__
+
+UNAVAILABLE_MESSAGES = {
+    'engine_unavailable': "Earth Engine is unavailable and no earlier result is cached",
+    'initializing': "Earth Engine is still initializing and no earlier result is cached",
+    'deadline': "The result is still being computed",
+    'no_data': "No data is available for this request yet"
+}
+
+def unavailable(endpoint, reason, mock, error=None):
+    """Response when there is no result to serve: mock() in demo mode, otherwise a 503 to retry later"""
+    if DEMO_MODE:
+        mock_fallback(endpoint, reason, error)
+        return mock()
+    metrics.UNAVAILABLE_RESPONSES.inc(endpoint=endpoint, reason=reason)
+    logs.note('unavailable', reason)
+    fields = {'endpoint': endpoint, 'reason': reason}
+    if error is not None:
+        log.warning("No result for %s: %s", endpoint, error, exc_info=error, extra={'fields': fields})
+    else:
+        log.info("No result for %s: %s", endpoint, reason, extra={'fields': fields})
+    # A refresh past its deadline keeps running and initialization is under way,
+    # so both are worth retrying soon
+    retry_after = 5 if reason in ('deadline', 'initializing') else int(ee_health.reset_timeout)
+    response = jsonify({'error': UNAVAILABLE_MESSAGES.get(reason, "Computing the result failed"), 'reason': reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+def note_stale(endpoint):
+    metrics.STALE_RESPONSES.inc(endpoint=endpoint)
+    logs.note('stale', True)
+
+def response_ttl(served):
+    """How long the response for a served payload can be reused"""
+    if served.stale:
+        return STALE_RESPONSE_TTL
+    if served.expires_at is None:
+        return None
+    return max(1, served.expires_at - time.time())
+
+def serve(endpoint, key, compute, ttl, mock, keep=bool):
+    """Response with the payload cached under key.
+
+    Fresh payloads are served as is and stale ones while compute() refreshes
+    them in the background; a payload never computed before is computed,
+    waiting at most the refresh deadline. Only values passing keep() are
+    cached. Without a result, see unavailable().
+    """
+    entry = response_cache.get(key)
+    if entry is None:
+        try:
+            served = revalidator.get(key, compute, ttl, keep, refresh=engine_available())
+        except RefreshPending:
+            return unavailable(endpoint, 'deadline', mock)
+        except Exception as e:
+            return unavailable(endpoint, error_reason(e), mock, e)
+        if served is None:
+            return unavailable(endpoint, engine_unavailable_reason(), mock)
+        if not served.value:
+            return unavailable(endpoint, 'no_data', mock)
+        if not served.cached:
+            return set_freshness(jsonify(served.value), served.as_of)
+        entry = response_cache.put(key, served.value, ttl=response_ttl(served), as_of=served.as_of, stale=served.stale)
+    if entry.stale:
+        note_stale(endpoint)
+    return response_cache.respond(entry)
+
+def stream_cached(fmt, endpoint, key, compute, ttl, live, event, mock, field=None):
+    """Streamed response with the payload cached under key, or live() events if there is none.
+
+    A stale payload is streamed while compute() refreshes it. Records are
+    the payload itself, or its field; the rest of it ends the stream.
+    """
+    available = engine_available()
+    served = revalidator.cached(key, compute, ttl, refresh=available)
+    if served is not None:
+        if served.stale:
+            note_stale(endpoint)
+        response = stream_payload(fmt, served.value, event, field, as_of=format_timestamp(served.as_of), stale=served.stale)
+        return set_freshness(response, served.as_of, served.stale)
+    if available:
+        return stream_response(fmt, live())
+    return unavailable(endpoint, engine_unavailable_reason(), mock)
 
 @app.route('/')
 def home():
@@ -39,15 +305,30 @@ def home():
 
 @app.route('/health')
 def health_check():
-    """Health check endpoint"""
+    """Liveness check: the process is up and serving (it may still be starting)"""
     return jsonify({"status": "healthy", "timestamp": datetime.now().isoformat()})
 
+@app.route('/ready')
+def readiness_check():
+    """Readiness check: 200 once startup, Earth Engine initialization included, has finished; 503 before"""
+    ready = startup_finished.is_set()
+    payload = {
+        "status": "ready" if ready else "starting",
+        "engine": engine.NAME,
+        "earth_engine": ee_health.status() if engine.NAME == 'ee' else None,
+        "lakes": len(lake_registry),
+        "startup": startup.report(),
+        "timestamp": datetime.now().isoformat()
+    }
+    return jsonify(payload), 200 if ready else 503
+
 @app.route('/api/test')
 def test_endpoint():
     """Test endpoint without Earth Engine"""
     return jsonify({
         "message": "API is working",
-        "lakes_available": ["Ukkadam", "Valankulam", "Kurichi", "Perur", "Singanallur"],
+        "lakes_available": [lake.name for lake in lake_registry],
+        "lake_count": len(lake_registry),
         "status": "success"
     })
 
@@ -70,17 +351,6 @@ def get_mock_lakes():
             'waterHealth': 'Poor',
             'pollutionCauses': 'High sediment, algal bloom',
             'suggestions': 'Reduce catchment erosion, limit nutrient runoff',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Ukkadam"},
-                    "geometry": {
-                        "coordinates": [[[76.96095638648234, 10.988575303133587], [76.96051032283168, 10.988737482780266], [76.95813131669479, 10.9880238916666], [76.96095638648234, 10.988575303133587]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -96,17 +366,6 @@ def get_mock_lakes():
             'waterHealth': 'Moderate',
             'pollutionCauses': 'Minor algal growth',
             'suggestions': 'Monitor nutrient levels',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Valankulam"},
-                    "geometry": {
-                        "coordinates": [[[76.95, 10.97], [76.96, 10.97], [76.96, 10.98], [76.95, 10.98], [76.95, 10.97]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -122,136 +381,185 @@ def get_mock_lakes():
             'waterHealth': 'Good',
             'pollutionCauses': 'No major issues',
             'suggestions': 'Continue current management',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Kurichi"},
-                    "geometry": {
-                        "coordinates": [[[76.94, 10.99], [76.95, 10.99], [76.95, 11.00], [76.94, 11.00], [76.94, 10.99]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         }
     ]
     
     return jsonify(mock_lakes)
 
-def load_lakes_from_files():
-    """Load all lake geometries from GeoJSON files"""
-    lakes = {}
-    
-    # Ukkadam geometry (hardcoded from your original code)
-    ukkadam_geojson = {
-        "type": "FeatureCollection",
-        "features": [{
-            "type": "Feature",
-            "properties": {"name": "Ukkadam"},
-            "geometry": {
-                "coordinates": [[[76.96095638648234, 10.988575303133587], 
-                               [76.96051032283168, 10.988737482780266],
-                               [76.95813131669479, 10.9880238916666], 
-                               [76.95646270822363, 10.987018373985165],
-                               [76.9540010977073, 10.985866889852815], 
-                               [76.9518864255856, 10.985218164418924],
-                               [76.9500856501075, 10.984958673846393], 
-                               [76.94997000397598, 10.983920709273917],
-                               [76.94919352280618, 10.983223324777526], 
-                               [76.94821879112538, 10.982947614174023],
-                               [76.94826835375284, 10.98236375557407], 
-                               [76.94702928805697, 10.981925860866397],
-                               [76.94699624630488, 10.980417551902818], 
-                               [76.9468640792968, 10.9802391492576],
-                               [76.94574065973245, 10.980222930829356], 
-                               [76.94504678294214, 10.980093183376937],
-                               [76.94524503345434, 10.979120075661697], 
-                               [76.94600499374752, 10.9791038571732],
-                               [76.9466327870337, 10.978730831677623], 
-                               [76.94874745915558, 10.978925453734405],
-                               [76.94957350295277, 10.979249823542816], 
-                               [76.95020129623902, 10.979055201699836],
-                               [76.95033346324595, 10.97866595763135], 
-                               [76.95153948719098, 10.97843889835319],
-                               [76.95226640573219, 10.978649739116705], 
-                               [76.95350547142806, 10.978682176143948],
-                               [76.95411674383888, 10.97847133540364], 
-                               [76.95580187318546, 10.978422679827219],
-                               [76.95813131669479, 10.977952342171605], 
-                               [76.95958515377828, 10.978714613167696],
-                               [76.96034511407152, 10.979266042023383], 
-                               [76.96084074034962, 10.97997965430892],
-                               [76.96128680400022, 10.983077360372121], 
-                               [76.96130332487684, 10.984974892013383],
-                               [76.96117115786876, 10.985493872901799], 
-                               [76.9612702831248, 10.986029070987911],
-                               [76.96095638648234, 10.988575303133587]]],
-                "type": "Polygon"
-            }
-        }]
+def observation(period, stats):
+    """Time series observation for one period of engine stats"""
+    stats = dict(stats)
+    image_count = stats.pop('image_count', None)
+    return {
+        'period': period.key,
+        'start': period.start,
+        'end': period.end,
+        'stats': stats,
+        'bod': float(rules.bod(stats['NDWI'])) if stats.get('NDWI') is not None else None,
+        'final': is_final(period),
+        'metadata': {'image_count': image_count} if image_count is not None else {}
     }
+
+# Engine reductions in flight, keyed by engine, reduction, lake and composite
+# period, so concurrent requests for the same lakes and periods share them
+engine_flight = SingleFlight()
+
+def lake_means(lakes, year):
+    """engine.lake_means, waiting for lakes whose reduction for the year is already in flight.
+
+    The other lakes are reduced in the engine's batches, concurrently.
+    """
+    by_key = {(engine.NAME, 'lake_means', lake.cache_id, year): lake for lake in lakes}
     
-    lakes["Ukkadam"] = ee.FeatureCollection(ukkadam_geojson)
+    def compute(keys):
+        stats_by_lake = {}
+        batches = engine.lake_batches([by_key[key] for key in keys])
+        for computed in ee_client.map_concurrently(lambda batch: engine.lake_means(batch, year), batches):
+            stats_by_lake.update(computed)
+        return {key: stats_by_lake.get(by_key[key].id) for key in keys}
     
-    # Load other lakes from files
-    lake_files = {
-        "Valankulam": "geojson_files/valankulam(includes chinna kulam).geojson",
-        "Kurichi": "geojson_files/Kurichi kulam.geojson",
-        "Perur": "geojson_files/Perur lake.geojson",
-        "Singanallur": "geojson_files/Singanallur lake.geojson"
+    results = engine_flight.do_many(by_key, compute)
+    return {lake.id: results[key] for key, lake in by_key.items() if results[key] is not None}
+
+def period_means(lake, periods):
+    """engine.period_means, waiting for periods of the lake that are already in flight"""
+    by_key = {(engine.NAME, 'period_means', lake.cache_id, p.start, p.end): p for p in periods}
+    
+    def compute(keys):
+        computed = engine.period_means(lake, [by_key[key] for key in keys])
+        return {key: computed.get(by_key[key].key) for key in keys}
+    
+    results = engine_flight.do_many(by_key, compute)
+    return {p.key: results[key] for key, p in by_key.items() if results[key] is not None}
+
+def lake_period_means(lakes, periods):
+    """engine.lake_period_means, waiting for lakes and periods already in flight (here or in period_means).
+
+    Lakes left missing the same periods share engine calls.
+    """
+    by_key = {
+        (engine.NAME, 'period_means', lake.cache_id, p.start, p.end): (lake, p)
+        for lake in lakes for p in periods
     }
     
-    for lake_name, filename in lake_files.items():
-        if os.path.exists(filename):
-            try:
-                with open(filename, 'r') as f:
-                    geojson_data = json.load(f)
-                    lakes[lake_name] = ee.FeatureCollection(geojson_data)
-            except Exception as e:
-                print(f"Error loading {lake_name}: {str(e)}")
-                continue
+    def compute(keys):
+        periods_by_lake = {}
+        for key in keys:
+            lake, period = by_key[key]
+            periods_by_lake.setdefault(lake.id, (lake, []))[1].append(period)
+        groups = {}
+        for lake, lake_periods in periods_by_lake.values():
+            groups.setdefault(tuple(lake_periods), []).append(lake)
+        stats_by_lake = {}
+        for group_periods, group_lakes in groups.items():
+            for batch, batch_periods in engine.lake_period_batches(group_lakes, list(group_periods), PERIOD_BATCH_SIZE):
+                stats_by_lake.update(engine.lake_period_means(batch, batch_periods))
+        return {key: stats_by_lake.get(by_key[key][0].id, {}).get(by_key[key][1].key) for key in keys}
     
-    return lakes
-
-def compute_indices(image):
-    """Compute all water quality indices"""
-    ndwi = image.normalizedDifference(['B3', 'B8']).rename('NDWI')
-    ndci = image.normalizedDifference(['B5', 'B4']).rename('NDCI')
-    fai = image.expression(
-        '(B8 - B4) / (B8 + B4)',
-        {'B8': image.select('B8'), 'B4': image.select('B4')}
-    ).rename('FAI')
-    mci = image.expression(
-        'B5 - B4 - (B6 - B4) * ((705 - 665) / (740 - 665))',
-        {'B5': image.select('B5'), 'B4': image.select('B4'), 'B6': image.select('B6')}
-    ).rename('MCI')
-    turbidity = image.select(['B2', 'B3', 'B4']).reduce(ee.Reducer.mean()).rename('Turbidity')
-    swir_ratio = image.select('B11').divide(image.select('B12')).rename('SWIR_Ratio')
-    return image.addBands([ndwi, ndci, fai, mci, turbidity, swir_ratio])
-
-def classify_pollution(values):
-    """Classify pollution causes and generate suggestions"""
-    reasons = []
-    suggestions = []
-
-    if values.get('FAI', 0) > 0.05:
-        reasons.append("Algal bloom")
-        suggestions.append("Limit nutrient runoff")
-
-    if values.get('NDWI', 0) < 0.2:
-        reasons.append("Water scarcity")
-        suggestions.append("Increase water inflow")
-
-    if values.get('SWIR_Ratio', 0) > 1.5:
-        reasons.append("Chemical or sediment pollution")
-        suggestions.append("Investigate industrial discharges")
-
-    if values.get('Turbidity', 0) > 1000:
-        reasons.append("High sediment or garbage dumping")
-        suggestions.append("Reduce catchment erosion / waste dumping")
-
-    return ", ".join(reasons) or "No major issues", ", ".join(set(suggestions)) or "No action needed"
+    results = engine_flight.do_many(by_key, compute)
+    stats_by_lake = {lake.id: {} for lake in lakes}
+    for key, (lake, p) in by_key.items():
+        if results[key] is not None:
+            stats_by_lake[lake.id][p.key] = results[key]
+    return stats_by_lake
+
+def compute_period_stats(lake, granularity, periods):
+    """Compute periods with one engine call (a single getInfo on Earth Engine) and store them"""
+    computed = period_means(lake, periods)
+    # Empty stats mean the engine has no data at all (e.g. no local
+    # composite yet), so nothing is stored and the period is retried
+    timeseries.upsert(lake, granularity, [
+        observation(p, computed[p.key]) for p in periods if computed.get(p.key)
+    ])
+    stats_by_period = {}
+    for p in periods:
+        stats = computed.get(p.key) or {}
+        stats_by_period[p.key] = {band: stats[band] for band in INDEX_BANDS if band in stats}
+    return stats_by_period
+
+def compute_lake_period_stats(lakes, granularity, periods):
+    """Compute periods of several lakes with one engine call per batch and store them"""
+    computed = lake_period_means(lakes, periods)
+    timeseries.upsert_many(granularity, [
+        (lake, observation(p, computed[lake.id][p.key])) for lake in lakes for p in periods
+        if computed[lake.id].get(p.key)
+    ])
+    stats_by_lake = {}
+    for lake in lakes:
+        stats_by_lake[lake.id] = {}
+        for p in periods:
+            stats = computed[lake.id].get(p.key) or {}
+            stats_by_lake[lake.id][p.key] = {band: stats[band] for band in INDEX_BANDS if band in stats}
+    return stats_by_lake
+
+def iter_period_stats(lake, granularity, periods, max_age=CURRENT_YEAR_TTL):
+    """(period, stats) for each period in order, computing only periods missing from the store.
+
+    Stored periods come from one range scan of the time series store.
+    Missing ones (new, recomputed with other maths, or not final and older
+    than max_age) are computed when first reached, PERIOD_BATCH_SIZE at a
+    time, so the leading periods can be used before later batches finish.
+    """
+    if not periods:
+        return
+    
+    stored = timeseries.range(lake, granularity, periods[0].start, periods[-1].start, max_age=max_age)
+    stored = {obs['period']: obs['stats'] for obs in stored}
+    missing = [p for p in periods if p.key not in stored]
+    timeseries.count_lookups(len(periods) - len(missing), len(missing))
+    computed = {}
+    position = 0
+    
+    for period in periods:
+        if period.key in stored:
+            yield period, stored[period.key]
+            continue
+        if period.key not in computed:
+            batch = missing[position:position + PERIOD_BATCH_SIZE]
+            position += len(batch)
+            computed.update(compute_period_stats(lake, granularity, batch))
+        yield period, computed[period.key]
+
+def get_period_stats(lake, granularity, periods, max_age=CURRENT_YEAR_TTL):
+    """{period key: stats} for the periods, computing only periods missing from the store"""
+    return {period.key: stats for period, stats in iter_period_stats(lake, granularity, periods, max_age)}
+
+def get_annual_stats(lakes, year, max_age=CURRENT_YEAR_TTL):
+    """{lake id: stats} for one year: stored means, and batched engine reductions for the rest"""
+    period = annual_period(year)
+    stored = timeseries.range_many(lakes, 'annual', period.start, period.start, max_age=max_age)
+    stats_by_lake = {
+        lake.id: stored[lake.id][period.key]['stats'] for lake in lakes if period.key in stored[lake.id]
+    }
+    missing = [lake for lake in lakes if lake.id not in stats_by_lake]
+    timeseries.count_lookups(len(stats_by_lake), len(missing))
+    if missing:
+        computed = lake_means(missing, year)
+        timeseries.upsert_many('annual', [
+            (lake, observation(period, computed[lake.id])) for lake in missing if computed.get(lake.id)
+        ])
+        stats_by_lake.update(computed)
+    return stats_by_lake
+
+def ingest_lake(lake_id, granularity='annual', days=None):
+    """Bring a lake's time series up to date.
+
+    Only periods that are new, or were not final when last computed, go to
+    the engine, so a refresh usually costs one small period.
+    """
+    lake = lake_registry.get(lake_id)
+    if lake:
+        years = data_years()
+        periods = periods_between(granularity, years[0], years[-1], days=days)
+        get_period_stats(lake, granularity_name(granularity, days), periods, max_age=0)
+
+def index_arrays(stats_list):
+    """{band: array} of index values from a list of stats dicts (None for missing)"""
+    return {
+        band: np.array([(stats or {}).get(band) for stats in stats_list], dtype=float)
+        for band in INDEX_BANDS
+    }
 
 def get_mock_lakes_response(year):
     """Return mock data response for testing when Earth Engine is not available"""
@@ -269,17 +577,6 @@ def get_mock_lakes_response(year):
             'waterHealth': 'Poor',
             'pollutionCauses': 'High sediment, algal bloom',
             'suggestions': 'Reduce catchment erosion, limit nutrient runoff',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Ukkadam"},
-                    "geometry": {
-                        "coordinates": [[[76.96095638648234, 10.988575303133587], [76.96051032283168, 10.988737482780266], [76.95813131669479, 10.9880238916666], [76.96095638648234, 10.988575303133587]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -295,17 +592,6 @@ def get_mock_lakes_response(year):
             'waterHealth': 'Moderate',
             'pollutionCauses': 'Minor algal growth',
             'suggestions': 'Monitor nutrient levels',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Valankulam"},
-                    "geometry": {
-                        "coordinates": [[[76.95, 10.97], [76.96, 10.97], [76.96, 10.98], [76.95, 10.98], [76.95, 10.97]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -321,17 +607,6 @@ def get_mock_lakes_response(year):
             'waterHealth': 'Good',
             'pollutionCauses': 'No major issues',
             'suggestions': 'Continue current management',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Kurichi"},
-                    "geometry": {
-                        "coordinates": [[[76.94, 10.99], [76.95, 10.99], [76.95, 11.00], [76.94, 11.00], [76.94, 10.99]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -347,17 +622,6 @@ def get_mock_lakes_response(year):
             'waterHealth': 'Poor',
             'pollutionCauses': 'Chemical pollution, sediment',
             'suggestions': 'Investigate industrial discharges, reduce erosion',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Perur"},
-                    "geometry": {
-                        "coordinates": [[[76.93, 10.96], [76.94, 10.96], [76.94, 10.97], [76.93, 10.97], [76.93, 10.96]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         },
         {
@@ -373,239 +637,538 @@ def get_mock_lakes_response(year):
             'waterHealth': 'Moderate',
             'pollutionCauses': 'Moderate nutrient loading',
             'suggestions': 'Control agricultural runoff',
-            'geometry': {
-                "type": "FeatureCollection",
-                "features": [{
-                    "type": "Feature",
-                    "properties": {"name": "Singanallur"},
-                    "geometry": {
-                        "coordinates": [[[76.97, 10.98], [76.98, 10.98], [76.98, 10.99], [76.97, 10.99], [76.97, 10.98]]],
-                        "type": "Polygon"
-                    }
-                }]
-            },
             'year': year
         }
     ]
     
     return jsonify(mock_lakes)
 
+# Lakes per page of /api/lakes?page=
+LAKES_PAGE_SIZE = int(os.environ.get('NEER_LAKES_PAGE_SIZE', 100))
+MAX_LAKES_PAGE_SIZE = 1000
+
+def parse_bbox(value):
+    """(min lon, min lat, max lon, max lat) from "minLon,minLat,maxLon,maxLat" """
+    try:
+        bbox = tuple(float(part) for part in value.split(','))
+    except ValueError:
+        bbox = ()
+    if len(bbox) != 4 or not all(map(math.isfinite, bbox)) or bbox[0] > bbox[2] or bbox[1] > bbox[3]:
+        raise ValueError("Invalid bbox. Use minLon,minLat,maxLon,maxLat")
+    return bbox
+
 @app.route('/api/lakes', methods=['GET'])
 def get_all_lakes():
-    """Get all lakes with current water quality data"""
+    """Get all lakes with current water quality data.
+
+    With bbox and/or page, only the lakes in the bounding box are returned,
+    one page at a time, with the total count.
+    """
     year = request.args.get('year', 2024, type=int)
     
     # Validate year
-    if year < 2015 or year > 2025:
-        return jsonify({'error': 'Invalid year. Please use years between 2015-2025'}), 400
+    years = data_years()
+    if year not in years:
+        return jsonify({'error': f'Invalid year. Please use years between {years[0]}-{years[-1]}'}), 400
     
-    try:
-        print(f"Attempting to get real data for year {year}")
-        lakes = load_lakes_from_files()
-        print(f"Loaded {len(lakes)} lakes from files")
-        
-        # Try to get Sentinel-2 data
-        start = f"{year}-01-01"
-        end = f"{year}-12-31"
-        s2 = ee.ImageCollection("COPERNICUS/S2_SR") \
-            .filterDate(start, end) \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
-            .select(['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'B12']) \
-            .median()
-        
-        s2 = compute_indices(s2)
-        
-        results = []
+    fmt = stream_format(request)
+    
+    paged = 'bbox' in request.args or 'page' in request.args
+    if paged:
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', LAKES_PAGE_SIZE, type=int)
+        if page < 1 or not 1 <= page_size <= MAX_LAKES_PAGE_SIZE:
+            return jsonify({'error': f'Invalid page. Use page >= 1 and page_size 1-{MAX_LAKES_PAGE_SIZE}'}), 400
+        try:
+            bbox = parse_bbox(request.args['bbox']) if 'bbox' in request.args else None
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        return get_lakes_page(year, bbox, page, page_size, fmt)
+    
+    precompute.touch('lakes', {'year': year})
+    if fmt:
+        return stream_cached(
+            fmt, 'lakes', lakes_cache_key(year), lambda: compute_lakes(year), ttl_for_year(year),
+            live=lambda: iter_lake_events(year), event='lake',
+            mock=lambda: stream_mock(fmt, get_mock_lakes_response(year), 'lake')
+        )
+    
+    # Serialized (and compressed) bodies are reused until the data changes
+    return serve(
+        'lakes', lakes_cache_key(year), lambda: compute_lakes(year), ttl_for_year(year),
+        mock=lambda: get_mock_lakes_response(year)
+    )
+
+def select_lakes(bbox, page, page_size):
+    """(lakes on the page, number of lakes matching) for a bbox / page query"""
+    lakes = lake_registry.query(bbox) if bbox else lake_registry.lakes
+    start = (page - 1) * page_size
+    return lakes[start:start + page_size], len(lakes)
+
+def lakes_page(year, bbox, page, page_size, total, records, **extra):
+    return {
+        'year': year,
+        'bbox': list(bbox) if bbox else None,
+        'page': page,
+        'page_size': page_size,
+        'total': total,
+        'pages': math.ceil(total / page_size),
+        'lakes': records,
+        **extra
+    }
+
+def get_lakes_page(year, bbox, page, page_size, fmt=None):
+    """One page of lakes in a bounding box, with metrics for only those lakes"""
+    lakes, total = select_lakes(bbox, page, page_size)
+    key = cache_key(
+        'lakes-page', lake_registry.version, f"{year}/{bbox}/{page}x{page_size}", INDEX_BANDS, engine=engine.NAME
+    )
+    
+    def compute():
+        records = compute_lakes(year, lakes)
+        found = {record['id'] for record in records}
+        return lakes_page(
+            year, bbox, page, page_size, total, records,
+            missing=[lake.id for lake in lakes if lake.id not in found]
+        )
+    
+    precompute.touch('lakes', {'year': year})
+    
+    def mock():
+        return get_mock_lakes_page(year, bbox, page, page_size, fmt)
+    
+    if fmt:
+        return stream_cached(
+            fmt, 'lakes', key, compute, ttl_for_year(year),
+            live=lambda: iter_lake_events(year, lakes), event='lake', mock=mock, field='lakes'
+        )
+    return serve('lakes', key, compute, ttl_for_year(year), mock)
+
+def get_mock_lakes_page(year, bbox, page, page_size, fmt=None):
+    """Mock records for the registered lakes on the page that have one"""
+    lakes, total = select_lakes(bbox, page, page_size)
+    mock = {record['id']: record for record in get_mock_lakes_response(year).get_json()}
+    records = [mock[lake.id] for lake in lakes if lake.id in mock]
+    payload = lakes_page(year, bbox, page, page_size, total, records, mock=True)
+    if fmt:
+        return stream_payload(fmt, payload, 'lake', 'lakes')
+    return jsonify(payload)
+
+@app.route('/api/lakes/geometries', methods=['GET'])
+def get_lake_geometries():
+    """Lake outlines as TopoJSON, simplified and quantized for a map zoom level"""
+    zoom = snap_zoom(request.args.get('zoom', ZOOM_LEVELS[-1], type=int))
+    key = cache_key('geometries', lake_registry.version, f"z{zoom}")
+    
+    # Outlines only change when a lake file does, and that changes the key
+    entry = response_cache.get(key)
+    if entry is None:
+        entry = response_cache.put(key, build_topology(lake_registry.lakes, zoom))
+    return response_cache.respond(entry, cache_control='public, max-age=3600')
+
+def stream_payload(fmt, payload, event, field=None, **summary):
+    """Stream a JSON payload: its records (the payload itself, or its field), then the rest as the summary"""
+    if field is None:
+        records, rest = payload, {'records': len(payload)}
+    else:
+        rest = dict(payload)
+        records = rest.pop(field, [])
+    return stream_response(fmt, [*((event, record) for record in records), ('summary', {**rest, **summary})])
+
+def stream_mock(fmt, response, event, field=None):
+    """Stream a mock JSON response, see stream_payload"""
+    return stream_payload(fmt, response.get_json(), event, field, mock=True)
+
+def lakes_cache_key(year):
+    return cache_key('lakes', lake_registry.version, year, INDEX_BANDS, engine=engine.NAME)
+
+def get_lake_metrics(year):
+    """Cached metrics for every lake for one year"""
+    return result_cache.get_or_compute(
+        lakes_cache_key(year),
+        lambda: compute_lakes(year),
+        ttl=ttl_for_year(year)
+    )
+
+def lake_records(lakes, year, stats_list):
+    """Metrics records for /api/lakes, one per lake; None for lakes without valid stats"""
+    indices = index_arrays(stats_list)
+    evaluated = rules.evaluate(indices)
+    records = []
+    for i, lake in enumerate(lakes):
+        if np.isnan(indices['NDWI'][i]):
+            records.append(None)
+            continue
+        values = {band: 0.0 if np.isnan(indices[band][i]) else float(indices[band][i]) for band in INDEX_BANDS}
+        records.append({
+            'id': lake.id,
+            'name': lake.name,
+            'ndwi': round(values['NDWI'], 4),
+            'ndci': round(values['NDCI'], 4),
+            'fai': round(values['FAI'], 4),
+            'mci': round(values['MCI'], 4),
+            'swir_ratio': round(values['SWIR_Ratio'], 4),
+            'turbidity': round(values['Turbidity'], 2),
+            'bodLevel': round(float(evaluated['bod'][i]), 2),
+            'waterHealth': evaluated['health'][i],
+            'pollutionCauses': evaluated['causes'][i],
+            'suggestions': evaluated['suggestions'][i],
+            'year': year
+        })
+    return records
+
+def compute_lakes(year, lakes=None):
+    """Compute water quality metrics for one year, for every lake or the given ones"""
+    lakes = lake_registry.lakes if lakes is None else lakes
+    
+    # The same per-lake means feed history and alerts
+    stats_by_lake = get_annual_stats(lakes, year)
+    
+    results = []
+    records = lake_records(lakes, year, [stats_by_lake.get(lake.id) for lake in lakes])
+    
+    for lake, record in zip(lakes, records):
+        if record:
+            results.append(record)
+        else:
+            log.debug("No valid stats for %s in %s", lake.name, year)
+    
+    return results
+
+def stream_batches(lakes):
+    """Engine batches, split further so the pool reduces several at once and early lakes arrive first"""
+    size = max(1, math.ceil(len(lakes) / ee_client.MAX_WORKERS))
+    return [batch[i:i + size] for batch in engine.lake_batches(lakes) for i in range(0, len(batch), size)]
+
+def iter_lake_events(year, lakes=None):
+    """Stream events for /api/lakes: one 'lake' per lake as soon as it is ready, then 'summary'.
+
+    Lakes come from the metrics cache, then the time series store; the
+    rest are reduced in batches, concurrently, so the first lakes arrive
+    before the slowest batch is done. lakes defaults to every lake.
+    """
+    everything = lakes is None
+    lakes = lake_registry.lakes if everything else lakes
+    key = lakes_cache_key(year)
+    results = {}
+    failed = []
+    
+    cached = result_cache.get(key) if everything else None
+    if cached is not None:
+        for record in cached:
+            results[record['id']] = record
+            yield 'lake', record
+    else:
+        period = annual_period(year)
+        stored = timeseries.range_many(lakes, 'annual', period.start, period.start, max_age=CURRENT_YEAR_TTL)
+        found = [lake for lake in lakes if period.key in stored[lake.id]]
+        records = lake_records(found, year, [stored[lake.id][period.key]['stats'] for lake in found])
+        for lake, record in zip(found, records):
+            if record:
+                results[lake.id] = record
+                yield 'lake', record
+        missing = [lake for lake in lakes if lake.id not in results]
+        timeseries.count_lookups(len(found), len(lakes) - len(found))
         
-        for lake_name, lake_fc in lakes.items():
+        pending = {ee_client.submit(lake_means, batch, year): batch for batch in stream_batches(missing)}
+        for future in as_completed(pending):
+            batch = pending[future]
             try:
-                print(f"Processing lake: {lake_name}")
-                # Get lake statistics
-                stats = s2.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=lake_fc.geometry(),
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                if stats and 'NDWI' in stats and stats['NDWI'] is not None:
-                    # Calculate BOD
-                    bod = 26.303 * stats['NDWI'] + 7.546
-                    
-                    # Classify water health
-                    if bod > 8:
-                        health = "Poor"
-                    elif bod > 4:
-                        health = "Moderate"
-                    else:
-                        health = "Good"
-                    
-                    # Get pollution causes and suggestions
-                    reasons, suggestions = classify_pollution(stats)
-                    
-                    # Get lake geometry for frontend
-                    geometry = lake_fc.getInfo()
-                    
-                    results.append({
-                        'id': lake_name.lower().replace(' ', '_'),
-                        'name': lake_name,
-                        'ndwi': round(stats.get('NDWI', 0), 4),
-                        'ndci': round(stats.get('NDCI', 0), 4),
-                        'fai': round(stats.get('FAI', 0), 4),
-                        'mci': round(stats.get('MCI', 0), 4),
-                        'swir_ratio': round(stats.get('SWIR_Ratio', 0), 4),
-                        'turbidity': round(stats.get('Turbidity', 0), 2),
-                        'bodLevel': round(bod, 2),
-                        'waterHealth': health,
-                        'pollutionCauses': reasons,
-                        'suggestions': suggestions,
-                        'geometry': geometry,
-                        'year': year
-                    })
-                    print(f"Successfully processed {lake_name}")
-                else:
-                    print(f"No valid stats for {lake_name}")
-                    
+                stats_by_lake = future.result()
             except Exception as e:
-                print(f"Error processing lake {lake_name}: {str(e)}")
+                log.warning("Error computing %d lakes for %s: %s", len(batch), year, e)
+                failed.extend(lake.id for lake in batch)
                 continue
+            timeseries.upsert_many('annual', [
+                (lake, observation(period, stats_by_lake[lake.id])) for lake in batch if stats_by_lake.get(lake.id)
+            ])
+            for lake, record in zip(batch, lake_records(batch, year, [stats_by_lake.get(lake.id) for lake in batch])):
+                if record:
+                    results[lake.id] = record
+                    yield 'lake', record
         
-        if results:
-            print(f"Returning {len(results)} real lake results")
-            return jsonify(results)
-        else:
-            print("No real data available, falling back to mock data")
-            return get_mock_lakes_response(year)
-        
-    except Exception as e:
-        print(f"Earth Engine error: {str(e)}")
-        print("Falling back to mock data due to Earth Engine issues")
-        return get_mock_lakes_response(year)
+        # A complete set also serves the buffered endpoint
+        if everything and results and not failed:
+            result_cache.set(key, [results[lake.id] for lake in lakes if lake.id in results], ttl=ttl_for_year(year))
+    
+    yield 'summary', {
+        'year': year,
+        'lakes': len(results),
+        'failed': failed,
+        'missing': [lake.id for lake in lakes if lake.id not in results and lake.id not in failed]
+    }
 
 @app.route('/api/lakes/<lake_id>/history', methods=['GET'])
 def get_lake_history(lake_id):
     """Get historical data for a specific lake with trend analysis"""
     start_year = request.args.get('start_year', 2020, type=int)
     end_year = request.args.get('end_year', 2024, type=int)
+    granularity = request.args.get('granularity', 'annual')
+    days = request.args.get('days', type=int)
     
     # Validate year range
-    if start_year > end_year or start_year < 2015 or end_year > 2025:
-        return jsonify({'error': 'Invalid year range. Please use years between 2015-2025'}), 400
+    try:
+        check_years(start_year, end_year)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     try:
-        # Map lake_id to actual lake names
-        lake_mapping = {
-            'ukkadam': 'Ukkadam',
-            'valankulam': 'Valankulam',
-            'kurichi': 'Kurichi',
-            'perur': 'Perur',
-            'singanallur': 'Singanallur'
-        }
-        
-        lake_name = lake_mapping.get(lake_id.lower())
-        
-        if not lake_name:
-            return jsonify({'error': 'Lake not found'}), 404
+        granularity_name(granularity, days)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    lake = lake_registry.get(lake_id)
+    
+    if not lake:
+        return jsonify({'error': 'Lake not found'}), 404
 
-        if EE_INITIALIZED:
-            return get_real_historical_data(lake_name, start_year, end_year)
-        else:
-            return get_mock_historical_data(lake_id, start_year, end_year)
-        
-    except Exception as e:
-        print(f"Error in get_lake_history: {str(e)}")
-        return get_mock_historical_data(lake_id, start_year, end_year)
+    fmt = stream_format(request)
+    key = history_cache_key(lake, start_year, end_year, granularity, days)
+    
+    def compute():
+        return compute_historical_data(lake, start_year, end_year, granularity, days)
+    
+    def mock():
+        response = get_mock_historical_data(lake_id, start_year, end_year)
+        return stream_mock(fmt, response, 'point', 'historical_data') if fmt else response
+    
+    precompute.touch('history', {'lake_id': lake.id, 'granularity': granularity})
+    if fmt:
+        return stream_cached(
+            fmt, 'history', key, compute, ttl_for_year(end_year),
+            live=lambda: iter_history_events(lake, start_year, end_year, granularity, days),
+            event='point', mock=mock, field='historical_data'
+        )
+    return serve('history', key, compute, ttl_for_year(end_year), mock)
 
-def get_real_historical_data(lake_name, start_year, end_year):
-    """Get real historical data from Earth Engine"""
-    try:
-        lakes = load_lakes_from_files()
-        
-        if lake_name not in lakes:
-            return jsonify({'error': 'Lake not found'}), 404
-        
-        lake_fc = lakes[lake_name]
-        historical_data = []
+def history_cache_key(lake, start_year, end_year, granularity='annual', days=None):
+    name = granularity_name(granularity, days)
+    # Annual keys keep their original form
+    period = f"{start_year}-{end_year}" if name == 'annual' else f"{start_year}-{end_year}|{name}"
+    return cache_key('history', lake.cache_id, period, INDEX_BANDS, engine=engine.NAME)
+
+def iter_historical_data(lake, start_year, end_year, granularity='annual', days=None, trend_analysis=None):
+    """History points in order, each as soon as its period is available.
+
+    Trend counts are added to trend_analysis as the points are produced.
+    """
+    if trend_analysis is None:
         trend_analysis = {"improving": 0, "degrading": 0, "stable": 0}
-        
-        previous_bod = None
-        
-        for year in range(start_year, end_year + 1):
-            try:
-                start = f"{year}-01-01"
-                end_date = f"{year}-12-31"
-                s2 = ee.ImageCollection("COPERNICUS/S2_SR") \
-                    .filterDate(start, end_date) \
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
-                    .select(['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'B12']) \
-                    .median()
-                
-                s2 = compute_indices(s2)
-                
-                stats = s2.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=lake_fc.geometry(),
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                if stats and 'NDWI' in stats and stats['NDWI'] is not None:
-                    bod = 26.303 * stats['NDWI'] + 7.546
-                    health = "Poor" if bod > 8 else "Moderate" if bod > 4 else "Good"
-                    
-                    # Trend analysis
-                    if previous_bod is not None:
-                        if bod < previous_bod - 1:
-                            trend = "improving"
-                            trend_analysis["improving"] += 1
-                        elif bod > previous_bod + 1:
-                            trend = "degrading"
-                            trend_analysis["degrading"] += 1
-                        else:
-                            trend = "stable"
-                            trend_analysis["stable"] += 1
-                    else:
-                        trend = "baseline"
-                    
-                    historical_data.append({
-                        'year': year,
-                        'ndwi': round(stats['NDWI'], 4),
-                        'ndci': round(stats.get('NDCI', 0), 4),
-                        'fai': round(stats.get('FAI', 0), 4),
-                        'mci': round(stats.get('MCI', 0), 4),
-                        'bodLevel': round(bod, 2),
-                        'waterHealth': health,
-                        'trend': trend,
-                        'turbidity': round(stats.get('Turbidity', 0), 2),
-                        'swir_ratio': round(stats.get('SWIR_Ratio', 0), 4)
-                    })
-                    
-                    previous_bod = bod
-                    
-            except Exception as e:
-                print(f"Error processing year {year}: {str(e)}")
-                continue
-        
-        # Calculate overall trend
-        if trend_analysis["degrading"] > trend_analysis["improving"]:
-            overall_trend = "degrading"
-        elif trend_analysis["improving"] > trend_analysis["degrading"]:
-            overall_trend = "improving"
-        else:
-            overall_trend = "stable"
-        
-        return jsonify({
-            'historical_data': historical_data,
-            'trend_analysis': {
-                'overall_trend': overall_trend,
-                'trend_counts': trend_analysis,
-                'data_points': len(historical_data)
+    
+    previous_bod = None
+    
+    periods = periods_between(granularity, start_year, end_year, days=days)
+    
+    for period, stats in iter_period_stats(lake, granularity_name(granularity, days), periods):
+        if stats and 'NDWI' in stats and stats['NDWI'] is not None:
+            bod = float(rules.bod(stats['NDWI']))
+            health = rules.health(bod).item()
+            
+            # Trend analysis
+            trend = rules.classify_trend(bod, previous_bod if previous_bod is not None else np.nan).item()
+            if trend in trend_analysis:
+                trend_analysis[trend] += 1
+            
+            point = {
+                'year': period.year,
+                'ndwi': round(stats['NDWI'], 4),
+                'ndci': round(stats.get('NDCI', 0), 4),
+                'fai': round(stats.get('FAI', 0), 4),
+                'mci': round(stats.get('MCI', 0), 4),
+                'bodLevel': round(bod, 2),
+                'waterHealth': health,
+                'trend': trend,
+                'turbidity': round(stats.get('Turbidity', 0), 2),
+                'swir_ratio': round(stats.get('SWIR_Ratio', 0), 4)
             }
-        })
-        
-    except Exception as e:
-        print(f"Error in get_real_historical_data: {str(e)}")
-        return get_mock_historical_data(lake_name.lower(), start_year, end_year)
+            if granularity != 'annual':
+                point.update({'period': period.key, 'start': period.start, 'end': period.end})
+            yield point
+            
+            previous_bod = bod
+
+def history_summary(granularity, days, trend_analysis, data_points):
+    """Everything in a history payload except the points themselves"""
+    return {
+        'granularity': granularity_name(granularity, days),
+        'trend_analysis': {
+            'overall_trend': str(rules.overall_trend(trend_analysis)),
+            'trend_counts': trend_analysis,
+            'data_points': data_points
+        }
+    }
+
+def compute_historical_data(lake, start_year, end_year, granularity='annual', days=None):
+    """Compute per-period index statistics and trend analysis for one lake"""
+    trend_analysis = {"improving": 0, "degrading": 0, "stable": 0}
+    historical_data = list(iter_historical_data(lake, start_year, end_year, granularity, days, trend_analysis))
+    return {
+        'historical_data': historical_data,
+        **history_summary(granularity, days, trend_analysis, len(historical_data))
+    }
+
+def iter_history_events(lake, start_year, end_year, granularity='annual', days=None):
+    """Stream events for history: one 'point' per period as it is ready, then 'summary'"""
+    trend_analysis = {"improving": 0, "degrading": 0, "stable": 0}
+    data_points = 0
+    for point in iter_historical_data(lake, start_year, end_year, granularity, days, trend_analysis):
+        data_points += 1
+        yield 'point', point
+    yield 'summary', history_summary(granularity, days, trend_analysis, data_points)
+
+# Matrix fields of /api/history: (band or rules.evaluate result, decimals)
+HISTORY_FIELDS = {
+    'ndwi': ('NDWI', 4),
+    'ndci': ('NDCI', 4),
+    'fai': ('FAI', 4),
+    'mci': ('MCI', 4),
+    'turbidity': ('Turbidity', 2),
+    'swir_ratio': ('SWIR_Ratio', 4),
+    'bodLevel': ('bod', 2),
+    'waterHealth': ('health', None),
+    'trend': ('trend', None)
+}
+
+@app.route('/api/history', methods=['GET'])
+def get_history():
+    """History of several lakes as a periods x lakes matrix per field"""
+    lake_ids = [lake_id for lake_id in request.args.get('lakes', '').split(',') if lake_id]
+    start_year = request.args.get('start', 2020, type=int)
+    end_year = request.args.get('end', 2024, type=int)
+    granularity = request.args.get('granularity', 'annual')
+    days = request.args.get('days', type=int)
+    fields = [field for field in request.args.get('indices', '').split(',') if field] or list(HISTORY_FIELDS)
+
+    try:
+        check_years(start_year, end_year)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    try:
+        granularity_name(granularity, days)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    unknown = [field for field in fields if field not in HISTORY_FIELDS]
+    if unknown:
+        return jsonify({'error': f"Unknown indices: {', '.join(unknown)}. Use any of: {', '.join(HISTORY_FIELDS)}"}), 400
+
+    lakes = [lake_registry.get(lake_id) for lake_id in lake_ids] if lake_ids else lake_registry.lakes
+    missing = [lake_id for lake_id, lake in zip(lake_ids, lakes) if not lake]
+    if missing:
+        return jsonify({'error': f"Lake not found: {', '.join(missing)}"}), 404
+
+    for lake in lakes:
+        precompute.touch('history', {'lake_id': lake.id, 'granularity': granularity})
+    key = cache_key(
+        'history-matrix', ",".join(lake.cache_id for lake in lakes),
+        f"{start_year}-{end_year}|{granularity_name(granularity, days)}", fields, engine=engine.NAME
+    )
+    return serve(
+        'history_matrix', key,
+        lambda: compute_history_matrix(lakes, start_year, end_year, granularity, days, fields),
+        ttl_for_year(end_year),
+        mock=lambda: jsonify(get_mock_history_matrix(lakes, start_year, end_year, fields)),
+        # A partial matrix is served but not kept
+        keep=lambda matrix: not matrix['failed']
+    )
+
+def compute_history_matrix(lakes, start_year, end_year, granularity, days, fields):
+    """/api/history payload, with the lakes whose history failed in 'failed'"""
+    name = granularity_name(granularity, days)
+    periods = periods_between(granularity, start_year, end_year, days=days)
+    stats_by_lake, failed = get_history_stats(lakes, name, periods)
+    matrix = history_matrix(lakes, periods, stats_by_lake, name, fields)
+    matrix['failed'] = failed
+    return matrix
+
+def get_history_stats(lakes, granularity, periods):
+    """({lake id: {period key: stats}}, failed lake ids) for every lake and period.
+
+    Stored observations of all lakes come from one range scan of the time
+    series store. Lakes missing the same periods are computed together, one
+    engine call (a reduceRegions over the lakes per period) for each batch of
+    lakes and periods, concurrently on the Earth Engine pool.
+    """
+    stats_by_lake = {lake.id: {} for lake in lakes}
+    if not periods:
+        return stats_by_lake, []
+
+    stored = timeseries.range_many(lakes, granularity, periods[0].start, periods[-1].start, max_age=CURRENT_YEAR_TTL)
+    missing_by_periods = {}
+    for lake in lakes:
+        stats_by_lake[lake.id] = {key: obs['stats'] for key, obs in stored[lake.id].items()}
+        missing = tuple(p for p in periods if p.key not in stats_by_lake[lake.id])
+        timeseries.count_lookups(len(periods) - len(missing), len(missing))
+        if missing:
+            missing_by_periods.setdefault(missing, []).append(lake)
+
+    pending = {}
+    for missing, missing_lakes in missing_by_periods.items():
+        for batch, batch_periods in engine.lake_period_batches(missing_lakes, list(missing), PERIOD_BATCH_SIZE):
+            pending[ee_client.submit(compute_lake_period_stats, batch, granularity, batch_periods)] = batch
+
+    failed = []
+    for future in as_completed(pending):
+        try:
+            for lake_id, computed in future.result().items():
+                stats_by_lake[lake_id].update(computed)
+        except Exception as e:
+            batch = pending[future]
+            log.warning("Error computing history for %d lakes (%s...): %s", len(batch), batch[0].name, e)
+            failed.extend(lake.id for lake in batch)
+    return stats_by_lake, list(dict.fromkeys(failed))
+
+def history_matrix(lakes, periods, stats_by_lake, granularity, fields):
+    """Column-oriented history: for each field, one row per period with one value per lake.
+
+    Values are null where a lake has no data for a period; trends skip those
+    periods, as in the single-lake history.
+    """
+    indices = {
+        band: np.array(
+            [[(stats_by_lake[lake.id].get(p.key) or {}).get(band) for lake in lakes] for p in periods],
+            dtype=float
+        ).reshape(len(periods), len(lakes))
+        for band in INDEX_BANDS
+    }
+    evaluated = rules.evaluate(indices, trend_axis=0)
+
+    matrix = {}
+    for field in fields:
+        source, decimals = HISTORY_FIELDS[field]
+        values = indices[source] if source in indices else evaluated[source]
+        if decimals is not None:
+            values = np.where(np.isnan(values), None, np.round(values, decimals))
+        matrix[field] = values.tolist()
+
+    trend_counts = rules.trend_counts(evaluated['trend'], axis=0)
+    return {
+        'granularity': granularity,
+        'lakes': [lake.id for lake in lakes],
+        'periods': [p.key for p in periods],
+        'start': [p.start for p in periods],
+        'end': [p.end for p in periods],
+        'indices': matrix,
+        'trend_analysis': {
+            'overall_trend': rules.overall_trend(trend_counts).tolist(),
+            'trend_counts': {trend: counts.tolist() for trend, counts in trend_counts.items()},
+            'data_points': np.sum(~np.isnan(indices['NDWI']), axis=0).tolist()
+        }
+    }
+
+def get_mock_history_matrix(lakes, start_year, end_year, fields):
+    """Annual matrix built from the mock history of each lake"""
+    periods = periods_between('annual', start_year, end_year)
+    stats_by_lake = {}
+    for lake in lakes:
+        points = get_mock_historical_data(lake.id, start_year, end_year).get_json()['historical_data']
+        stats_by_lake[lake.id] = {
+            str(point['year']): {band: point[band.lower()] for band in INDEX_BANDS} for point in points
+        }
+    matrix = history_matrix(lakes, periods, stats_by_lake, 'annual', fields)
+    matrix['failed'] = []
+    return matrix
 
 def get_mock_historical_data(lake_id, start_year, end_year):
     """Generate mock historical data with realistic trends"""
@@ -621,59 +1184,36 @@ def get_mock_historical_data(lake_id, start_year, end_year):
     }
     
     lake_config = base_values.get(lake_id, {'base_ndwi': 0.5, 'trend': 0})
-    historical_data = []
-    trend_analysis = {"improving": 0, "degrading": 0, "stable": 0}
-    previous_bod = None
+    years = list(range(start_year, end_year + 1))
     
-    for i, year in enumerate(range(start_year, end_year + 1)):
-        # Calculate NDWI with trend and some random variation
-        ndwi = lake_config['base_ndwi'] + (lake_config['trend'] * i) + random.uniform(-0.05, 0.05)
-        ndwi = max(0, min(1, ndwi))  # Clamp between 0 and 1
-        
-        bod = 26.303 * ndwi + 7.546
-        health = "Poor" if bod > 8 else "Moderate" if bod > 4 else "Good"
-        
-        # Trend analysis
-        if previous_bod is not None:
-            if bod < previous_bod - 1:
-                trend = "improving"
-                trend_analysis["improving"] += 1
-            elif bod > previous_bod + 1:
-                trend = "degrading"
-                trend_analysis["degrading"] += 1
-            else:
-                trend = "stable"
-                trend_analysis["stable"] += 1
-        else:
-            trend = "baseline"
-        
+    # NDWI with trend and some random variation, clamped between 0 and 1
+    ndwi = np.array([
+        max(0, min(1, lake_config['base_ndwi'] + (lake_config['trend'] * i) + random.uniform(-0.05, 0.05)))
+        for i in range(len(years))
+    ])
+    evaluated = rules.evaluate({'NDWI': ndwi}, trend_axis=0)
+    
+    historical_data = []
+    for i, year in enumerate(years):
         historical_data.append({
             'year': year,
-            'ndwi': round(ndwi, 4),
+            'ndwi': round(float(ndwi[i]), 4),
             'ndci': round(random.uniform(-0.2, 0.1), 4),
             'fai': round(random.uniform(0, 0.05), 4),
             'mci': round(random.uniform(5, 20), 2),
-            'bodLevel': round(bod, 2),
-            'waterHealth': health,
-            'trend': trend,
+            'bodLevel': round(float(evaluated['bod'][i]), 2),
+            'waterHealth': evaluated['health'][i],
+            'trend': evaluated['trend'][i],
             'turbidity': round(random.uniform(100, 1000), 2),
             'swir_ratio': round(random.uniform(0.8, 1.5), 4)
         })
-        
-        previous_bod = bod
     
-    # Calculate overall trend
-    if trend_analysis["degrading"] > trend_analysis["improving"]:
-        overall_trend = "degrading"
-    elif trend_analysis["improving"] > trend_analysis["degrading"]:
-        overall_trend = "improving"
-    else:
-        overall_trend = "stable"
+    trend_analysis = {trend: int(count) for trend, count in rules.trend_counts(evaluated['trend']).items()}
     
     return jsonify({
         'historical_data': historical_data,
         'trend_analysis': {
-            'overall_trend': overall_trend,
+            'overall_trend': str(rules.overall_trend(trend_analysis)),
             'trend_counts': trend_analysis,
             'data_points': len(historical_data)
         }
@@ -682,118 +1222,105 @@ def get_mock_historical_data(lake_id, start_year, end_year):
 @app.route('/api/alerts', methods=['GET'])
 def get_water_quality_alerts():
     """Get water quality alerts for rapidly degrading lakes"""
-    try:
-        # Check if Earth Engine is available (similar check as other endpoints)
-        try:
-            ee.Number(1).getInfo()
-            return get_real_alerts()
-        except:
-            return get_mock_alerts()
-    except Exception as e:
-        print(f"Error in get_water_quality_alerts: {str(e)}")
-        return get_mock_alerts()
+    precompute.touch('alerts', {'current_year': ALERTS_YEAR})
+    key, compute, ttl, keep = alerts_spec(ALERTS_YEAR)
+    return serve('alerts', key, compute, ttl, mock=get_mock_alerts, keep=keep)
 
-def get_real_alerts():
-    """Get real alerts based on Earth Engine data"""
-    try:
-        lakes = load_lakes_from_files()
-        alerts = []
-        
-        current_year = 2024
+# Alerts compare this year with the one before it
+ALERTS_YEAR = 2024
+
+def alerts_cache_key(current_year):
+    return cache_key('alerts', lake_registry.version, f"{current_year-1}-{current_year}", INDEX_BANDS, engine=engine.NAME)
+
+def alerts_spec(current_year):
+    """(key, compute, ttl, keep) of the alerts payload, shared by the endpoint and precomputation"""
+    return (
+        alerts_cache_key(current_year),
+        lambda: compute_alerts(current_year),
+        ttl_for_year(current_year),
+        # Only cache when at least one lake actually produced statistics
+        lambda payload: payload['lakes_analyzed']
+    )
+
+def get_alerts(current_year):
+    """Alerts payload comparing current_year with the previous year, computed unless a fresh one is cached"""
+    return revalidator.fresh(*alerts_spec(current_year))
+
+def compute_alerts(current_year):
+    """Compare the last two years for every lake and build alerts"""
+    alerts = []
+    lakes = lake_registry.lakes
+    
+    # Get data for last year and current year (shared with the history cache),
+    # reducing the lakes missing from it in batches
+    last_by_lake = get_annual_stats(lakes, current_year - 1)
+    current_by_lake = get_annual_stats(lakes, current_year)
+    
+    analyzed = []
+    for lake in lakes:
+        last_stats = last_by_lake.get(lake.id)
+        current_stats = current_by_lake.get(lake.id)
+        if (last_stats and current_stats and
+                last_stats.get('NDWI') is not None and current_stats.get('NDWI') is not None):
+            analyzed.append((lake, last_stats, current_stats))
+    
+    if not analyzed:
+        return {'alerts': [], 'total_alerts': 0, 'lakes_analyzed': 0, 'last_updated': f"{current_year}-12-01T00:00:00Z"}
+    
+    # Every lake is checked against every rule at once
+    current = index_arrays([current_stats for _, _, current_stats in analyzed])
+    flags = rules.alerts(index_arrays([last_stats for _, last_stats, _ in analyzed]), current)
+    index_alerts = flags['index_alerts']
+    
+    for i, (lake, _, _) in enumerate(analyzed):
+        bod_change = float(flags['change'][i])
         
-        for lake_name, lake_fc in lakes.items():
-            try:
-                # Get recent data (last 2 years)
-                start = f"{current_year-1}-01-01"
-                end_date = f"{current_year}-12-31"
-                
-                s2 = ee.ImageCollection("COPERNICUS/S2_SR") \
-                    .filterDate(start, end_date) \
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
-                    .select(['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'B12'])
-                
-                # Get data for last year and current year
-                last_year = s2.filterDate(f"{current_year-1}-01-01", f"{current_year-1}-12-31").median()
-                current_year_data = s2.filterDate(f"{current_year}-01-01", f"{current_year}-12-31").median()
-                
-                last_year = compute_indices(last_year)
-                current_year_data = compute_indices(current_year_data)
-                
-                # Get statistics
-                last_stats = last_year.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=lake_fc.geometry(),
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                current_stats = current_year_data.reduceRegion(
-                    reducer=ee.Reducer.mean(),
-                    geometry=lake_fc.geometry(),
-                    scale=10,
-                    maxPixels=1e9
-                ).getInfo()
-                
-                if (last_stats and current_stats and 
-                    'NDWI' in last_stats and 'NDWI' in current_stats and
-                    last_stats['NDWI'] is not None and current_stats['NDWI'] is not None):
-                    
-                    last_bod = 26.303 * last_stats['NDWI'] + 7.546
-                    current_bod = 26.303 * current_stats['NDWI'] + 7.546
-                    
-                    bod_change = current_bod - last_bod
-                    
-                    # Generate alerts based on various criteria
-                    if bod_change > 3:  # Significant increase in BOD
-                        alerts.append({
-                            'id': f"alert_{lake_name}_{current_year}",
-                            'lake_name': lake_name.title(),
-                            'alert_type': 'degrading_water_quality',
-                            'severity': 'high' if bod_change > 5 else 'medium',
-                            'message': f"Water quality rapidly degrading. BOD increased by {bod_change:.1f} mg/L",
-                            'timestamp': f"{current_year}-12-01T00:00:00Z",
-                            'current_bod': round(current_bod, 2),
-                            'previous_bod': round(last_bod, 2),
-                            'change': round(bod_change, 2),
-                            'recommended_action': 'Immediate investigation and pollution source assessment required'
-                        })
-                    
-                    # Additional pollution indicators
-                    if current_stats.get('NDCI', 0) > 0.2:  # High algae
-                        alerts.append({
-                            'id': f"algae_{lake_name}_{current_year}",
-                            'lake_name': lake_name.title(),
-                            'alert_type': 'algal_bloom',
-                            'severity': 'medium',
-                            'message': f"Potential algal bloom detected (NDCI: {current_stats['NDCI']:.3f})",
-                            'timestamp': f"{current_year}-11-15T00:00:00Z",
-                            'recommended_action': 'Monitor nutrient levels and implement algae control measures'
-                        })
-                    
-                    if current_stats.get('Turbidity', 0) > 800:  # High turbidity
-                        alerts.append({
-                            'id': f"turbidity_{lake_name}_{current_year}",
-                            'lake_name': lake_name.title(),
-                            'alert_type': 'high_turbidity',
-                            'severity': 'medium',
-                            'message': f"High turbidity detected ({current_stats['Turbidity']:.1f} NTU)",
-                            'timestamp': f"{current_year}-11-20T00:00:00Z",
-                            'recommended_action': 'Check for erosion sources and sediment runoff'
-                        })
-                        
-            except Exception as e:
-                print(f"Error processing alerts for {lake_name}: {str(e)}")
-                continue
+        # Significant increase in BOD
+        if flags['severity'][i] is not None:
+            alerts.append({
+                'id': f"alert_{lake.name}_{current_year}",
+                'lake_name': lake.name,
+                'alert_type': 'degrading_water_quality',
+                'severity': flags['severity'][i],
+                'message': f"Water quality rapidly degrading. BOD increased by {bod_change:.1f} mg/L",
+                'timestamp': f"{current_year}-12-01T00:00:00Z",
+                'current_bod': round(float(flags['current_bod'][i]), 2),
+                'previous_bod': round(float(flags['previous_bod'][i]), 2),
+                'change': round(bod_change, 2),
+                'recommended_action': 'Immediate investigation and pollution source assessment required'
+            })
         
-        return jsonify({
-            'alerts': alerts,
-            'total_alerts': len(alerts),
-            'last_updated': f"{current_year}-12-01T00:00:00Z"
-        })
+        # Additional pollution indicators
+        severity, flagged = index_alerts['algal_bloom']
+        if flagged[i]:
+            alerts.append({
+                'id': f"algae_{lake.name}_{current_year}",
+                'lake_name': lake.name,
+                'alert_type': 'algal_bloom',
+                'severity': severity,
+                'message': f"Potential algal bloom detected (NDCI: {current['NDCI'][i]:.3f})",
+                'timestamp': f"{current_year}-11-15T00:00:00Z",
+                'recommended_action': 'Monitor nutrient levels and implement algae control measures'
+            })
         
-    except Exception as e:
-        print(f"Error in get_real_alerts: {str(e)}")
-        return get_mock_alerts()
+        severity, flagged = index_alerts['high_turbidity']
+        if flagged[i]:
+            alerts.append({
+                'id': f"turbidity_{lake.name}_{current_year}",
+                'lake_name': lake.name,
+                'alert_type': 'high_turbidity',
+                'severity': severity,
+                'message': f"High turbidity detected ({current['Turbidity'][i]:.1f} NTU)",
+                'timestamp': f"{current_year}-11-20T00:00:00Z",
+                'recommended_action': 'Check for erosion sources and sediment runoff'
+            })
+    
+    return {
+        'alerts': alerts,
+        'total_alerts': len(alerts),
+        'lakes_analyzed': len(analyzed),
+        'last_updated': f"{current_year}-12-01T00:00:00Z"
+    }
 
 def get_mock_alerts():
     """Generate mock alerts for demonstration"""
@@ -848,107 +1375,64 @@ def get_mock_alerts():
 @app.route('/api/pollution-sources/<lake_id>', methods=['GET'])
 def get_pollution_sources(lake_id):
     """Get detailed pollution source mapping for a specific lake"""
-    try:
-        # Check if Earth Engine is available
-        try:
-            ee.Number(1).getInfo()
-            return get_real_pollution_sources(lake_id)
-        except:
-            return get_mock_pollution_sources(lake_id)
-    except Exception as e:
-        print(f"Error in get_pollution_sources: {str(e)}")
-        return get_mock_pollution_sources(lake_id)
+    lake = lake_registry.get(lake_id)
+    
+    if not lake:
+        return jsonify({'error': 'Lake not found'}), 404
+    
+    precompute.touch('catchment', {'lake_id': lake.id})
+    start, end = LAND_COVER_PERIOD
+    return serve(
+        'pollution_sources',
+        cache_key('pollution-sources', lake.cache_id, f"{start}/{end}", engine=engine.NAME),
+        lambda: compute_pollution_sources(lake),
+        ttl_for_year(int(end[:4])),
+        mock=lambda: get_mock_pollution_sources(lake_id)
+    )
 
-def get_real_pollution_sources(lake_id):
-    """Get real pollution sources using Earth Engine land use analysis"""
-    try:
-        lakes = load_lakes_from_files()
-        
-        lake_name = lake_id.replace('_', ' ').title()
-        matching_lakes = [name for name in lakes.keys() if lake_name.lower() in name.lower()]
-        
-        if not matching_lakes:
-            return jsonify({'error': 'Lake not found'}), 404
-        
-        lake_name = matching_lakes[0]
-        lake_fc = lakes[lake_name]
-        
-        # Create buffer around lake for catchment analysis
-        catchment = lake_fc.geometry().buffer(2000)  # 2km buffer
-        
-        # Get land use data (using Sentinel-2 for basic classification)
-        s2 = ee.ImageCollection("COPERNICUS/S2_SR") \
-            .filterDate('2023-01-01', '2024-12-31') \
-            .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
-            .select(['B2', 'B3', 'B4', 'B8', 'B11', 'B12']) \
-            .median()
-        
-        # Simple land use classification
-        ndvi = s2.normalizedDifference(['B8', 'B4'])
-        ndbi = s2.normalizedDifference(['B11', 'B8'])
-        mndwi = s2.normalizedDifference(['B3', 'B11'])
-        
-        # Classify land use
-        urban = ndbi.gt(0.1).And(ndvi.lt(0.2))
-        industrial = ndbi.gt(0.2).And(ndvi.lt(0.1))
-        water = mndwi.gt(0.3)
-        vegetation = ndvi.gt(0.4)
-        
-        # Calculate areas
-        urban_area = urban.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=catchment,
-            scale=10,
-            maxPixels=1e9
-        ).getInfo()
-        
-        industrial_area = industrial.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=catchment,
-            scale=10,
-            maxPixels=1e9
-        ).getInfo()
-        
-        water_area = water.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=catchment,
-            scale=10,
-            maxPixels=1e9
-        ).getInfo()
-        
-        vegetation_area = vegetation.multiply(ee.Image.pixelArea()).reduceRegion(
-            reducer=ee.Reducer.sum(),
-            geometry=catchment,
-            scale=10,
-            maxPixels=1e9
-        ).getInfo()
-        
-        total_area = catchment.area().getInfo()
-        
-        # Calculate pollution risk scores
-        urban_percent = (urban_area.get('nd', 0) / total_area) * 100
-        industrial_percent = (industrial_area.get('nd', 0) / total_area) * 100
-        
-        pollution_risk = min(100, (urban_percent * 0.6) + (industrial_percent * 1.5))
-        
-        return jsonify({
-            'lake_name': lake_name,
-            'catchment_analysis': {
-                'total_area_km2': round(total_area / 1000000, 2),
-                'urban_coverage_percent': round(urban_percent, 1),
-                'industrial_coverage_percent': round(industrial_percent, 1),
-                'vegetation_coverage_percent': round((vegetation_area.get('nd', 0) / total_area) * 100, 1),
-                'water_coverage_percent': round((water_area.get('nd', 0) / total_area) * 100, 1)
-            },
-            'pollution_risk_score': round(pollution_risk, 1),
-            'risk_level': 'High' if pollution_risk > 70 else 'Medium' if pollution_risk > 40 else 'Low',
-            'identified_sources': get_identified_sources(lake_id, pollution_risk),
-            'recommendations': get_pollution_recommendations(pollution_risk, urban_percent, industrial_percent)
-        })
-        
-    except Exception as e:
-        print(f"Error in get_real_pollution_sources: {str(e)}")
-        return get_mock_pollution_sources(lake_id)
+# The land cover composite covers a fixed, already finished period
+LAND_COVER_PERIOD = ('2023-01-01', '2024-12-31')
+
+def get_land_cover_areas(lake, period=LAND_COVER_PERIOD):
+    """Area (m^2) of each land cover class in the lake's 2 km catchment, plus the total.
+
+    Results are cached per lake and composite period.
+    """
+    start, end = period
+    key = cache_key('land-cover', lake.cache_id, f"{start}/{end}", engine=engine.NAME)
+    return result_cache.get_or_compute(
+        key,
+        lambda: engine.land_cover_areas(lake, start, end),
+        ttl=ttl_for_year(int(end[:4]))
+    )
+
+def compute_pollution_sources(lake):
+    """Estimate catchment land use and pollution risk around one lake; empty without land cover data"""
+    areas = get_land_cover_areas(lake)
+    if not areas or not areas['total']:
+        return {}
+    total_area = areas['total']
+    
+    # Calculate pollution risk scores
+    urban_percent = (areas['urban'] / total_area) * 100
+    industrial_percent = (areas['industrial'] / total_area) * 100
+    
+    pollution_risk = min(100, (urban_percent * 0.6) + (industrial_percent * 1.5))
+    
+    return {
+        'lake_name': lake.name,
+        'catchment_analysis': {
+            'total_area_km2': round(total_area / 1000000, 2),
+            'urban_coverage_percent': round(urban_percent, 1),
+            'industrial_coverage_percent': round(industrial_percent, 1),
+            'vegetation_coverage_percent': round((areas['vegetation'] / total_area) * 100, 1),
+            'water_coverage_percent': round((areas['water'] / total_area) * 100, 1)
+        },
+        'pollution_risk_score': round(pollution_risk, 1),
+        'risk_level': 'High' if pollution_risk > 70 else 'Medium' if pollution_risk > 40 else 'Low',
+        'identified_sources': get_identified_sources(lake.id, pollution_risk),
+        'recommendations': get_pollution_recommendations(pollution_risk, urban_percent, industrial_percent)
+    }
 
 def get_mock_pollution_sources(lake_id):
     """Generate mock pollution source mapping data"""
@@ -1070,7 +1554,396 @@ def get_pollution_recommendations(risk_score, urban_percent, industrial_percent)
     
     return recommendations
 
+# --- Background precomputation -------------------------------------------
+
+def precompute_catchment(lake_id):
+    lake = lake_registry.get(lake_id)
+    if lake:
+        get_land_cover_areas(lake)
+
+def plan_precompute_jobs():
+    """Every lake x every year plus each lake's time series; the current year and alerts go first"""
+    years = data_years()
+    current_year = years[-1]
+    jobs = [('alerts', {'current_year': ALERTS_YEAR}, 90)]
+    for year in years:
+        jobs.append(('lakes', {'year': year}, 100 if year == current_year else 50))
+    for lake in lake_registry.lakes:
+        for granularity in INGEST_GRANULARITIES:
+            jobs.append(('history', {'lake_id': lake.id, 'granularity': granularity}, 40))
+        jobs.append(('catchment', {'lake_id': lake.id}, 30))
+    return jobs
+
+precompute = PrecomputeScheduler(
+    db_path=result_cache.path or os.path.join(tempfile.gettempdir(), 'neer_precompute.sqlite3'),
+    handlers={
+        'lakes': get_lake_metrics,
+        'history': ingest_lake,
+        'alerts': get_alerts,
+        'catchment': precompute_catchment
+    },
+    plan=plan_precompute_jobs,
+    gate=engine_available,
+    workers=int(os.environ.get('NEER_PRECOMPUTE_WORKERS', 2)),
+    interval=int(os.environ.get('NEER_PRECOMPUTE_INTERVAL', 6 * 3600))
+)
+
+@app.route('/api/ee/stats', methods=['GET'])
+def get_ee_stats():
+    """Per-operation Earth Engine call counts, retries and latency"""
+    return jsonify({
+        'circuit': ee_health.status(),
+        'operations': ee_client.call_stats.snapshot(),
+        'coalesced': {'engine': engine_flight.stats(), 'results': result_cache.flight.stats()},
+        'revalidation': revalidator.stats(),
+        'max_workers': ee_client.MAX_WORKERS,
+        'rate_per_second': ee_client.RATE_PER_SECOND
+    })
+
+def cache_lookups():
+    """{cache: (hits, misses)} of every cache the app keeps"""
+    results = result_cache.stats()
+    responses = response_cache.stats()
+    tiles = tile_cache.stats()
+    stored = timeseries.lookups()
+    return {
+        'result_memory': (results['memory_hits'], 0),
+        'result_disk': (results['disk_hits'], results['misses']),
+        'response': (responses['hits'], responses['misses']),
+        'tile': (tiles['hits'], tiles['misses']),
+        'timeseries': (stored['hits'], stored['misses'])
+    }
+
+def cache_hit_ratios():
+    lookups = cache_lookups()
+    # Memory hits never reach the disk tier; together they are the result cache
+    memory_hits, _ = lookups.pop('result_memory')
+    disk_hits, misses = lookups.pop('result_disk')
+    lookups['result'] = (memory_hits + disk_hits, misses)
+    return {(name,): hits / (hits + misses) for name, (hits, misses) in lookups.items() if hits + misses}
+
+metrics.REGISTRY.callback(
+    'neer_cache_hits_total', "Cache lookups answered from the cache", ('cache',),
+    lambda: {(name,): hits for name, (hits, _) in cache_lookups().items()}, kind='counter'
+)
+metrics.REGISTRY.callback(
+    'neer_cache_misses_total', "Cache lookups that had to compute", ('cache',),
+    lambda: {(name,): misses for name, (_, misses) in cache_lookups().items() if name != 'result_memory'},
+    kind='counter'
+)
+metrics.REGISTRY.callback(
+    'neer_coalesced_calls_total', "Computations that waited for an identical one in flight", ('layer',),
+    lambda: {('engine',): engine_flight.stats()['coalesced'], ('results',): result_cache.flight.stats()['coalesced']},
+    kind='counter'
+)
+metrics.REGISTRY.callback('neer_cache_hit_ratio', "Hits over lookups since start", ('cache',), cache_hit_ratios)
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus metrics of this process"""
+    return Response(metrics.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/precompute/status', methods=['GET'])
+def get_precompute_status():
+    """Queue depth and progress of background precomputation"""
+    return jsonify(precompute.status())
+
+# Asynchronous jobs
+
+def require_engine():
+    # Jobs report failures instead of falling back to mock data
+    if not engine_available():
+        raise RuntimeError("Earth Engine is unavailable")
+
+def require_lake(lake_id):
+    lake = lake_registry.get(str(lake_id)) if lake_id else None
+    if not lake:
+        raise ValueError(f"Lake '{lake_id}' not found")
+    return lake
+
+def run_history_job(progress, lake_id, start_year, end_year, granularity='annual', days=None):
+    """History payload of one lake, reporting progress per period"""
+    require_engine()
+    lake = require_lake(lake_id)
+    total = len(periods_between(granularity, start_year, end_year, days=days)) or 1
+    trend_analysis = {"improving": 0, "degrading": 0, "stable": 0}
+    historical_data = []
+    for point in iter_historical_data(lake, start_year, end_year, granularity, days, trend_analysis):
+        historical_data.append(point)
+        progress(len(historical_data) / total, point.get('period', str(point['year'])))
+    return {
+        'historical_data': historical_data,
+        **history_summary(granularity, days, trend_analysis, len(historical_data))
+    }
+
+def run_catchment_job(progress, lake_id):
+    """Pollution source mapping of one lake"""
+    require_engine()
+    lake = require_lake(lake_id)
+    progress(0.0, f"Analysing the catchment of {lake.name}")
+    return compute_pollution_sources(lake)
+
+def run_refresh_job(progress):
+    """Run every precompute job now: all lakes, years, time series, alerts and catchments"""
+    require_engine()
+    planned = plan_precompute_jobs()
+    failed = []
+    for index, (kind, params, _) in enumerate(planned):
+        progress(index / len(planned), f"{kind} {json.dumps(params, sort_keys=True)}")
+        try:
+            precompute.handlers[kind](**params)
+        except Exception as e:
+            log.warning("Refresh step %s %s failed: %s", kind, params, e)
+            failed.append({'type': kind, 'params': params, 'error': str(e)})
+    return {'steps': len(planned), 'failed': failed}
+
+def job_params(kind, params):
+    """Validated params with defaults filled in, so identical work has identical params"""
+    if kind == 'history':
+        start_year = int(params.get('start_year', 2020))
+        end_year = int(params.get('end_year', 2024))
+        check_years(start_year, end_year)
+        granularity = params.get('granularity', 'annual')
+        days = int(params['days']) if params.get('days') else None
+        granularity_name(granularity, days)
+        if granularity != 'rolling':
+            days = None
+        return {
+            'lake_id': require_lake(params.get('lake_id')).id,
+            'start_year': start_year,
+            'end_year': end_year,
+            'granularity': granularity,
+            'days': days
+        }
+    if kind == 'catchment':
+        return {'lake_id': require_lake(params.get('lake_id')).id}
+    if kind == 'refresh':
+        return {}
+    raise ValueError(f"Unknown job type '{kind}'. Use one of: {', '.join(job_queue.handlers)}")
+
+job_queue = JobQueue(
+    db_path=result_cache.path or os.path.join(tempfile.gettempdir(), 'neer_jobs.sqlite3'),
+    handlers={
+        'history': run_history_job,
+        'catchment': run_catchment_job,
+        'refresh': run_refresh_job
+    },
+    workers=int(os.environ.get('NEER_JOB_WORKERS', 2)),
+    result_ttl=int(os.environ.get('NEER_JOB_RESULT_TTL', 24 * 3600))
+)
+
+def job_status(job):
+    """A job as returned by the API, with links to its progress stream and result"""
+    job = dict(job)
+    job['events_url'] = f"/api/jobs/{job['id']}/events"
+    if job['state'] == 'done':
+        job['result_url'] = f"/api/jobs/{job['id']}/result"
+    return job
+
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Submit history, catchment or refresh work; returns the job at once"""
+    body = request.get_json(silent=True)
+    if body is None:
+        body = {}
+    if not isinstance(body, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    kind = body.get('type')
+    params = body.get('params')
+    if params is None:
+        params = {}
+    if not isinstance(params, dict):
+        return jsonify({'error': "'params' must be a JSON object"}), 400
+    try:
+        params = job_params(kind, params)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job, deduplicated = job_queue.submit(kind, params)
+    response = jsonify({**job_status(job), 'deduplicated': deduplicated})
+    response.status_code = 200 if deduplicated else 202
+    response.headers['Location'] = f"/api/jobs/{job['id']}"
+    return response
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """State and progress of a job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def get_job_result(job_id):
+    """The stored result of a finished job"""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if job['state'] != 'done':
+        return jsonify({**job_status(job), 'error': 'Job has not finished'}), 409
+    return jsonify(job_queue.result(job_id))
+
+@app.route('/api/jobs/<job_id>/events', methods=['GET'])
+def get_job_events(job_id):
+    """Progress stream of a job: 'progress' events, then a 'summary' with the final state"""
+    if job_queue.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def events():
+        job = None
+        for job in job_queue.watch(job_id):
+            if job['state'] in ('done', 'failed'):
+                break
+            yield 'progress', job_status(job)
+        if job is not None:
+            yield 'summary', job_status(job)
+    
+    return stream_response(stream_format(request) or 'sse', events())
+
+# Vector tiles
+
+# Lake metrics copied into the tiles' lakes layer
+TILE_METRIC_FIELDS = ('year', 'ndwi', 'ndci', 'fai', 'mci', 'turbidity', 'swir_ratio', 'bodLevel', 'waterHealth')
+
+# How long (seconds) the newest cached metrics year is remembered between tile requests
+TILE_METRICS_REFRESH = 60
+
+# Zoom levels rendered in the background at startup, e.g. "10-14" (empty: none)
+TILE_SEED_ZOOMS = os.environ.get('NEER_TILE_SEED_ZOOMS', '')
+
+tile_cache = ResponseCache(max_entries=int(os.environ.get('NEER_TILE_CACHE_SIZE', 4096)))
+_tile_source = None
+_tile_metrics = {'checked_at': 0, 'year': None, 'by_lake': {}}
+_tile_lock = threading.Lock()
+
+def get_tile_source():
+    """Projected lake outlines and catchments for the current registry snapshot"""
+    global _tile_source
+    snapshot = lake_registry.snapshot()
+    with _tile_lock:
+        if _tile_source is None or _tile_source[0] != snapshot.version:
+            _tile_source = (snapshot.version, TileSource(snapshot.lakes, CATCHMENT_BUFFER_M))
+        return _tile_source[1]
+
+def get_tile_metrics():
+    """Newest year with cached lake metrics and its per-lake attributes.
+
+    Only reads the cache, so tiles never wait on Earth Engine.
+    """
+    with _tile_lock:
+        if time.monotonic() - _tile_metrics['checked_at'] < TILE_METRICS_REFRESH:
+            return _tile_metrics['year'], _tile_metrics['by_lake']
+    year, by_lake = None, {}
+    for candidate in reversed(data_years()):
+        # The last known metrics, even if they are being refreshed
+        entry = result_cache.lookup(lakes_cache_key(candidate))
+        results = entry[0] if entry else None
+        if results:
+            year = candidate
+            by_lake = {
+                lake['id']: {field: lake[field] for field in TILE_METRIC_FIELDS if field in lake}
+                for lake in results
+            }
+            break
+    with _tile_lock:
+        _tile_metrics.update(checked_at=time.monotonic(), year=year, by_lake=by_lake)
+    return year, by_lake
+
+def get_tile(z, x, y):
+    """Cached encoded tile"""
+    year, metrics = get_tile_metrics()
+    key = cache_key('tile', lake_registry.version, f"{z}/{x}/{y}@{year}", engine=engine.NAME)
+    entry = tile_cache.get(key)
+    if entry is None:
+        entry = tile_cache.put_body(
+            key,
+            get_tile_source().render(z, x, y, metrics),
+            ttl=ttl_for_year(year) if year else None,
+            mimetype='application/vnd.mapbox-vector-tile'
+        )
+    return entry
+
+@app.route('/tiles/<int:z>/<int:x>/<int:y>.mvt', methods=['GET'])
+def get_vector_tile(z, x, y):
+    """Mapbox Vector Tile with lake outlines (and latest metrics) and catchment buffers"""
+    if z > MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return jsonify({'error': f'Invalid tile. Zoom must be 0-{MAX_ZOOM} and x, y within 0-2^zoom'}), 400
+    return tile_cache.respond(get_tile(z, x, y), cache_control='public, max-age=300')
+
+def parse_zoom_levels(spec):
+    """Zoom levels from a spec like "10-14" or "10,12,14" """
+    zooms = set()
+    for part in filter(None, (part.strip() for part in spec.split(','))):
+        if '-' in part:
+            low, high = part.split('-', 1)
+            zooms.update(range(int(low), int(high) + 1))
+        else:
+            zooms.add(int(part))
+    return sorted(zoom for zoom in zooms if 0 <= zoom <= MAX_ZOOM)
+
+def seed_tiles(zooms):
+    """Render every tile touching a lake catchment at the given zoom levels"""
+    started = time.perf_counter()
+    count = 0
+    for z, x, y in get_tile_source().tiles(zooms):
+        get_tile(z, x, y)
+        count += 1
+    log.info("Seeded %d vector tiles for zooms %s in %.1fs", count, zooms, time.perf_counter() - started)
+
+startup.checkpoint('app_module')
+
+_initialized_pid = None
+_init_lock = threading.Lock()
+
+def finish_startup(earth_engine_initialized=None):
+    startup_finished.set()
+    startup.finish(engine=engine.NAME, earth_engine_initialized=earth_engine_initialized)
+
+def create_app(interactive=False):
+    """Start Earth Engine initialization and background precomputation, and return the app.
+
+    Importing this module only builds shared, fork-safe state (lake registry,
+    result cache). The rest happens here once per process, so a pre-forking
+    server can import the app in its master and call create_app() in each
+    worker (see gunicorn.conf.py).
+    
+    Earth Engine is initialized on a background thread, so the app serves
+    /health and cached results right away and /ready reports when it is
+    done. Only interactive initialization, which may prompt for
+    authentication, runs before this returns.
+    """
+    global _initialized_pid
+    with _init_lock:
+        if _initialized_pid == os.getpid():
+            return app
+        _initialized_pid = os.getpid()
+        
+        with startup.phase('create_app'):
+            if os.environ.get('NEER_PRECOMPUTE', '1') == '1':
+                precompute.start()
+            
+            if TILE_SEED_ZOOMS:
+                threading.Thread(
+                    target=seed_tiles,
+                    args=(parse_zoom_levels(TILE_SEED_ZOOMS),),
+                    name='tile-seed',
+                    daemon=True
+                ).start()
+        
+        if engine.NAME != 'ee':
+            finish_startup()
+        elif interactive:
+            initialized = initialize_earth_engine(interactive=True)
+            ee_health.set_initialized(initialized)
+            finish_startup(initialized)
+        else:
+            ee_health.initialize_in_background(on_done=finish_startup)
+    return app
+
 if __name__ == '__main__':
+    # Development server; production uses gunicorn with wsgi.py. Only a
+    # terminal can answer the authentication prompt
+    create_app(interactive=sys.stdin.isatty())
     # Use environment variable for port (required for Railway/Heroku)
     port = int(os.environ.get('PORT', 5000))
     app.run(host='0.0.0.0', port=port, debug=False)
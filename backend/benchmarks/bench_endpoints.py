@@ -0,0 +1,251 @@
+"""Benchmark every API route against a fake Earth Engine.
+
+    python benchmarks/bench_endpoints.py [--latency 0.05] [--failure-rate 0] [--update]
+
+benchmarks/fake_ee.py stands in for the ``ee`` package, so no credentials or
+network are needed; each getInfo() takes --latency seconds. Every scenario
+is requested cold (fresh caches, in the order below, as a new server would
+see them) and then again warm. For each the harness reports wall time,
+getInfo round trips, response bytes and peak Python memory.
+
+The run is compared with benchmarks/baseline.json and exits with status 1
+when a scenario makes more round trips than recorded, or takes longer than
+--tolerance x the recorded time plus --slack-ms. Wall times are only
+compared when the baseline was recorded with the same latency and failure
+rate; round trips are not compared with --failure-rate, since retries add
+to them.
+--update records this run as the new baseline.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import fake_ee  # noqa: E402
+
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'baseline.json')
+
+# A Coimbatore tile with all five lakes at zoom 12
+TILE = (12, 2923, 1922)
+
+
+def get(path, **kwargs):
+    return lambda client: [client.get(path, **kwargs)]
+
+
+def concurrently(*paths):
+    """GET the paths at the same time, as several users (or dashboard panels) would"""
+    def fetch(client, path):
+        response = client.application.test_client().get(path)
+        # Streamed bodies are produced in the request's own context
+        response.get_data()
+        return response
+
+    def requests(client):
+        with ThreadPoolExecutor(len(paths)) as pool:
+            return list(pool.map(lambda path: fetch(client, path), paths))
+    return requests
+
+
+def history_job(client):
+    """Submit a history job, follow its progress stream, then fetch the result"""
+    submitted = client.post('/api/jobs', json={
+        'type': 'history',
+        'params': {'lake_id': 'valankulam', 'start_year': 2019, 'end_year': 2024}
+    })
+    job_id = submitted.get_json()['id']
+    events = client.get(f'/api/jobs/{job_id}/events')
+    # The stream ends when the job does
+    events.get_data()
+    return [submitted, events, client.get(f'/api/jobs/{job_id}'), client.get(f'/api/jobs/{job_id}/result')]
+
+
+# (name, route, requests); every route of the app must be covered
+SCENARIOS = [
+    ('home', '/', get('/')),
+    ('health', '/health', get('/health')),
+    ('ready', '/ready', get('/ready')),
+    ('test', '/api/test', get('/api/test')),
+    ('lakes_mock', '/api/lakes/mock', get('/api/lakes/mock')),
+    ('lakes', '/api/lakes', get('/api/lakes?year=2023')),
+    ('lakes_stream', '/api/lakes', get('/api/lakes?year=2022&stream=ndjson')),
+    ('geometries', '/api/lakes/geometries', get('/api/lakes/geometries?zoom=12')),
+    ('history', '/api/lakes/<lake_id>/history', get('/api/lakes/ukkadam/history?start_year=2019&end_year=2024')),
+    (
+        'history_monthly', '/api/lakes/<lake_id>/history',
+        get('/api/lakes/perur/history?start_year=2023&end_year=2024&granularity=monthly')
+    ),
+    ('history_matrix', '/api/history', get('/api/history?start=2019&end=2024')),
+    ('alerts', '/api/alerts', get('/api/alerts')),
+    ('pollution_sources', '/api/pollution-sources/<lake_id>', get('/api/pollution-sources/ukkadam')),
+    ('tile', '/tiles/<int:z>/<int:x>/<int:y>.mvt', get('/tiles/{}/{}/{}.mvt'.format(*TILE))),
+    ('job', '/api/jobs', history_job),
+    ('ee_stats', '/api/ee/stats', get('/api/ee/stats')),
+    ('precompute_status', '/api/precompute/status', get('/api/precompute/status')),
+    ('metrics', '/metrics', get('/metrics')),
+    # Identical in-flight computations are shared, so round trips follow distinct lakes and periods
+    ('lakes_concurrent', '/api/lakes', concurrently(*['/api/lakes?year=2017'] * 8)),
+    (
+        'history_concurrent', '/api/history',
+        concurrently(
+            *['/api/lakes/kurichi/history?start_year=2017&end_year=2020'] * 4,
+            *['/api/history?lakes=kurichi,perur&start=2017&end=2020'] * 2
+        )
+    )
+]
+
+# Covered by the job scenario
+JOB_ROUTES = ('/api/jobs/<job_id>', '/api/jobs/<job_id>/result', '/api/jobs/<job_id>/events')
+
+
+def load_app(data_dir):
+    """Import the app against the fake Earth Engine, with caches in data_dir"""
+    sys.modules['ee'] = fake_ee
+    os.environ['NEER_ENGINE'] = 'ee'
+    os.environ['NEER_CACHE_PATH'] = os.path.join(data_dir, 'cache.sqlite3')
+    os.environ['NEER_TIMESERIES_PATH'] = os.path.join(data_dir, 'timeseries.sqlite3')
+    os.environ['NEER_PRECOMPUTE'] = '0'
+    os.environ['NEER_TILE_SEED_ZOOMS'] = ''
+    import app
+    app.create_app()
+    # Earth Engine is initialized in the background
+    app.startup_finished.wait(30)
+    return app
+
+
+def uncovered_routes(flask_app):
+    covered = {route for _, route, _ in SCENARIOS} | set(JOB_ROUTES) | {'/static/<path:filename>'}
+    return sorted(rule.rule for rule in flask_app.url_map.iter_rules() if rule.rule not in covered)
+
+
+def measure(client, requests):
+    fake_ee.reset()
+    tracemalloc.reset_peak()
+    memory = tracemalloc.get_traced_memory()[0]
+    started = time.perf_counter()
+    responses = requests(client)
+    # Streamed bodies are produced while they are read
+    size = sum(len(response.get_data()) for response in responses)
+    wall_ms = (time.perf_counter() - started) * 1000
+    ee_stats = fake_ee.stats()
+    return {
+        'status': [response.status_code for response in responses],
+        'wall_ms': round(wall_ms, 1),
+        'round_trips': ee_stats['round_trips'],
+        'failures': ee_stats['failures'],
+        'ee_bytes': ee_stats['bytes'],
+        'response_bytes': size,
+        # Above what was allocated before the requests
+        'peak_kib': round((tracemalloc.get_traced_memory()[1] - memory) / 1024, 1)
+    }
+
+
+def run(flask_app):
+    client = flask_app.test_client()
+    results = {}
+    for run_name in ('cold', 'warm'):
+        for name, _, requests in SCENARIOS:
+            results.setdefault(name, {})[run_name] = measure(client, requests)
+    return results
+
+
+def report(results):
+    header = f"{'scenario':<18} {'run':<5} {'status':<16} {'wall ms':>9} {'trips':>6} {'failed':>6} {'ee KiB':>8} {'resp KiB':>9} {'peak KiB':>9}"
+    print(header)
+    print('-' * len(header))
+    for name, runs in results.items():
+        for run_name, result in runs.items():
+            print(
+                f"{name:<18} {run_name:<5} {','.join(map(str, result['status'])):<16}"
+                f" {result['wall_ms']:>9.1f} {result['round_trips']:>6} {result['failures']:>6}"
+                f" {result['ee_bytes'] / 1024:>8.1f} {result['response_bytes'] / 1024:>9.1f}"
+                f" {result['peak_kib']:>9.1f}"
+            )
+
+
+def regressions(results, baseline, settings, tolerance, slack_ms):
+    """Threshold violations of this run against the baseline"""
+    problems = []
+    compare_trips = settings['failure_rate'] == 0
+    compare_wall = baseline.get('settings') == settings
+    if not compare_trips:
+        print("Failures are injected; round trips are not compared")
+    if not compare_wall:
+        print("Baseline was recorded with other settings; wall times are not compared")
+    for name, runs in results.items():
+        for run_name, result in runs.items():
+            recorded = baseline.get('scenarios', {}).get(name, {}).get(run_name)
+            if recorded is None:
+                continue
+            if compare_trips and result['round_trips'] > recorded['round_trips']:
+                problems.append(
+                    f"{name} ({run_name}): {result['round_trips']} round trips, baseline {recorded['round_trips']}"
+                )
+            limit = recorded['wall_ms'] * tolerance + slack_ms
+            if compare_wall and result['wall_ms'] > limit:
+                problems.append(
+                    f"{name} ({run_name}): {result['wall_ms']:.0f} ms, limit {limit:.0f} ms"
+                    f" (baseline {recorded['wall_ms']:.0f} ms)"
+                )
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per getInfo round trip")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="fraction of round trips that fail")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=1.5, help="allowed wall time factor over the baseline")
+    parser.add_argument('--slack-ms', type=float, default=50, help="allowed wall time over the baseline")
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update', action='store_true', help="record this run as the baseline")
+    parser.add_argument('--json', help="also write the results to this file")
+    args = parser.parse_args()
+
+    settings = {'latency': args.latency, 'failure_rate': args.failure_rate}
+    fake_ee.configure(latency=args.latency, failure_rate=args.failure_rate, seed=args.seed)
+    tracemalloc.start()
+
+    with tempfile.TemporaryDirectory(prefix='neer-bench-') as data_dir:
+        flask_app = load_app(data_dir).app
+        missing = uncovered_routes(flask_app)
+        if missing:
+            print(f"Routes without a scenario: {', '.join(missing)}")
+        results = run(flask_app)
+
+    report(results)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'settings': settings, 'scenarios': results}, f, indent=2)
+
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump({'settings': settings, 'scenarios': results}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print("No baseline yet; run with --update to record one")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    problems = regressions(results, baseline, settings, args.tolerance, args.slack_ms)
+    for problem in problems:
+        print(f"REGRESSION {problem}")
+    if problems:
+        return 1
+    print("No regressions against the baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Benchmark the lake registry and lake endpoints with thousands of waterbodies.
+
+    python benchmarks/bench_lakes_scale.py [--lakes 5000] [--latency 0.05]
+
+Generates a GeoJSON of random tank-sized polygons spread over Coimbatore
+district, registers it with NEER_WATERBODIES_PATH and runs the app against
+the fake Earth Engine (see bench_endpoints). Reports
+
+* registry build and STRtree viewport queries against a linear scan,
+* viewport pages of /api/lakes (bbox + page), cold and warm,
+* a full-district refresh: metrics for every waterbody, buffered and
+  streamed, alerts and the history matrix of every waterbody,
+* vector tiles inside the district,
+
+with wall time, Earth Engine round trips (each one reduceRegions batch)
+and response size.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import bench_endpoints  # noqa: E402
+import fake_ee  # noqa: E402
+
+# Coimbatore district (min lon, min lat, max lon, max lat)
+DISTRICT = (76.65, 10.65, 77.25, 11.35)
+
+# A map viewport at about zoom 13
+VIEWPORT_DEGREES = 0.05
+
+
+def generate_waterbodies(count, seed=0):
+    """FeatureCollection of count irregular polygons, 30-400 m across, inside DISTRICT"""
+    rng = random.Random(seed)
+    features = []
+    for i in range(count):
+        lon = rng.uniform(DISTRICT[0], DISTRICT[2])
+        lat = rng.uniform(DISTRICT[1], DISTRICT[3])
+        radius = rng.uniform(15, 200) / 111320
+        vertices = rng.randint(8, 40)
+        ring = []
+        for k in range(vertices):
+            angle = 2 * math.pi * k / vertices
+            r = radius * rng.uniform(0.7, 1.0)
+            ring.append([round(lon + r * math.cos(angle) / math.cos(math.radians(lat)), 7),
+                         round(lat + r * math.sin(angle), 7)])
+        ring.append(ring[0])
+        features.append({
+            'type': 'Feature',
+            'properties': {'id': f"tank-{i + 1}", 'name': f"Tank {i + 1}"},
+            'geometry': {'type': 'Polygon', 'coordinates': [ring]}
+        })
+    return {'type': 'FeatureCollection', 'features': features}
+
+
+def viewports(count, seed=1):
+    rng = random.Random(seed)
+    for _ in range(count):
+        lon = rng.uniform(DISTRICT[0], DISTRICT[2] - VIEWPORT_DEGREES)
+        lat = rng.uniform(DISTRICT[1], DISTRICT[3] - VIEWPORT_DEGREES)
+        yield (lon, lat, lon + VIEWPORT_DEGREES, lat + VIEWPORT_DEGREES)
+
+
+def linear_query(lakes, bbox):
+    """Bounding box overlap test over every lake, what the index replaces"""
+    return [
+        lake for lake in lakes
+        if lake.bbox[0] <= bbox[2] and lake.bbox[2] >= bbox[0] and lake.bbox[1] <= bbox[3] and lake.bbox[3] >= bbox[1]
+    ]
+
+
+def timed(fn, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+def bench_registry(path, samples):
+    from lake_registry import LakeRegistry
+
+    build_ms, registry = timed(lambda: LakeRegistry(waterbodies=path))
+    snapshot = registry.snapshot()
+    index_ms, _ = timed(lambda: snapshot.index)
+    boxes = list(viewports(samples))
+    query_ms, _ = timed(lambda: [snapshot.query(bbox) for bbox in boxes])
+    linear_ms, _ = timed(lambda: [linear_query(snapshot.lakes, bbox) for bbox in boxes])
+    found = sum(len(snapshot.query(bbox)) for bbox in boxes) / len(boxes)
+    print(f"Registry: {len(snapshot.lakes)} lakes built in {build_ms:.0f} ms, STRtree in {index_ms:.0f} ms")
+    print(
+        f"Viewport query ({VIEWPORT_DEGREES} deg, {found:.1f} lakes on average):"
+        f" STRtree {query_ms / len(boxes) * 1000:.0f} us, linear scan {linear_ms / len(boxes) * 1000:.0f} us"
+    )
+
+
+def district_tiles(count, z=13, seed=2):
+    from vector_tiles import tile_range, to_mercator
+
+    rng = random.Random(seed)
+    (minx, miny), (maxx, maxy) = to_mercator(np.array([DISTRICT[:2], DISTRICT[2:]]))
+    cols, rows = tile_range((minx, miny, maxx, maxy), z)
+    return [(z, rng.choice(cols), rng.choice(rows)) for _ in range(count)]
+
+
+def scenarios(pages):
+    page_paths = [
+        '/api/lakes?year=2023&bbox={},{},{},{}&page=1'.format(*bbox) for bbox in viewports(pages, seed=3)
+    ]
+    return [
+        ('viewport_pages', lambda client: [client.get(path) for path in page_paths]),
+        ('district_page', bench_endpoints.get('/api/lakes?year=2022&page=3&page_size=500')),
+        ('district_lakes', bench_endpoints.get('/api/lakes?year=2021')),
+        ('district_stream', bench_endpoints.get('/api/lakes?year=2020&stream=ndjson')),
+        ('district_alerts', bench_endpoints.get('/api/alerts')),
+        ('district_history', bench_endpoints.get('/api/history?start=2018&end=2024&indices=bodLevel,waterHealth')),
+        ('district_tiles', lambda client: [
+            client.get(f'/tiles/{z}/{x}/{y}.mvt') for z, x, y in district_tiles(20)
+        ])
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lakes', type=int, default=5000, help="number of waterbodies")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds per getInfo round trip")
+    parser.add_argument('--queries', type=int, default=500, help="viewport queries against the registry")
+    parser.add_argument('--pages', type=int, default=20, help="viewport pages requested from /api/lakes")
+    parser.add_argument('--trace-memory', action='store_true', help="report peak memory (slows everything down)")
+    args = parser.parse_args()
+
+    fake_ee.configure(latency=args.latency)
+    with tempfile.TemporaryDirectory(prefix='neer-scale-') as data_dir:
+        path = os.path.join(data_dir, 'waterbodies.geojson')
+        with open(path, 'w') as f:
+            json.dump(generate_waterbodies(args.lakes), f)
+        os.environ['NEER_WATERBODIES_PATH'] = path
+        # Keep registry timings free of the other modules' import time
+        sys.modules['ee'] = fake_ee
+        bench_registry(path, args.queries)
+
+        if args.trace_memory:
+            bench_endpoints.tracemalloc.start()
+        client = bench_endpoints.load_app(data_dir).app.test_client()
+        results = {}
+        for run_name in ('cold', 'warm'):
+            for name, requests in scenarios(args.pages):
+                results.setdefault(name, {})[run_name] = bench_endpoints.measure(client, requests)
+        print()
+        bench_endpoints.report(results)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
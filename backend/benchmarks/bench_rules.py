@@ -0,0 +1,169 @@
+"""Benchmark the vectorized water quality rules against per-record evaluation.
+
+    python benchmarks/bench_rules.py [--lakes 10000] [--periods 120]
+
+Random index values for a lakes x periods matrix are run through
+rules.evaluate (BOD, health, causes, suggestions and trends in one pass)
+and through the per-record Python the endpoints used before. Both must
+agree on every cell, for the random matrix and for EDGE_CASES.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import rules  # noqa: E402
+
+RANGES = {
+    'NDWI': (-0.3, 0.6),
+    'NDCI': (-0.2, 0.3),
+    'FAI': (-0.1, 0.1),
+    'MCI': (0, 30),
+    'Turbidity': (100, 1500),
+    'SWIR_Ratio': (0.6, 1.8)
+}
+
+
+def random_indices(lakes, periods, missing=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    indices = {band: rng.uniform(lo, hi, (lakes, periods)) for band, (lo, hi) in RANGES.items()}
+    # Periods without a cloud-free scene
+    indices['NDWI'][rng.random((lakes, periods)) < missing] = np.nan
+    return indices
+
+
+# Rows of NDWI with the other indices on their thresholds: a leading gap
+# (the baseline is the first valid period), a lake without data, a gap
+# between changes (trends compare to the last valid period) and BOD on the
+# health class boundaries
+EDGE_CASES = {
+    'NDWI': [
+        [np.nan, 0.1, 0.2, 0.1],
+        [np.nan, np.nan, np.nan, np.nan],
+        [0.1, np.nan, 0.2, np.nan],
+        [(8 - rules.BOD_INTERCEPT) / rules.BOD_SLOPE, (4 - rules.BOD_INTERCEPT) / rules.BOD_SLOPE, 0.2, -0.5]
+    ],
+    'NDCI': [[0.0] * 4] * 4,
+    'FAI': [[0.05, 0.06, 0.0, 0.1]] * 4,
+    'MCI': [[0.0] * 4] * 4,
+    'Turbidity': [[1000, 1001, 0, 1500]] * 4,
+    'SWIR_Ratio': [[1.5, 1.6, 0.0, 2.0]] * 4
+}
+
+
+def per_record(indices):
+    """The per-record rules as the endpoints evaluated them before.
+
+    Returns arrays shaped like the indices, like rules.evaluate; cells
+    without NDWI were skipped, so they hold NaN and None.
+    """
+    lakes, periods = np.shape(indices['NDWI'])
+    results = {'bod': np.full((lakes, periods), np.nan)}
+    for field in ('health', 'causes', 'suggestions', 'trend'):
+        results[field] = np.full((lakes, periods), None, dtype=object)
+    for lake in range(lakes):
+        previous_bod = None
+        for period in range(periods):
+            values = {band: float(np.asarray(indices[band])[lake, period]) for band in RANGES}
+            if np.isnan(values['NDWI']):
+                continue
+            bod = 26.303 * values['NDWI'] + 7.546
+            health = "Poor" if bod > 8 else "Moderate" if bod > 4 else "Good"
+            if previous_bod is None:
+                trend = "baseline"
+            elif bod < previous_bod - 1:
+                trend = "improving"
+            elif bod > previous_bod + 1:
+                trend = "degrading"
+            else:
+                trend = "stable"
+            reasons = []
+            suggestions = []
+            if values['FAI'] > 0.05:
+                reasons.append("Algal bloom")
+                suggestions.append("Limit nutrient runoff")
+            if values['NDWI'] < 0.2:
+                reasons.append("Water scarcity")
+                suggestions.append("Increase water inflow")
+            if values['SWIR_Ratio'] > 1.5:
+                reasons.append("Chemical or sediment pollution")
+                suggestions.append("Investigate industrial discharges")
+            if values['Turbidity'] > 1000:
+                reasons.append("High sediment or garbage dumping")
+                suggestions.append("Reduce catchment erosion / waste dumping")
+            results['bod'][lake, period] = bod
+            results['health'][lake, period] = health
+            results['causes'][lake, period] = ", ".join(reasons) or "No major issues"
+            results['suggestions'][lake, period] = ", ".join(suggestions) or "No action needed"
+            results['trend'][lake, period] = trend
+            previous_bod = bod
+    return results
+
+
+def check(indices, reference):
+    """Raise AssertionError where rules.evaluate differs from the per-record results"""
+    result = rules.evaluate(indices, trend_axis=1)
+    valid = ~np.isnan(np.asarray(indices['NDWI'], dtype=float))
+    if not np.array_equal(result['bod'], reference['bod'], equal_nan=True):
+        raise AssertionError("bod differs from the per-record rules")
+    for field in ('health', 'trend'):
+        differs = np.argwhere(result[field] != reference[field])
+        if differs.size:
+            lake, period = differs[0]
+            raise AssertionError(
+                f"{field} differs at lake {lake}, period {period}: "
+                f"{result[field][lake, period]!r} != {reference[field][lake, period]!r}"
+            )
+    # The per-record code skipped cells without NDWI
+    for field in ('causes', 'suggestions'):
+        differs = np.argwhere(valid & (result[field] != reference[field]))
+        if differs.size:
+            lake, period = differs[0]
+            raise AssertionError(
+                f"{field} differ at lake {lake}, period {period}: "
+                f"{result[field][lake, period]!r} != {reference[field][lake, period]!r}"
+            )
+
+
+def timed(fn, *args, repeat=3):
+    """(best time, result of the last run)"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--lakes', type=int, default=10000)
+    parser.add_argument('--periods', type=int, default=120)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-reference', action='store_true', help="only time the vectorized rules")
+    args = parser.parse_args()
+
+    check(EDGE_CASES, per_record(EDGE_CASES))
+
+    indices = random_indices(args.lakes, args.periods)
+    cells = args.lakes * args.periods
+    print(f"{args.lakes} lakes x {args.periods} periods = {cells:,} cells")
+
+    vectorized, _ = timed(lambda: rules.evaluate(indices, trend_axis=1), repeat=args.repeat)
+    print(f"vectorized: {vectorized:.3f}s ({cells / vectorized / 1e6:.1f}M cells/s)")
+
+    if not args.skip_reference:
+        reference, results = timed(per_record, indices, repeat=1)
+        print(f"per-record: {reference:.3f}s ({cells / reference / 1e6:.2f}M cells/s)")
+        print(f"speedup:    {reference / vectorized:.1f}x")
+        check(indices, results)
+        print("results:    identical")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Check that coalesced lake reductions cannot deadlock the Earth Engine pool.
+
+    python benchmarks/check_pool_deadlock.py
+
+Replays the interleaving that used to hang with a pool of 2 workers and one
+lake per reduceRegions batch:
+
+1. a thread outside the pool (a request or refresh) leads the lake_means
+   keys of every lake for a year and is about to fan out its batches,
+2. /api/lakes streaming fills the pool with lake_means tasks for the same
+   year, which wait for the keys the first thread leads,
+3. the leader's batches must still run, although no pool worker is free.
+
+Exits non-zero if the leader or the waiting pool tasks do not finish.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+# Before the app (and ee_client, ee_engine) is imported
+os.environ['NEER_EE_CONCURRENCY'] = '2'
+os.environ['NEER_EE_BATCH_LAKES'] = '1'
+
+import bench_endpoints  # noqa: E402
+import fake_ee  # noqa: E402
+
+YEAR = 2019
+TIMEOUT = 10
+
+
+def main():
+    fake_ee.configure(latency=0.05)
+    with tempfile.TemporaryDirectory(prefix='neer-deadlock-') as data_dir:
+        app = bench_endpoints.load_app(data_dir)
+        ee_client = app.ee_client
+        lakes = app.lake_registry.lakes
+        assert ee_client.MAX_WORKERS == 2 and len(lakes) > ee_client.MAX_WORKERS
+
+        leading = threading.Event()
+        coalesced = app.engine_flight.coalesced
+        lake_batches = app.engine.lake_batches
+
+        def leader_batches(batch_lakes):
+            # The leader holds every key; wait until the pool workers wait for them
+            if threading.current_thread().name == 'leader':
+                leading.set()
+                deadline = time.monotonic() + TIMEOUT
+                while app.engine_flight.coalesced < coalesced + ee_client.MAX_WORKERS:
+                    if time.monotonic() > deadline:
+                        raise RuntimeError("pool tasks never waited for the leader")
+                    time.sleep(0.01)
+            return lake_batches(batch_lakes)
+
+        app.engine.lake_batches = leader_batches
+        results = {}
+        leader = threading.Thread(
+            target=lambda: results.update(app.lake_means(lakes, YEAR)), name='leader', daemon=True
+        )
+        leader.start()
+        if not leading.wait(TIMEOUT):
+            print("leader never started")
+            os._exit(1)
+        waiting = [ee_client.submit(app.lake_means, [lake], YEAR) for lake in lakes[:ee_client.MAX_WORKERS]]
+
+        leader.join(TIMEOUT)
+        if leader.is_alive():
+            print(f"deadlock: the leader and {len(waiting)} pool workers are still waiting after {TIMEOUT}s")
+            # Pool threads are not daemons; exit without joining them
+            os._exit(1)
+        for future in waiting:
+            future.result(timeout=TIMEOUT)
+        app.engine.lake_batches = lake_batches
+
+    print(f"ok: {len(results)} lakes reduced by the leader, {len(waiting)} pool tasks shared its result")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,606 @@
+"""In-process stand-in for the Earth Engine client library (``ee``).
+
+Installed as ``sys.modules['ee']`` by the benchmark harness, so the app and
+ee_engine build their computations against it unchanged. Objects evaluate
+eagerly; nothing leaves the process until ``getInfo()``, which counts as one
+round trip, sleeps for the configured latency and fails at the configured
+rate with a retryable quota error.
+
+Index means and land cover areas are derived from a hash of the geometry,
+date range and band, so every run returns the same values.
+"""
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+
+_lock = threading.Lock()
+_settings = {'latency': 0.0, 'failure_rate': 0.0}
+_random = random.Random(0)
+_stats = {'round_trips': 0, 'failures': 0, 'bytes': 0}
+
+# Range of the mean of each index band
+RANGES = {
+    'NDWI': (-0.3, 0.6),
+    'NDCI': (-0.2, 0.3),
+    'FAI': (-0.1, 0.1),
+    'MCI': (0, 30),
+    'Turbidity': (100, 1500),
+    'SWIR_Ratio': (0.6, 1.8)
+}
+
+S2_BANDS = ['B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'B12']
+
+
+class EEException(Exception):
+    pass
+
+
+def configure(latency=0.0, failure_rate=0.0, seed=0):
+    """Seconds each getInfo() takes, and the fraction that fail"""
+    with _lock:
+        _settings['latency'] = latency
+        _settings['failure_rate'] = failure_rate
+        _random.seed(seed)
+
+
+def reset():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
+
+
+def stats():
+    """Round trips, failed round trips and JSON bytes returned since reset()"""
+    with _lock:
+        return dict(_stats)
+
+
+def Initialize(*args, **kwargs):
+    return None
+
+
+def Authenticate(*args, **kwargs):
+    return None
+
+
+def _seeded(*parts, lo=0.0, hi=1.0):
+    digest = hashlib.sha1("|".join(str(part) for part in parts).encode()).hexdigest()
+    return lo + (int(digest[:8], 16) / 0xFFFFFFFF) * (hi - lo)
+
+
+def _evaluate(value):
+    if isinstance(value, _Object):
+        return value._value()
+    if isinstance(value, (list, tuple)):
+        return [_evaluate(item) for item in value]
+    if isinstance(value, dict):
+        return {key: _evaluate(item) for key, item in value.items()}
+    return value
+
+
+def _wrap(value):
+    if isinstance(value, _Object):
+        return value
+    if isinstance(value, (int, float)):
+        return Number(value)
+    if isinstance(value, str):
+        return String(value)
+    if isinstance(value, dict):
+        return Dictionary(value)
+    if isinstance(value, list):
+        return List(value)
+    return value
+
+
+class _Object:
+    def getInfo(self):
+        with _lock:
+            _stats['round_trips'] += 1
+            latency = _settings['latency']
+            failed = _settings['failure_rate'] and _random.random() < _settings['failure_rate']
+        if latency:
+            time.sleep(latency)
+        if failed:
+            with _lock:
+                _stats['failures'] += 1
+            raise EEException("Too many concurrent aggregations.")
+        result = _evaluate(self)
+        size = len(json.dumps(result))
+        with _lock:
+            _stats['bytes'] += size
+        return result
+
+    def _value(self):
+        raise NotImplementedError
+
+
+class Number(_Object):
+    def __init__(self, value):
+        self.v = _evaluate(value)
+
+    def _value(self):
+        return self.v
+
+    def format(self, fmt='%s'):
+        return String(str(int(self.v)) if float(self.v).is_integer() else str(self.v))
+
+    def add(self, other):
+        return Number(self.v + _evaluate(other))
+
+    def subtract(self, other):
+        return Number(self.v - _evaluate(other))
+
+    def multiply(self, other):
+        return Number(self.v * _evaluate(other))
+
+    def divide(self, other):
+        return Number(self.v / _evaluate(other))
+
+    def gt(self, other):
+        return Number(self.v > _evaluate(other))
+
+    def int(self):
+        return Number(int(self.v))
+
+    def toInt(self):
+        return Number(int(self.v))
+
+
+class String(_Object):
+    def __init__(self, value):
+        self.v = _evaluate(value)
+
+    def _value(self):
+        return self.v
+
+    def cat(self, other):
+        return String(self.v + str(_evaluate(other)))
+
+
+class List(_Object):
+    def __init__(self, value):
+        self.v = value.v if isinstance(value, List) else list(_evaluate(value))
+
+    def _value(self):
+        return [_evaluate(item) for item in self.v]
+
+    def map(self, fn):
+        return List([fn(_wrap(item)) for item in self.v])
+
+    def flatten(self):
+        flat = []
+        for item in self._value():
+            flat.extend(item if isinstance(item, list) else [item])
+        return List(flat)
+
+    def size(self):
+        return Number(len(self.v))
+
+    def get(self, index):
+        return _wrap(self.v[_evaluate(index)])
+
+
+class Dictionary(_Object):
+    def __init__(self, value=None):
+        self.v = {} if value is None else (value.v if isinstance(value, Dictionary) else value)
+
+    def _value(self):
+        return _evaluate(self.v)
+
+    def get(self, key, default=None):
+        return _wrap(self._value().get(_evaluate(key), default))
+
+    def set(self, key, value):
+        values = dict(self.v)
+        values[_evaluate(key)] = value
+        return Dictionary(values)
+
+    def combine(self, other):
+        values = dict(self.v)
+        values.update(other.v if isinstance(other, Dictionary) else other)
+        return Dictionary(values)
+
+
+class Date(_Object):
+    def __init__(self, value):
+        self.v = _evaluate(value)
+
+    def _value(self):
+        return self.v
+
+    @staticmethod
+    def fromYMD(year, month, day):
+        return Date(f"{int(_evaluate(year)):04d}-{int(_evaluate(month)):02d}-{int(_evaluate(day)):02d}")
+
+    def format(self, fmt=None):
+        return String(self.v)
+
+
+class Algorithms:
+    @staticmethod
+    def If(condition, true_case, false_case):
+        return true_case if _evaluate(condition) else false_case
+
+
+class Filter:
+    @staticmethod
+    def lt(name, value):
+        return ('lt', name, value)
+
+    @staticmethod
+    def gt(name, value):
+        return ('gt', name, value)
+
+    @staticmethod
+    def eq(name, value):
+        return ('eq', name, _evaluate(value))
+
+    @staticmethod
+    def inList(name, values):
+        return ('inList', name, _evaluate(values))
+
+    @staticmethod
+    def calendarRange(start, end, field):
+        return ('calendarRange', _evaluate(start), _evaluate(end), field)
+
+
+class _Reducer:
+    def __init__(self, kind, group_name=None):
+        self.kind = kind
+        self.group_name = group_name
+
+    def group(self, groupField=1, groupName='group'):
+        return _Reducer(self.kind, group_name=groupName)
+
+    def setOutputs(self, names):
+        return self
+
+
+class Reducer:
+    @staticmethod
+    def mean():
+        return _Reducer('mean')
+
+    @staticmethod
+    def sum():
+        return _Reducer('sum')
+
+    @staticmethod
+    def count():
+        return _Reducer('count')
+
+
+def _ring_area(rings):
+    """Area (m^2) of a polygon's outer ring, equirectangular approximation"""
+    ring = rings[0]
+    lat = sum(point[1] for point in ring) / len(ring)
+    kx = 111320 * math.cos(math.radians(lat))
+    ky = 110540
+    twice = sum(
+        (x1 * kx) * (y2 * ky) - (x2 * kx) * (y1 * ky)
+        for (x1, y1), (x2, y2) in zip(ring, ring[1:])
+    )
+    return abs(twice) / 2
+
+
+def _area(geojson):
+    if geojson is None:
+        return 0.0
+    if geojson['type'] == 'Polygon':
+        return _ring_area(geojson['coordinates'])
+    if geojson['type'] == 'MultiPolygon':
+        return sum(_ring_area(polygon) for polygon in geojson['coordinates'])
+    if geojson['type'] == 'GeometryCollection':
+        return sum(_area(geometry) for geometry in geojson['geometries'])
+    return 0.0
+
+
+def _union(geometries):
+    polygons = []
+    for geojson in geometries:
+        if geojson is None:
+            continue
+        if geojson['type'] == 'Polygon':
+            polygons.append(geojson['coordinates'])
+        elif geojson['type'] == 'MultiPolygon':
+            polygons.extend(geojson['coordinates'])
+    if len(polygons) == 1:
+        return {'type': 'Polygon', 'coordinates': polygons[0]}
+    return {'type': 'MultiPolygon', 'coordinates': polygons}
+
+
+class Geometry(_Object):
+    def __init__(self, geojson, buffered=0):
+        self.geojson = geojson
+        self.buffered = buffered
+
+    def _value(self):
+        return self.geojson
+
+    def buffer(self, distance, *args):
+        return Geometry(self.geojson, self.buffered + _evaluate(distance))
+
+    def area(self, *args, **kwargs):
+        area = _area(self.geojson)
+        if self.buffered:
+            radius = math.sqrt(area / math.pi) + self.buffered
+            area = math.pi * radius * radius
+        return Number(area)
+
+    def signature(self):
+        return hashlib.sha1(repr(self.geojson).encode()).hexdigest()[:10] + f"b{self.buffered}"
+
+    @staticmethod
+    def Polygon(coordinates):
+        return Geometry({'type': 'Polygon', 'coordinates': coordinates})
+
+    @staticmethod
+    def MultiPolygon(coordinates):
+        return Geometry({'type': 'MultiPolygon', 'coordinates': coordinates})
+
+    @staticmethod
+    def Rectangle(coordinates):
+        x0, y0, x1, y1 = coordinates
+        return Geometry({
+            'type': 'Polygon',
+            'coordinates': [[[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]]
+        })
+
+
+class Feature(_Object):
+    def __init__(self, geometry, properties=None):
+        if isinstance(geometry, Dictionary):
+            # A feature taken from a List, cast back with ee.Feature()
+            geometry = geometry._value()
+        if isinstance(geometry, Feature):
+            self.geom, self.props = geometry.geom, dict(geometry.props)
+            return
+        if isinstance(geometry, dict) and geometry.get('type') == 'Feature':
+            self.geom = Geometry(geometry['geometry'])
+            self.props = dict(geometry.get('properties') or {})
+            return
+        if isinstance(geometry, dict):
+            geometry = Geometry(geometry)
+        self.geom = geometry
+        self.props = dict(_evaluate(properties) or {})
+
+    def _value(self):
+        return {
+            'type': 'Feature',
+            'geometry': self.geom._value() if self.geom else None,
+            'properties': _evaluate(self.props)
+        }
+
+    def geometry(self):
+        return self.geom
+
+    def set(self, *args):
+        feature = Feature(self)
+        if len(args) == 1:
+            feature.props.update(_evaluate(args[0]))
+        else:
+            feature.props[_evaluate(args[0])] = _evaluate(args[1])
+        return feature
+
+    def get(self, key):
+        return _wrap(self.props.get(_evaluate(key)))
+
+    def toDictionary(self, properties=None):
+        return Dictionary(dict(self.props))
+
+
+class FeatureCollection(_Object):
+    def __init__(self, source, *args):
+        if isinstance(source, FeatureCollection):
+            self.features = list(source.features)
+        elif isinstance(source, dict) and source.get('type') == 'FeatureCollection':
+            self.features = [Feature(feature) for feature in source['features']]
+        elif isinstance(source, dict) and source.get('type') == 'Feature':
+            self.features = [Feature(source)]
+        elif isinstance(source, dict):
+            self.features = [Feature(Geometry(source))]
+        elif isinstance(source, Feature):
+            self.features = [source]
+        elif isinstance(source, Geometry):
+            self.features = [Feature(source)]
+        else:
+            items = source.v if isinstance(source, List) else source
+            self.features = [item if isinstance(item, Feature) else Feature(item) for item in items]
+
+    def _value(self):
+        return {'type': 'FeatureCollection', 'features': [feature._value() for feature in self.features]}
+
+    def geometry(self, *args):
+        buffered = max([feature.geom.buffered for feature in self.features if feature.geom] or [0])
+        return Geometry(_union([feature.geom.geojson for feature in self.features if feature.geom]), buffered)
+
+    def map(self, fn):
+        return FeatureCollection([fn(feature) for feature in self.features])
+
+    def merge(self, other):
+        return FeatureCollection(self.features + other.features)
+
+    def flatten(self):
+        flat = []
+        for feature in self.features:
+            flat.extend(feature.features if isinstance(feature, FeatureCollection) else [feature])
+        return FeatureCollection(flat)
+
+    def size(self):
+        return Number(len(self.features))
+
+    def toList(self, count, *args):
+        return List(self.features[:_evaluate(count)])
+
+    def filter(self, condition):
+        return self
+
+    def aggregate_array(self, name):
+        return List([feature.props.get(name) for feature in self.features])
+
+
+class ImageCollection(_Object):
+    def __init__(self, name, period=None, images=None):
+        self.name = name if isinstance(name, str) else 'list'
+        self.period = period
+        self.images = images
+
+    def _value(self):
+        return {'type': 'ImageCollection', 'id': self.name}
+
+    def filterDate(self, start, end=None):
+        return ImageCollection(self.name, (_evaluate(start), _evaluate(end)), self.images)
+
+    def filter(self, condition):
+        return self
+
+    def filterBounds(self, geometry):
+        return self
+
+    def select(self, bands):
+        return self
+
+    def map(self, fn):
+        return ImageCollection(self.name, self.period, [fn(image) for image in (self.images or [])])
+
+    def median(self):
+        return Image(S2_BANDS, self.period)
+
+    def toBands(self):
+        return self
+
+    def size(self):
+        start = self.period[0] if self.period else ''
+        return Number(int(_seeded(self.name, start, 'size', lo=5, hi=60)))
+
+    @staticmethod
+    def fromImages(images):
+        return ImageCollection('list', None, list(images.v if isinstance(images, List) else images))
+
+
+class Image(_Object):
+    def __init__(self, bands=None, period=None, kind='raw', props=None):
+        if isinstance(bands, (int, float)):
+            bands = ['constant']
+        self.bands = list(bands or [])
+        self.period = period
+        self.kind = kind
+        self.props = props or {}
+
+    def _value(self):
+        return {'type': 'Image', 'bands': self.bands}
+
+    def _derive(self, bands, kind=None):
+        return Image(bands, self.period, kind or self.kind, dict(self.props))
+
+    def normalizedDifference(self, bands):
+        return self._derive(['nd'], kind='nd:' + ",".join(bands))
+
+    def expression(self, expression, mapping=None):
+        return self._derive(['constant'], kind='expression')
+
+    def select(self, bands, *args):
+        return self._derive([bands] if isinstance(bands, str) else list(bands))
+
+    def rename(self, *names):
+        if len(names) == 1 and isinstance(names[0], (list, tuple)):
+            names = names[0]
+        return self._derive(list(names))
+
+    def reduce(self, reducer):
+        return self._derive([reducer.kind])
+
+    def divide(self, other):
+        return self._derive(self.bands)
+
+    def multiply(self, other):
+        return self._derive(self.bands, kind=self.kind + '*' + getattr(other, 'kind', 'x'))
+
+    def add(self, other):
+        return self._derive(self.bands, kind=self.kind + '+')
+
+    def gt(self, value):
+        return self._derive(self.bands, kind=self.kind + f'>{value}')
+
+    def lt(self, value):
+        return self._derive(self.bands, kind=self.kind + f'<{value}')
+
+    def eq(self, value):
+        return self._derive(self.bands, kind=self.kind + '=')
+
+    def And(self, other):
+        return self._derive(self.bands, kind=self.kind + '&')
+
+    def Or(self, other):
+        return self._derive(self.bands, kind=self.kind + '|')
+
+    def where(self, test, value):
+        return self._derive(self.bands, kind=self.kind + 'w')
+
+    def updateMask(self, mask):
+        return self
+
+    def unmask(self, *args):
+        return self
+
+    def toInt(self):
+        return self
+
+    def clip(self, geometry):
+        return self
+
+    def addBands(self, images, *args):
+        bands = list(self.bands)
+        for image in [images] if isinstance(images, Image) else images:
+            bands.extend(image.bands)
+        return self._derive(bands)
+
+    def set(self, *args):
+        image = self._derive(self.bands)
+        if len(args) == 1:
+            image.props.update(_evaluate(args[0]))
+        else:
+            image.props[_evaluate(args[0])] = _evaluate(args[1])
+        return image
+
+    def get(self, key):
+        return _wrap(self.props.get(_evaluate(key)))
+
+    @staticmethod
+    def pixelArea():
+        return Image(['area'], None, 'area')
+
+    @staticmethod
+    def constant(value):
+        return Image(['constant'], None, 'constant')
+
+    def _stats(self, geometry, reducer):
+        signature = geometry.signature() if isinstance(geometry, Geometry) else 'geometry'
+        area = geometry.area().v if isinstance(geometry, Geometry) else 1e6
+        if reducer.group_name is not None:
+            # Land cover class areas: a share of the region for each class
+            weights = [_seeded(signature, self.period, group) for group in range(16)]
+            total = sum(weights)
+            return {'groups': [
+                {reducer.group_name: group, 'sum': area * weight / total}
+                for group, weight in enumerate(weights)
+            ]}
+        stats = {}
+        for band in self.bands:
+            lo, hi = (0.0, area * 0.5) if reducer.kind == 'sum' else RANGES.get(band, (0.0, 1.0))
+            stats[band] = _seeded(signature, self.period, band, self.kind, lo=lo, hi=hi)
+        return stats
+
+    def reduceRegion(self, reducer=None, geometry=None, scale=None, maxPixels=None, **kwargs):
+        return Dictionary(self._stats(geometry, reducer))
+
+    def reduceRegions(self, collection=None, reducer=None, scale=None, **kwargs):
+        features = []
+        for feature in collection.features:
+            reduced = Feature(feature)
+            reduced.props.update(self._stats(feature.geom, reducer))
+            features.append(reduced)
+        return FeatureCollection(features)
@@ -0,0 +1,214 @@
+"""Two-tier result cache for Earth Engine derived payloads.
+
+Results are kept in a small in-process LRU (with per-entry TTL) in front of a
+SQLite table, so finished computations survive restarts and are shared by
+every worker process. Keys are built from
+the endpoint, lake, period, index set and algorithm version; bumping
+ALGORITHM_VERSION invalidates everything computed with older maths.
+
+Expired entries are not deleted: get() treats them as misses, while
+lookup() still returns them as the last known good result, which the
+revalidate module serves while it computes a fresh one. Entries that
+expired more than ``retention`` seconds ago are purged at startup.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from singleflight import SingleFlight
+
+log = logging.getLogger('neer.cache')
+
+# Bump whenever index formulas, thresholds or payload shapes change
+ALGORITHM_VERSION = 3
+
+# Results for the current year keep changing as new scenes arrive
+CURRENT_YEAR_TTL = int(os.environ.get('NEER_CURRENT_YEAR_TTL', 6 * 3600))
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neer_cache.sqlite3')
+
+# How long (seconds) expired results are kept as last known good results
+STALE_RETENTION = int(os.environ.get('NEER_STALE_RETENTION', 30 * 24 * 3600))
+
+
+def cache_key(endpoint, lake, period, indices=(), version=ALGORITHM_VERSION, engine='ee'):
+    """Build a stable cache key for a computation"""
+    parts = [
+        endpoint,
+        str(lake).lower(),
+        str(period),
+        ",".join(indices),
+        f"v{version}"
+    ]
+    # Earth Engine keys keep their original form; other engines get their own namespace
+    if engine != 'ee':
+        parts.append(engine)
+    return "|".join(parts)
+
+
+def ttl_for_year(year):
+    """Past years are immutable (no TTL); the current year gets a short TTL"""
+    if year < datetime.now().year:
+        return None
+    return CURRENT_YEAR_TTL
+
+
+class ResultCache:
+    """In-process LRU with TTL backed by a persistent SQLite tier"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=512, retention=STALE_RETENTION):
+        self.path = path
+        self.max_entries = max_entries
+        self.retention = retention
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = {'memory': 0, 'disk': 0}
+        self.misses = 0
+        # Concurrent misses on one key share a single computation
+        self.flight = SingleFlight()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not be used across fork(); workers of a
+        # pre-forking server open their own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        try:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL,"
+                " created_at REAL NOT NULL)"
+            )
+            if self.retention is not None:
+                conn.execute("DELETE FROM results WHERE expires_at < ?", (time.time() - self.retention,))
+            conn.commit()
+        except sqlite3.Error as e:
+            # The memory tier still works without a writable disk
+            log.warning("Result cache disk tier disabled: %s", e)
+            self.path = None
+
+    def _remember(self, key, value, expires_at, created_at):
+        with self._lock:
+            self._memory[key] = (value, expires_at, created_at)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def lookup(self, key):
+        """(value, created_at, expires_at) of the newest entry for key, expired or not; None if there is none.
+
+        An expired memory entry is only returned if the disk tier (which
+        other workers may have refreshed) has nothing newer.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                value, expires_at, created_at = entry
+                if expires_at is None or expires_at > now:
+                    self.hits['memory'] += 1
+                    return value, created_at, expires_at
+
+        if self.path:
+            try:
+                row = self._connect().execute(
+                    "SELECT value, expires_at, created_at FROM results WHERE key = ?", (key,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                log.warning("Result cache read failed: %s", e)
+                row = None
+            if row and (entry is None or row[2] > entry[2]):
+                value, expires_at, created_at = json.loads(row[0]), row[1], row[2]
+                self._remember(key, value, expires_at, created_at)
+                entry = (value, expires_at, created_at)
+                if expires_at is None or expires_at > now:
+                    with self._lock:
+                        self.hits['disk'] += 1
+                    return value, created_at, expires_at
+
+        with self._lock:
+            self.misses += 1
+        if entry is None:
+            return None
+        value, expires_at, created_at = entry
+        return value, created_at, expires_at
+
+    def get(self, key):
+        """Return the cached value for key, or None on a miss (expired entries are misses)"""
+        entry = self.lookup(key)
+        if entry is None:
+            return None
+        value, _, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return value
+
+    def set(self, key, value, ttl=None):
+        """Store value under key; ttl=None means it never expires"""
+        now = time.time()
+        expires_at = now + ttl if ttl is not None else None
+        self._remember(key, value, expires_at, now)
+        if self.path:
+            try:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires_at, created_at) VALUES (?, ?, ?, ?)",
+                    (key, json.dumps(value), expires_at, now)
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                log.warning("Result cache write failed: %s", e)
+
+    def get_or_compute(self, key, compute, ttl=None):
+        """Return the cached value or compute, store and return it.
+
+        Empty results (None, [], {}) are returned but not cached so that a
+        transient Earth Engine gap is retried on the next request. Callers
+        missing a key that is already being computed wait for that result.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        def compute_and_store():
+            value = compute()
+            if value:
+                self.set(key, value, ttl)
+            return value
+
+        return self.flight.do(key, compute_and_store)
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+        if self.path:
+            conn = self._connect()
+            conn.execute("DELETE FROM results")
+            conn.commit()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'memory_entries': len(self._memory),
+                'memory_hits': self.hits['memory'],
+                'disk_hits': self.hits['disk'],
+                'misses': self.misses
+            }
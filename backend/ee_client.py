@@ -0,0 +1,203 @@
+"""Thin wrapper around blocking Earth Engine round trips.
+
+Every ``getInfo`` in the app goes through get_info, which
+
+* counts the round trips made while serving a request,
+* rate-limits calls against the Earth Engine quota,
+* retries quota / 429 / 503 errors with exponential backoff and jitter,
+* records per-operation latency (also as Prometheus metrics, see metrics),
+* reports each outcome to the circuit breaker in ee_health.
+
+Independent calls (per lake, per year) are fanned out with submit() on a
+shared, bounded thread pool instead of being made one after another. The
+batches of one computation (map_concurrently) run on a pool of their own.
+"""
+import contextvars
+import logging
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import logs
+import metrics
+
+log = logging.getLogger('neer.ee_client')
+
+MAX_WORKERS = int(os.environ.get('NEER_EE_CONCURRENCY', 8))
+RATE_PER_SECOND = float(os.environ.get('NEER_EE_RATE', 10))
+MAX_RETRIES = int(os.environ.get('NEER_EE_MAX_RETRIES', 4))
+BACKOFF_BASE = float(os.environ.get('NEER_EE_BACKOFF_BASE', 0.5))
+BACKOFF_MAX = float(os.environ.get('NEER_EE_BACKOFF_MAX', 16))
+
+# Substrings of Earth Engine / HTTP errors that are worth retrying
+RETRYABLE_ERRORS = ('quota', 'too many', 'rate limit', '429', '503', 'service unavailable')
+
+_call_counter = contextvars.ContextVar('ee_call_counter', default=None)
+_counter_lock = threading.Lock()
+
+
+def reset_call_count():
+    """Start counting Earth Engine calls for the current request"""
+    _call_counter.set([0])
+
+
+def call_count():
+    """Number of Earth Engine calls made since reset_call_count()"""
+    counter = _call_counter.get()
+    return counter[0] if counter else 0
+
+
+class RateLimiter:
+    """Token bucket shared by every thread making Earth Engine calls"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.capacity = burst or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class CallStats:
+    """Per-operation call counts and latency"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(lambda: {'count': 0, 'errors': 0, 'retries': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+
+    def record(self, op, elapsed_ms, error=False, retries=0):
+        with self._lock:
+            entry = self._stats[op]
+            entry['count'] += 1
+            entry['errors'] += int(error)
+            entry['retries'] += retries
+            entry['total_ms'] += elapsed_ms
+            entry['max_ms'] = max(entry['max_ms'], elapsed_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                op: dict(entry, avg_ms=round(entry['total_ms'] / entry['count'], 1) if entry['count'] else 0.0)
+                for op, entry in self._stats.items()
+            }
+
+
+rate_limiter = RateLimiter(RATE_PER_SECOND)
+call_stats = CallStats()
+POOL_THREAD_PREFIX = 'ee'
+_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=POOL_THREAD_PREFIX)
+
+# Batches fanned out by map_concurrently. They only make engine calls and
+# never wait on other work, so a caller leading a coalesced computation
+# finishes even while every worker of the shared pool waits for its result.
+BATCH_THREAD_PREFIX = 'ee_batch'
+_batch_executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix=BATCH_THREAD_PREFIX)
+
+# Circuit breaker told about the outcome of every call (see ee_health)
+_health_monitor = None
+
+
+def set_health_monitor(monitor):
+    global _health_monitor
+    _health_monitor = monitor
+
+
+def is_retryable(error):
+    message = str(error).lower()
+    return any(marker in message for marker in RETRYABLE_ERRORS)
+
+
+def backoff_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+
+
+def _record(op, lake, started, error, retries):
+    elapsed = time.perf_counter() - started
+    call_stats.record(op, elapsed * 1000, error=error, retries=retries)
+    outcome = 'error' if error else 'ok'
+    metrics.EE_CALLS.inc(operation=op, outcome=outcome)
+    metrics.EE_CALL_SECONDS.observe(elapsed, operation=op)
+    # Lakes are too many for metric labels; the log line keeps which one a call was for
+    log.debug(
+        "Earth Engine %s took %.0f ms", op, elapsed * 1000,
+        extra={'fields': {'operation': op, 'lake': lake, 'outcome': outcome, 'retries': retries}}
+    )
+    if retries:
+        metrics.EE_RETRIES.inc(retries, operation=op)
+    logs.add_timing('ee', elapsed * 1000)
+
+
+def get_info(ee_object, op='getInfo', lake=None):
+    """Fetch an Earth Engine object to the client, counting the round trip.
+
+    lake is logged with the call, if it is for one lake ('multiple' for a batch).
+    """
+    counter = _call_counter.get()
+    if counter is not None:
+        with _counter_lock:
+            counter[0] += 1
+
+    attempt = 0
+    started = time.perf_counter()
+    while True:
+        rate_limiter.acquire()
+        try:
+            result = ee_object.getInfo()
+        except Exception as e:
+            if attempt < MAX_RETRIES and is_retryable(e):
+                delay = backoff_delay(attempt)
+                log.warning(
+                    "Earth Engine %s hit a quota/transient error, retrying in %.2fs: %s", op, delay, e,
+                    extra={'fields': {'operation': op, 'lake': lake, 'attempt': attempt + 1}}
+                )
+                attempt += 1
+                time.sleep(delay)
+                continue
+            _record(op, lake, started, True, attempt)
+            if _health_monitor is not None:
+                _health_monitor.record_failure(e)
+            raise
+        _record(op, lake, started, False, attempt)
+        if _health_monitor is not None:
+            _health_monitor.record_success()
+        return result
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn on the shared Earth Engine pool, keeping the caller's request context"""
+    context = contextvars.copy_context()
+    return _executor.submit(context.run, fn, *args, **kwargs)
+
+
+def map_concurrently(fn, items):
+    """[fn(item) for item in items], fanned out on the batch pool.
+
+    fn must not wait on other work in flight (SingleFlight keys, futures).
+    Called from a pool thread it runs in that thread instead, so pool
+    workers never wait for tasks queued behind them.
+    """
+    items = list(items)
+    thread = threading.current_thread().name
+    if len(items) < 2 or thread.startswith((POOL_THREAD_PREFIX, BATCH_THREAD_PREFIX)):
+        return [fn(item) for item in items]
+    # A context can only be entered by one thread at a time, so each task gets a copy
+    futures = [_batch_executor.submit(contextvars.copy_context().run, fn, item) for item in items]
+    return [future.result() for future in futures]
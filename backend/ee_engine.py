@@ -0,0 +1,250 @@
+"""Earth Engine implementation of the lake reductions.
+
+Exposes the same functions as local_engine, so app.py can switch between
+them with NEER_ENGINE:
+
+* lake_batches(lakes)                -> lists of lakes that fit in one lake_means call
+* lake_period_batches(lakes, periods, max_periods)
+                                     -> (lakes, periods) that fit in one lake_period_means call
+* lake_means(lakes, year)            -> {lake_id: {band: mean}}
+* period_means(lake, periods)        -> {period key: {band: mean}}
+* lake_period_means(lakes, periods)  -> {lake_id: {period key: {band: mean}}}
+* land_cover_areas(lake, start, end) -> {class: m^2, ..., 'total': m^2}
+
+Per-lake stats also carry ``image_count``, the number of scenes in the
+composite, when the engine knows it.
+"""
+import os
+
+from ee_client import get_info
+from startup import lazy_import
+
+# Imported on first use, so starting the app does not wait for it
+ee = lazy_import('ee')
+
+NAME = 'ee'
+
+S2_BANDS = ('B2', 'B3', 'B4', 'B5', 'B6', 'B8', 'B11', 'B12')
+
+# Bands produced by compute_indices; part of every cache key
+INDEX_BANDS = ('NDWI', 'NDCI', 'FAI', 'MCI', 'Turbidity', 'SWIR_Ratio')
+
+# Land cover classes overlap (industrial pixels are also urban, water can
+# overlap anything), so each pixel is labelled with a bitmask of its classes
+LAND_COVER_BITS = {'urban': 1, 'industrial': 2, 'water': 4, 'vegetation': 8}
+
+# Catchment analysed around each lake
+CATCHMENT_BUFFER_M = 2000
+
+# Limits of one reduceRegions request: Earth Engine rejects request payloads
+# over 10 MB (the lake polygons make up most of it) and results of more
+# than 5000 elements
+MAX_BATCH_LAKES = int(os.environ.get('NEER_EE_BATCH_LAKES', 500))
+MAX_BATCH_VERTICES = int(os.environ.get('NEER_EE_BATCH_VERTICES', 100000))
+MAX_BATCH_RESULTS = 5000
+
+
+def compute_indices(image):
+    """Compute all water quality indices"""
+    ndwi = image.normalizedDifference(['B3', 'B8']).rename('NDWI')
+    ndci = image.normalizedDifference(['B5', 'B4']).rename('NDCI')
+    fai = image.expression(
+        '(B8 - B4) / (B8 + B4)',
+        {'B8': image.select('B8'), 'B4': image.select('B4')}
+    ).rename('FAI')
+    mci = image.expression(
+        'B5 - B4 - (B6 - B4) * ((705 - 665) / (740 - 665))',
+        {'B5': image.select('B5'), 'B4': image.select('B4'), 'B6': image.select('B6')}
+    ).rename('MCI')
+    turbidity = image.select(['B2', 'B3', 'B4']).reduce(ee.Reducer.mean()).rename('Turbidity')
+    swir_ratio = image.select('B11').divide(image.select('B12')).rename('SWIR_Ratio')
+    return image.addBands([ndwi, ndci, fai, mci, turbidity, swir_ratio])
+
+
+def sentinel2_collection(start, end, bands=S2_BANDS):
+    """Cloud-filtered Sentinel-2 scenes for a period"""
+    return ee.ImageCollection("COPERNICUS/S2_SR") \
+        .filterDate(start, end) \
+        .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 10)) \
+        .select(list(bands))
+
+
+def build_composite(start, end):
+    """Cloud-filtered Sentinel-2 median composite with all indices added"""
+    return compute_indices(sentinel2_collection(start, end).median())
+
+
+def _lake_label(lakes):
+    """Metrics label for a call covering these lakes"""
+    return lakes[0].id if len(lakes) == 1 else 'multiple'
+
+
+def lake_batches(lakes):
+    """Split lakes into consecutive batches within MAX_BATCH_LAKES and MAX_BATCH_VERTICES"""
+    batches = []
+    batch, vertices = [], 0
+    for lake in lakes:
+        if batch and (len(batch) >= MAX_BATCH_LAKES or vertices + lake.vertex_count > MAX_BATCH_VERTICES):
+            batches.append(batch)
+            batch, vertices = [], 0
+        batch.append(lake)
+        vertices += lake.vertex_count
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def lake_period_batches(lakes, periods, max_periods):
+    """(lakes, periods) pairs covering every lake x period, each fitting in one lake_period_means call.
+
+    Lakes are split as in lake_batches, and periods so that a call returns
+    at most MAX_BATCH_RESULTS lake x period results.
+    """
+    pairs = []
+    for batch in lake_batches(lakes):
+        step = max(1, min(max_periods, MAX_BATCH_RESULTS // len(batch)))
+        for i in range(0, len(periods), step):
+            pairs.append((batch, periods[i:i + step]))
+    return pairs
+
+
+def lake_means(lakes, year):
+    """Mean index values of every lake for one year, in a single reduceRegions"""
+    # One feature per lake, tagged with its id, so a single reduceRegions covers all of them
+    lake_features = ee.FeatureCollection([lake.ee_feature for lake in lakes])
+
+    collection = sentinel2_collection(f"{year}-01-01", f"{year}-12-31")
+    s2 = compute_indices(collection.median())
+
+    reduced = get_info(s2.select(list(INDEX_BANDS)).reduceRegions(
+        collection=lake_features,
+        reducer=ee.Reducer.mean(),
+        scale=10
+    ).map(lambda feature: feature.set('image_count', collection.size())),
+        op='lake_stats', lake=_lake_label(lakes))
+    stats_by_lake = {}
+    for feature in reduced['features']:
+        stats = feature['properties']
+        lake_id = stats.pop('lake_id')
+        stats_by_lake[lake_id] = stats
+    return stats_by_lake
+
+
+def period_means(lake, periods):
+    """Mean index values of one lake for each period (see periods.Period).
+
+    The periods are mapped server-side over an ee.List and fetched with a
+    single getInfo. A period without any cloud-free scene gets only its
+    image_count of 0; short periods in the monsoon often have none.
+    """
+    def period_stats(period):
+        period = ee.Dictionary(period)
+        collection = sentinel2_collection(ee.Date(period.get('start')), ee.Date(period.get('end')))
+        image_count = collection.size()
+        # Only the branch taken is evaluated, so empty periods never build a composite
+        stats = ee.Algorithms.If(
+            image_count.gt(0),
+            compute_indices(collection.median()).select(list(INDEX_BANDS)).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=lake.ee_geometry,
+                scale=10,
+                maxPixels=1e9
+            ),
+            ee.Dictionary()
+        )
+        return ee.Dictionary(stats).set('period', period.get('key')).set('image_count', image_count)
+
+    computed = get_info(ee.List([
+        {'key': period.key, 'start': period.start, 'end': period.end} for period in periods
+    ]).map(period_stats), op='period_stats', lake=lake.id)
+    stats_by_period = {}
+    for stats in computed:
+        stats_by_period[stats.pop('period')] = stats
+    return stats_by_period
+
+
+def lake_period_means(lakes, periods):
+    """Mean index values of every lake for each period, in a single getInfo.
+
+    The periods are mapped server-side over an ee.List as in period_means,
+    and each period's composite is reduced over all lakes with one
+    reduceRegions, as in lake_means. A period without any cloud-free scene
+    gives each lake only its image_count of 0.
+    """
+    lake_features = ee.FeatureCollection([lake.ee_feature for lake in lakes])
+
+    def period_stats(period):
+        period = ee.Dictionary(period)
+        collection = sentinel2_collection(ee.Date(period.get('start')), ee.Date(period.get('end')))
+        image_count = collection.size()
+        # Only the branch taken is evaluated, so empty periods never build a composite
+        reduced = ee.Algorithms.If(
+            image_count.gt(0),
+            compute_indices(collection.median()).select(list(INDEX_BANDS)).reduceRegions(
+                collection=lake_features,
+                reducer=ee.Reducer.mean(),
+                scale=10
+            ).toList(len(lakes)).map(lambda feature: ee.Feature(feature).toDictionary()),
+            ee.List([])
+        )
+        return ee.Dictionary({'period': period.get('key'), 'image_count': image_count, 'lakes': reduced})
+
+    computed = get_info(ee.List([
+        {'key': period.key, 'start': period.start, 'end': period.end} for period in periods
+    ]).map(period_stats), op='lake_period_stats', lake=_lake_label(lakes))
+    stats_by_lake = {lake.id: {} for lake in lakes}
+    for period in computed:
+        for lake in lakes:
+            stats_by_lake[lake.id][period['period']] = {'image_count': period['image_count']}
+        for stats in period['lakes']:
+            lake_id = stats.pop('lake_id')
+            stats_by_lake[lake_id][period['period']].update(stats)
+    return stats_by_lake
+
+
+def land_cover_areas(lake, start, end):
+    """Area (m^2) of each land cover class in the lake's catchment, plus the total.
+
+    One bitmask band is reduced with a grouped sum of pixel areas, and the
+    catchment area is fetched in the same getInfo.
+    """
+    # Create buffer around lake for catchment analysis
+    catchment = lake.ee_geometry.buffer(CATCHMENT_BUFFER_M)
+
+    # Get land use data (using Sentinel-2 for basic classification)
+    s2 = sentinel2_collection(start, end, bands=('B2', 'B3', 'B4', 'B8', 'B11', 'B12')).median()
+
+    # Simple land use classification
+    ndvi = s2.normalizedDifference(['B8', 'B4'])
+    ndbi = s2.normalizedDifference(['B11', 'B8'])
+    mndwi = s2.normalizedDifference(['B3', 'B11'])
+
+    classes = {
+        'urban': ndbi.gt(0.1).And(ndvi.lt(0.2)),
+        'industrial': ndbi.gt(0.2).And(ndvi.lt(0.1)),
+        'water': mndwi.gt(0.3),
+        'vegetation': ndvi.gt(0.4)
+    }
+    land_cover = ee.Image.constant(0)
+    for name, mask in classes.items():
+        land_cover = land_cover.add(mask.multiply(LAND_COVER_BITS[name]))
+    land_cover = land_cover.toInt().rename('land_cover')
+
+    grouped = ee.Image.pixelArea().addBands(land_cover).reduceRegion(
+        reducer=ee.Reducer.sum().group(groupField=1, groupName='land_cover'),
+        geometry=catchment,
+        scale=10,
+        maxPixels=1e9
+    )
+    result = get_info(ee.Dictionary({
+        'groups': grouped.get('groups'),
+        'total': catchment.area()
+    }), op='land_cover', lake=lake.id)
+
+    areas = {name: 0.0 for name in LAND_COVER_BITS}
+    for group in result['groups'] or []:
+        for name, bit in LAND_COVER_BITS.items():
+            if int(group['land_cover']) & bit:
+                areas[name] += group['sum']
+    areas['total'] = result['total']
+    return areas
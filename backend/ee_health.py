@@ -0,0 +1,165 @@
+"""Shared Earth Engine availability state (circuit breaker).
+
+The breaker is fed by the outcome of real calls made through
+ee_client.get_info, so endpoints no longer need their own probe round trip.
+
+* closed    - Earth Engine is usable
+* open      - too many consecutive outage-like failures; endpoints skip EE
+* half_open - reset timeout elapsed; a background probe (re-initializing the
+              client if needed) decides whether to close or re-open
+
+Startup initialization runs in the background too (initialize_in_background);
+until its first attempt finishes the circuit stays open and no probe starts.
+"""
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger('neer.ee_health')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+FAILURE_THRESHOLD = int(os.environ.get('NEER_EE_FAILURE_THRESHOLD', 3))
+RESET_TIMEOUT = float(os.environ.get('NEER_EE_RESET_TIMEOUT', 30))
+
+# Errors that say Earth Engine itself is unreachable or unusable, as opposed
+# to a problem with one particular computation
+OUTAGE_ERRORS = (
+    'not initialized', 'quota', 'too many', '429', '500', '502', '503', '504',
+    'unavailable', 'timed out', 'timeout', 'deadline', 'connection', 'credentials',
+    'authenticate', 'authorize'
+)
+
+
+def is_outage(error):
+    """True if error indicates Earth Engine is down rather than a bad computation"""
+    if isinstance(error, (OSError, TimeoutError)):
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in OUTAGE_ERRORS)
+
+
+class EEHealth:
+    """Closed / open / half-open circuit breaker around Earth Engine"""
+
+    def __init__(self, probe, initialize=None, initialized=True,
+                 failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT):
+        """
+        probe: callable making one cheap Earth Engine call; raises on failure
+        initialize: callable returning True once the client is initialized
+        """
+        self.probe = probe
+        self.initialize = initialize
+        self.initialized = initialized
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self.state = CLOSED if initialized else OPEN
+        self.failures = 0
+        self.opened_at = time.monotonic()
+        self.last_error = None if initialized else 'Earth Engine not initialized'
+        self._probing = False
+        self.initializing = False
+
+    def available(self):
+        """Whether endpoints should use Earth Engine right now (never blocks)"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = HALF_OPEN
+            if self.state == HALF_OPEN and not self._probing:
+                self._probing = True
+                threading.Thread(target=self._probe, name='ee-health-probe', daemon=True).start()
+            return False
+
+    def initialize_in_background(self, on_done=None):
+        """Initialize Earth Engine on a thread; the caller never waits.
+
+        on_done(initialized) is called once the attempt has finished.
+        """
+        with self._lock:
+            self.initializing = True
+            # No probe competes with the initialization
+            self._probing = True
+
+        def run():
+            initialized = False
+            try:
+                initialized = bool(self.initialize and self.initialize())
+            except Exception as e:
+                log.error("Earth Engine initialization failed: %s", e)
+            finally:
+                with self._lock:
+                    self._probing = False
+                self.set_initialized(initialized)
+                if on_done is not None:
+                    on_done(initialized)
+
+        threading.Thread(target=run, name='ee-init', daemon=True).start()
+
+    def set_initialized(self, initialized):
+        """Record the outcome of an explicit (startup) initialization"""
+        with self._lock:
+            self.initialized = initialized
+            self.initializing = False
+            self.failures = 0
+            if initialized:
+                self.state = CLOSED
+                self.last_error = None
+            else:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.last_error = 'Earth Engine not initialized'
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state != CLOSED:
+                log.info("Earth Engine reachable again, closing circuit")
+            self.state = CLOSED
+            self.last_error = None
+
+    def record_failure(self, error):
+        if not is_outage(error):
+            # The service answered; only this computation failed
+            self.record_success()
+            return
+        with self._lock:
+            self.failures += 1
+            self.last_error = str(error)
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    log.warning("Earth Engine unavailable, opening circuit: %s", error)
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+    def _probe(self):
+        try:
+            if not self.initialized:
+                if not (self.initialize and self.initialize()):
+                    raise RuntimeError('Earth Engine not initialized')
+                self.initialized = True
+            self.probe()
+            self.record_success()
+        except Exception as e:
+            with self._lock:
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.last_error = str(e)
+        finally:
+            with self._lock:
+                self._probing = False
+
+    def status(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'initialized': self.initialized,
+                'initializing': self.initializing,
+                'consecutive_failures': self.failures,
+                'last_error': self.last_error
+            }
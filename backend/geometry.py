@@ -0,0 +1,106 @@
+"""Multi-resolution lake outlines, encoded as TopoJSON.
+
+Outlines never change between years, so they are served separately from the
+metrics. For each zoom level every polygon is simplified (topology
+preserving, so rings stay valid and holes stay inside) to half a map pixel,
+then snapped to a quarter-pixel grid (set_precision keeps the result valid)
+and delta-encoded as TopoJSON arcs.
+"""
+import math
+
+from shapely import set_precision
+from shapely.geometry import Polygon
+
+from lake_registry import iter_polygons
+
+# Web map zoom levels outlines are prepared for; requests snap to the next one up
+ZOOM_LEVELS = (10, 12, 14, 16)
+
+
+def snap_zoom(zoom):
+    """The prepared zoom level with at least the requested detail"""
+    for level in ZOOM_LEVELS:
+        if level >= zoom:
+            return level
+    return ZOOM_LEVELS[-1]
+
+
+def pixel_size(zoom):
+    """Width of one 256 px web map tile pixel at the equator, in degrees"""
+    return 360 / (256 * 2 ** zoom)
+
+
+def _encode_ring(coords, translate, scale):
+    """Quantize a ring and delta-encode it; None if it collapses"""
+    points = []
+    for x, y, *_ in coords:
+        point = (round((x - translate[0]) / scale), round((y - translate[1]) / scale))
+        if not points or point != points[-1]:
+            points.append(point)
+    # A closed ring needs at least three distinct corners
+    if len(points) < 4:
+        return None
+    arc = [list(points[0])]
+    for (x1, y1), (x2, y2) in zip(points, points[1:]):
+        arc.append([x2 - x1, y2 - y1])
+    return arc
+
+
+def build_topology(lakes, zoom):
+    """TopoJSON Topology with one MultiPolygon per lake, simplified for zoom"""
+    tolerance = pixel_size(zoom) / 2
+    scale = pixel_size(zoom) / 4
+    # Aligned to the grid so snapped coordinates quantize to whole numbers
+    translate = (
+        math.floor(min((lake.bbox[0] for lake in lakes), default=0.0) / scale) * scale,
+        math.floor(min((lake.bbox[1] for lake in lakes), default=0.0) / scale) * scale
+    )
+
+    arcs = []
+    geometries = []
+    for lake in lakes:
+        polygons = []
+        for rings in iter_polygons(lake.geojson):
+            simplified = Polygon(rings[0], rings[1:]).simplify(tolerance, preserve_topology=True)
+            snapped = set_precision(simplified, grid_size=scale)
+            # Snapping can split a thin polygon in two or collapse it entirely
+            for part in getattr(snapped, 'geoms', [snapped]):
+                if part.is_empty or part.geom_type != 'Polygon':
+                    continue
+                polygon = []
+                for ring in [part.exterior, *part.interiors]:
+                    arc = _encode_ring(ring.coords, translate, scale)
+                    if arc is None:
+                        # A collapsed outer ring drops the polygon, a collapsed hole just the hole
+                        if not polygon:
+                            break
+                        continue
+                    polygon.append([len(arcs)])
+                    arcs.append(arc)
+                if polygon:
+                    polygons.append(polygon)
+        geometries.append({
+            'type': 'MultiPolygon',
+            'id': lake.id,
+            'properties': {
+                'name': lake.name,
+                'bbox': list(lake.bbox),
+                'centroid': list(lake.centroid),
+                'area_m2': round(lake.area_m2)
+            },
+            'arcs': polygons
+        })
+
+    return {
+        'type': 'Topology',
+        'zoom': zoom,
+        'bbox': [
+            translate[0],
+            translate[1],
+            max((lake.bbox[2] for lake in lakes), default=0.0),
+            max((lake.bbox[3] for lake in lakes), default=0.0)
+        ],
+        'transform': {'scale': [scale, scale], 'translate': list(translate)},
+        'objects': {'lakes': {'type': 'GeometryCollection', 'geometries': geometries}},
+        'arcs': arcs
+    }
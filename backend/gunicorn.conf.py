@@ -0,0 +1,33 @@
+"""Gunicorn settings for serving the API in production.
+
+The app (lake registry, result cache) is imported once in the master and
+shared by forked workers. Earth Engine and the precompute scheduler are
+initialized per worker in post_fork; the SQLite result cache is shared by
+all workers and only one of them runs the scheduler.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+
+# Earth Engine requests mostly wait on the network, so each worker also
+# serves requests on several threads
+workers = int(os.environ.get('NEER_WORKERS', os.environ.get('WEB_CONCURRENCY', 2)))
+worker_class = 'gthread'
+threads = int(os.environ.get('NEER_THREADS', 4))
+
+# Cold Earth Engine computations can take a while
+timeout = int(os.environ.get('NEER_WORKER_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('NEER_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+
+preload_app = os.environ.get('NEER_PRELOAD', '1') == '1'
+
+accesslog = '-'
+errorlog = '-'
+
+os.environ['NEER_INIT_IN_WORKERS'] = '1'
+
+
+def post_fork(server, worker):
+    from app import create_app
+    create_app()
@@ -0,0 +1,152 @@
+"""Serialized, pre-compressed responses with ETags.
+
+Payloads (JSON, or already encoded bodies such as vector tiles) are
+serialized once per cache key and kept in a small LRU along with their gzip
+(and, if the optional ``brotli`` package is installed, brotli) encodings,
+which are produced on first use and then reused.
+ETags are weak, since the body may be sent in several encodings, and are
+derived from the cache key (data version, year, lake set, ...) and the
+body, so identical data always gets the same ETag in every worker.
+Conditional GETs with a matching ``If-None-Match`` get a 304 with no body.
+Payloads computed from Earth Engine data carry when they were computed and
+whether they are stale; responses report both in ``X-Data-As-Of`` and
+``X-Data-Stale`` headers.
+"""
+import gzip
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import current_app, request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_SIZE = int(os.environ.get('NEER_COMPRESS_MIN_BYTES', 1024))
+
+
+def _compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    # Compressed once per payload, so spend the CPU on the smallest output
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def make_etag(key, body):
+    return hashlib.sha1(key.encode() + b'\0' + body).hexdigest()[:20]
+
+
+def format_timestamp(timestamp):
+    """ISO 8601 UTC time of an epoch timestamp"""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def set_freshness(response, as_of, stale=False):
+    """Tell the client when the data was computed (epoch seconds) and whether it is stale"""
+    response.headers['X-Data-As-Of'] = format_timestamp(as_of)
+    response.headers['X-Data-Stale'] = 'true' if stale else 'false'
+    return response
+
+
+class EncodedPayload:
+    """One serialized payload and its compressed variants"""
+
+    def __init__(self, key, body, expires_at, mimetype='application/json', as_of=None, stale=False):
+        self.key = key
+        self.body = body
+        self.mimetype = mimetype
+        self.etag = make_etag(key, body)
+        self.expires_at = expires_at
+        self.as_of = as_of
+        self.stale = stale
+        self._encoded = {}
+        self._lock = threading.Lock()
+
+    def encoded(self, encoding):
+        with self._lock:
+            if encoding not in self._encoded:
+                self._encoded[encoding] = _compress(self.body, encoding)
+            return self._encoded[encoding]
+
+
+class ResponseCache:
+    """LRU of encoded payloads, keyed like the result cache"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry.expires_at is None or entry.expires_at > time.time()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+
+    def put(self, key, data, ttl=None, as_of=None, stale=False):
+        """Serialize data (as jsonify would, compactly) and cache it under key"""
+        body = current_app.json.dumps(data, separators=(',', ':')).encode('utf-8')
+        return self.put_body(key, body, ttl, as_of=as_of, stale=stale)
+
+    def put_body(self, key, body, ttl=None, mimetype='application/json', as_of=None, stale=False):
+        """Cache an already encoded body under key"""
+        entry = EncodedPayload(key, body, time.time() + ttl if ttl else None, mimetype, as_of, stale)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def respond(self, entry, cache_control='no-cache'):
+        """200 with the best encoding the client accepts, or 304 if its copy is current"""
+        if request.if_none_match.contains_weak(entry.etag):
+            with self._lock:
+                self.not_modified += 1
+            response = current_app.response_class(status=304)
+        else:
+            encoding = None
+            if len(entry.body) >= MIN_COMPRESS_SIZE:
+                if brotli is not None and 'br' in request.accept_encodings:
+                    encoding = 'br'
+                elif 'gzip' in request.accept_encodings:
+                    encoding = 'gzip'
+            body = entry.encoded(encoding) if encoding else entry.body
+            response = current_app.response_class(body, mimetype=entry.mimetype)
+            if encoding:
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(entry.etag, weak=True)
+        response.headers['Vary'] = 'Accept-Encoding'
+        # By default always revalidate; a matching ETag makes that a bodyless 304
+        response.headers['Cache-Control'] = cache_control
+        if entry.as_of is not None:
+            set_freshness(response, entry.as_of, entry.stale)
+        return response
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'brotli': brotli is not None
+            }
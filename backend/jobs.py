@@ -0,0 +1,194 @@
+"""Asynchronous jobs for analyses too slow for one HTTP request.
+
+A client submits work (POST /api/jobs) and gets a job id back at once. The
+work runs on a small thread pool in the process that accepted it; state,
+progress and the JSON result live in SQLite, so any worker process can
+answer status, result and progress-stream requests.
+
+Submitting the same kind and params again returns the existing job while it
+is queued or running, and its stored result until that expires. A running
+job that stops reporting progress (its process died) counts as lost and is
+replaced by the next identical submission.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from scheduler import job_key
+
+log = logging.getLogger('neer.jobs')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Jobs report progress at least this often (seconds) while they run
+STALE_AFTER = int(os.environ.get('NEER_JOB_STALE_AFTER', 600))
+
+
+class JobQueue:
+    """SQLite-backed job registry with an in-process worker pool"""
+
+    def __init__(self, db_path, handlers, workers=2, result_ttl=24 * 3600):
+        self.db_path = db_path
+        self.handlers = handlers
+        self.result_ttl = result_ttl
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not be used across fork(); workers of a
+        # pre-forking server open their own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " key TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " state TEXT NOT NULL,"
+            " progress REAL NOT NULL DEFAULT 0,"
+            " message TEXT,"
+            " result TEXT,"
+            " error TEXT,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " finished_at REAL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, created_at)")
+        conn.commit()
+
+    def _reusable(self, row, now):
+        """Whether a submission with the same key can share this job"""
+        if row['state'] == QUEUED or row['state'] == RUNNING:
+            return row['updated_at'] >= now - STALE_AFTER
+        if row['state'] == DONE:
+            return row['finished_at'] >= now - self.result_ttl
+        return False
+
+    def submit(self, kind, params):
+        """(job, deduplicated) for work of a kind; params must be JSON-serializable"""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job type '{kind}'")
+        key = job_key(kind, params)
+        now = time.time()
+        # The lock covers submissions within this process; across processes
+        # the worst case is one duplicate job
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM jobs WHERE finished_at < ?", (now - self.result_ttl,))
+            # Committed before a reused job returns, so no write lock is left open
+            conn.commit()
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE key = ? ORDER BY created_at DESC LIMIT 1", (key,)
+            ).fetchone()
+            if row is not None and self._reusable(row, now):
+                return self._job(row), True
+            job_id = uuid.uuid4().hex
+            conn.execute(
+                "INSERT INTO jobs (id, key, kind, params, state, created_at, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, key, kind, json.dumps(params, sort_keys=True), QUEUED, now, now)
+            )
+            conn.commit()
+        self._executor.submit(self._run, job_id, kind, params)
+        return self.get(job_id), False
+
+    def _update(self, job_id, **fields):
+        fields['updated_at'] = time.time()
+        conn = self._connect()
+        conn.execute(
+            f"UPDATE jobs SET {', '.join(f'{name} = ?' for name in fields)} WHERE id = ?",
+            (*fields.values(), job_id)
+        )
+        conn.commit()
+
+    def _run(self, job_id, kind, params):
+        self._update(job_id, state=RUNNING, message='Started')
+
+        def progress(fraction, message=None):
+            self._update(job_id, progress=round(min(max(fraction, 0.0), 1.0), 4), message=message)
+
+        try:
+            result = self.handlers[kind](progress, **params)
+            self._update(
+                job_id, state=DONE, progress=1.0, message='Finished',
+                result=json.dumps(result), finished_at=time.time()
+            )
+        except Exception as e:
+            log.exception("Job %s (%s) failed: %s", job_id, kind, e, extra={'fields': {'job_id': job_id}})
+            self._update(job_id, state=FAILED, message='Failed', error=str(e), finished_at=time.time())
+
+    @staticmethod
+    def _job(row):
+        job = {
+            'id': row['id'],
+            'type': row['kind'],
+            'params': json.loads(row['params']),
+            'state': row['state'],
+            'progress': row['progress'],
+            'message': row['message'],
+            'error': row['error'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+            'finished_at': row['finished_at']
+        }
+        if row['state'] in (QUEUED, RUNNING) and row['updated_at'] < time.time() - STALE_AFTER:
+            job['state'] = FAILED
+            job['error'] = 'Job stopped reporting progress'
+        return job
+
+    def get(self, job_id):
+        """A job's status, or None if there is no such job"""
+        row = self._connect().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def result(self, job_id):
+        """The stored result of a finished job; None if it has none (yet)"""
+        row = self._connect().execute(
+            "SELECT state, result FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None or row['state'] != DONE:
+            return None
+        return json.loads(row['result'])
+
+    def watch(self, job_id, interval=0.5, timeout=None):
+        """Yield the job's status whenever it changes, until it finishes"""
+        last = None
+        started = time.time()
+        while True:
+            job = self.get(job_id)
+            if job is None:
+                return
+            snapshot = (job['state'], job['progress'], job['message'])
+            if snapshot != last:
+                last = snapshot
+                yield job
+            if job['state'] in (DONE, FAILED):
+                return
+            if timeout is not None and time.time() - started > timeout:
+                return
+            time.sleep(interval)
+
+    def stats(self):
+        conn = self._connect()
+        rows = conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
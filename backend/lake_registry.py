@@ -0,0 +1,343 @@
+"""Lake registry built once at startup and shared by every endpoint.
+
+Each lake's GeoJSON is parsed a single time and its bounding box, area,
+centroid and Earth Engine objects are derived from it. Lookups by id are
+O(1), and lakes in a bounding box are found with an STRtree over their
+outlines. The registry watches the source files and swaps in a freshly
+built snapshot when one of them changes, so boundaries can be updated
+without a restart.
+
+Besides the named lakes in LAKE_SOURCES, a bulk file of waterbodies (a
+GeoJSON FeatureCollection or a GeoPackage, one polygon feature per tank
+or lake) can be registered with NEER_WATERBODIES_PATH.
+"""
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
+
+import shapely
+from shapely import STRtree
+from shapely.geometry import MultiPolygon, Polygon, box
+
+from startup import lazy_import
+
+# Only needed for Earth Engine geometries, which are built on first use
+ee = lazy_import('ee')
+
+log = logging.getLogger('neer.lake_registry')
+
+GEOJSON_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geojson_files')
+
+# (id, display name, file in GEOJSON_DIR)
+LAKE_SOURCES = (
+    ('ukkadam', 'Ukkadam', 'ukkadamlakepolygonmap.geojson'),
+    ('valankulam', 'Valankulam', 'valankulam(includes chinna kulam).geojson'),
+    ('kurichi', 'Kurichi', 'Kurichi kulam.geojson'),
+    ('perur', 'Perur', 'Perur lake.geojson'),
+    ('singanallur', 'Singanallur', 'Singanallur lake.geojson'),
+)
+
+# Bulk file of further waterbodies (.geojson or .gpkg); empty for none
+WATERBODIES_PATH = os.environ.get('NEER_WATERBODIES_PATH', '')
+# Feature properties holding each waterbody's id and display name
+WATERBODY_ID_FIELD = os.environ.get('NEER_WATERBODY_ID_FIELD', 'id')
+WATERBODY_NAME_FIELD = os.environ.get('NEER_WATERBODY_NAME_FIELD', 'name')
+
+# How often (seconds) lookups check the source files for changes
+RELOAD_CHECK_INTERVAL = float(os.environ.get('NEER_REGISTRY_RELOAD_INTERVAL', 5))
+
+EARTH_RADIUS_M = 6371008.8
+
+
+def iter_polygons(geojson):
+    """Yield the coordinate rings of every polygon in a GeoJSON object"""
+    kind = geojson.get('type')
+    if kind == 'FeatureCollection':
+        for feature in geojson.get('features', []):
+            yield from iter_polygons(feature)
+    elif kind == 'Feature':
+        if geojson.get('geometry'):
+            yield from iter_polygons(geojson['geometry'])
+    elif kind == 'GeometryCollection':
+        for geometry in geojson.get('geometries', []):
+            yield from iter_polygons(geometry)
+    elif kind == 'Polygon':
+        yield geojson['coordinates']
+    elif kind == 'MultiPolygon':
+        yield from geojson['coordinates']
+
+
+def _ring_area_and_centroid(ring, lat0):
+    """Signed area (m^2) and centroid (lon, lat) of a ring on a local equirectangular projection"""
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    area2 = cx = cy = 0.0
+    for (x1, y1), (x2, y2) in zip(ring, ring[1:]):
+        cross = x1 * y2 - x2 * y1
+        area2 += cross
+        cx += (x1 + x2) * cross
+        cy += (y1 + y2) * cross
+    if area2 == 0:
+        return 0.0, (ring[0][0], ring[0][1])
+    return area2 / 2 * kx * ky, (cx / (3 * area2), cy / (3 * area2))
+
+
+def measure(geojson):
+    """Return (bbox, area_m2, centroid) for the polygons in a GeoJSON object"""
+    polygons = list(iter_polygons(geojson))
+    points = [point for polygon in polygons for ring in polygon for point in ring]
+    if not points:
+        raise ValueError("GeoJSON contains no polygons")
+    lons = [p[0] for p in points]
+    lats = [p[1] for p in points]
+    bbox = (min(lons), min(lats), max(lons), max(lats))
+    lat0 = (bbox[1] + bbox[3]) / 2
+
+    total_area = weighted_x = weighted_y = 0.0
+    for polygon in polygons:
+        for index, ring in enumerate(polygon):
+            area, (x, y) = _ring_area_and_centroid(ring, lat0)
+            # Holes subtract from the outer ring regardless of winding order
+            area = abs(area) if index == 0 else -abs(area)
+            total_area += area
+            weighted_x += x * area
+            weighted_y += y * area
+
+    if total_area > 0:
+        centroid = (weighted_x / total_area, weighted_y / total_area)
+    else:
+        centroid = ((bbox[0] + bbox[2]) / 2, lat0)
+    return bbox, total_area, centroid
+
+
+@dataclass(frozen=True)
+class Lake:
+    """A monitored lake and everything derived from its boundary"""
+    id: str
+    name: str
+    geojson: dict = field(repr=False, compare=False)
+    bbox: tuple
+    area_m2: float
+    centroid: tuple
+    checksum: str
+
+    @property
+    def cache_id(self):
+        """Identifier that changes whenever the boundary changes"""
+        return f"{self.id}@{self.checksum[:10]}"
+
+    @cached_property
+    def vertex_count(self):
+        """Coordinates in the boundary, which bound the size of an Earth Engine request for it"""
+        return sum(len(ring) for rings in iter_polygons(self.geojson) for ring in rings)
+
+    @cached_property
+    def shape(self):
+        """The outline as a (valid) shapely geometry"""
+        shape = MultiPolygon([Polygon(rings[0], rings[1:]) for rings in iter_polygons(self.geojson)])
+        return shape if shape.is_valid else shapely.make_valid(shape)
+
+    @cached_property
+    def feature_collection(self):
+        return ee.FeatureCollection(self.geojson)
+
+    @cached_property
+    def ee_geometry(self):
+        return self.feature_collection.geometry()
+
+    @cached_property
+    def ee_feature(self):
+        """The lake as one EE feature tagged with its id, for reduceRegions"""
+        return ee.Feature(self.ee_geometry, {'lake_id': self.id})
+
+
+def load_lake(lake_id, name, path):
+    """Parse a lake GeoJSON file into a Lake"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    geojson = json.loads(raw)
+    bbox, area_m2, centroid = measure(geojson)
+    return Lake(
+        id=lake_id,
+        name=name,
+        geojson=geojson,
+        bbox=bbox,
+        area_m2=area_m2,
+        centroid=centroid,
+        checksum=hashlib.sha1(raw).hexdigest()
+    )
+
+
+def _slug(value):
+    return re.sub(r'[^a-z0-9]+', '-', str(value).lower()).strip('-')
+
+
+def read_features(path):
+    """GeoJSON features of a GeoJSON file, or of a GeoPackage's first layer in WGS 84"""
+    if path.lower().endswith('.gpkg'):
+        import geopandas
+        frame = geopandas.read_file(path)
+        if frame.crs is not None:
+            frame = frame.to_crs(4326)
+        return json.loads(frame.to_json(drop_id=True))['features']
+    with open(path, 'rb') as f:
+        geojson = json.load(f)
+    if geojson.get('type') == 'Feature':
+        return [geojson]
+    return geojson.get('features', [])
+
+
+def load_waterbodies(path, id_field=WATERBODY_ID_FIELD, name_field=WATERBODY_NAME_FIELD, reserved=()):
+    """A Lake for every polygon feature of a bulk waterbody file.
+
+    Ids are slugs of the id (or else the name) property, made unique with
+    a numeric suffix and never one of the reserved ids. Each checksum
+    covers only the feature's geometry, so editing one polygon invalidates
+    the results of that waterbody alone.
+    """
+    lakes = []
+    taken = set(reserved)
+    for index, feature in enumerate(read_features(path)):
+        geometry = feature.get('geometry') or {}
+        if geometry.get('type') not in ('Polygon', 'MultiPolygon'):
+            continue
+        properties = feature.get('properties') or {}
+        name = str(properties.get(name_field) or properties.get(id_field) or f"Waterbody {index + 1}")
+        base = _slug(properties.get(id_field) or name) or f"waterbody-{index + 1}"
+        lake_id, suffix = base, 1
+        while lake_id in taken:
+            suffix += 1
+            lake_id = f"{base}-{suffix}"
+        geojson = {
+            'type': 'FeatureCollection',
+            'features': [{'type': 'Feature', 'geometry': geometry, 'properties': {}}]
+        }
+        try:
+            bbox, area_m2, centroid = measure(geojson)
+        except (ValueError, IndexError, TypeError) as e:
+            log.warning("Skipping waterbody %s: %s", name, e)
+            continue
+        taken.add(lake_id)
+        lakes.append(Lake(
+            id=lake_id,
+            name=name,
+            geojson=geojson,
+            bbox=bbox,
+            area_m2=area_m2,
+            centroid=centroid,
+            checksum=hashlib.sha1(json.dumps(geometry, sort_keys=True).encode()).hexdigest()
+        ))
+    return lakes
+
+
+class _Snapshot:
+    """Immutable view of the registered lakes"""
+
+    def __init__(self, lakes, mtimes):
+        self.lakes = tuple(lakes)
+        self.by_id = MappingProxyType({lake.id: lake for lake in self.lakes})
+        self.by_name = MappingProxyType({lake.name.lower(): lake for lake in self.lakes})
+        self.mtimes = mtimes
+        digest = hashlib.sha1("|".join(lake.cache_id for lake in self.lakes).encode())
+        self.version = digest.hexdigest()[:12]
+
+    @cached_property
+    def index(self):
+        """STRtree over the lake outlines, built on the first spatial query"""
+        return STRtree([lake.shape for lake in self.lakes])
+
+    def query(self, bbox):
+        """Lakes whose outline intersects bbox (min lon, min lat, max lon, max lat), in registry order"""
+        if not self.lakes:
+            return []
+        hits = self.index.query(box(*bbox), predicate='intersects')
+        return [self.lakes[i] for i in sorted(hits)]
+
+
+class LakeRegistry:
+    """Shared, file-watching registry of monitored lakes"""
+
+    def __init__(self, directory=GEOJSON_DIR, sources=LAKE_SOURCES,
+                 reload_interval=RELOAD_CHECK_INTERVAL, waterbodies=WATERBODIES_PATH):
+        self.directory = directory
+        self.sources = tuple(sources)
+        self.waterbodies = waterbodies
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._last_check = time.monotonic()
+        self._snapshot = self._build()
+
+    def _paths(self):
+        paths = {lake_id: os.path.join(self.directory, filename) for lake_id, _, filename in self.sources}
+        if self.waterbodies:
+            paths[None] = self.waterbodies
+        return paths
+
+    def _mtimes(self):
+        mtimes = {}
+        for lake_id, path in self._paths().items():
+            try:
+                mtimes[lake_id] = os.stat(path).st_mtime_ns
+            except OSError:
+                mtimes[lake_id] = None
+        return mtimes
+
+    def _build(self):
+        lakes = []
+        paths = self._paths()
+        for lake_id, name, _ in self.sources:
+            try:
+                lakes.append(load_lake(lake_id, name, paths[lake_id]))
+            except (OSError, ValueError) as e:
+                log.error("Error loading %s: %s", name, e)
+        if self.waterbodies:
+            try:
+                lakes.extend(load_waterbodies(self.waterbodies, reserved=[lake.id for lake in lakes]))
+            except (OSError, ValueError, ImportError) as e:
+                log.error("Error loading waterbodies from %s: %s", self.waterbodies, e)
+        log.info("Lake registry loaded %d lakes", len(lakes))
+        return _Snapshot(lakes, self._mtimes())
+
+    def snapshot(self):
+        """Current snapshot, rebuilt first if any source file changed"""
+        now = time.monotonic()
+        if now - self._last_check >= self.reload_interval:
+            with self._lock:
+                if now - self._last_check >= self.reload_interval:
+                    self._last_check = now
+                    if self._mtimes() != self._snapshot.mtimes:
+                        log.info("Lake files changed, reloading registry")
+                        self._snapshot = self._build()
+        return self._snapshot
+
+    @property
+    def lakes(self):
+        return self.snapshot().lakes
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def query(self, bbox):
+        """Lakes intersecting a (min lon, min lat, max lon, max lat) bounding box"""
+        return self.snapshot().query(bbox)
+
+    def get(self, lake_id):
+        """Look a lake up by id (or, leniently, by display name)"""
+        snapshot = self.snapshot()
+        key = lake_id.lower()
+        return snapshot.by_id.get(key) or snapshot.by_name.get(key.replace('_', ' '))
+
+    def __iter__(self):
+        return iter(self.lakes)
+
+    def __len__(self):
+        return len(self.lakes)
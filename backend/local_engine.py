@@ -0,0 +1,278 @@
+"""Local NumPy implementation of the lake reductions.
+
+Runs the same index maths and per-lake reductions as ee_engine, but on
+Sentinel-2 median composites stored on disk, with no network access. Select
+it with NEER_ENGINE=local. Being deterministic, it is also a stand-in for
+Earth Engine in tests and benchmarks.
+
+Each composite period is one directory under NEER_LOCAL_DATA_DIR, named
+``<start>_<end>`` with the same dates the Earth Engine filterDate uses
+(e.g. ``2023-01-01_2023-12-31``), holding
+
+* ``B2.npy`` ... ``B12.npy`` - one 2-D reflectance array per band, all the same shape
+* ``grid.json`` - ``{"transform": [x0, dx, 0, y0, 0, dy], "nodata": 0}``; a
+  GDAL-style geotransform of pixel corners in lon/lat (EPSG:4326), plus
+  optionally the ``image_count`` of scenes in the composite
+
+Bands are memory-mapped, and each reduction reads only the window around
+one lake. Lake polygons are rasterized by testing pixel centres.
+"""
+import json
+import math
+import os
+import threading
+
+import numpy as np
+
+from ee_engine import CATCHMENT_BUFFER_M, INDEX_BANDS, LAND_COVER_BITS, S2_BANDS
+from lake_registry import EARTH_RADIUS_M, iter_polygons
+
+NAME = 'local'
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'local_data')
+DATA_DIR = os.environ.get('NEER_LOCAL_DATA_DIR', DEFAULT_DATA_DIR)
+
+_composites = {}
+_composites_lock = threading.Lock()
+
+
+def period_dir(start, end, data_dir=None):
+    return os.path.join(data_dir or DATA_DIR, f"{start}_{end}")
+
+
+def _ratio(numerator, denominator):
+    """numerator / denominator, NaN where the denominator is zero"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(denominator != 0, numerator / denominator, np.nan)
+
+
+def normalized_difference(a, b):
+    return _ratio(a - b, a + b)
+
+
+def compute_indices(bands):
+    """Compute all water quality indices from a dict of band arrays"""
+    b2, b3, b4, b5, b6, b8, b11, b12 = (bands[name] for name in S2_BANDS)
+    return {
+        'NDWI': normalized_difference(b3, b8),
+        'NDCI': normalized_difference(b5, b4),
+        'FAI': _ratio(b8 - b4, b8 + b4),
+        'MCI': b5 - b4 - (b6 - b4) * ((705 - 665) / (740 - 665)),
+        'Turbidity': (b2 + b3 + b4) / 3,
+        'SWIR_Ratio': _ratio(b11, b12)
+    }
+
+
+def _ring_contains(ring, xs, ys):
+    """Even-odd test of pixel centres (xs: columns, ys: rows) against one ring"""
+    X, Y = np.meshgrid(xs, ys)
+    inside = np.zeros(X.shape, dtype=bool)
+    ring = np.asarray(ring, dtype=float)[:, :2]
+    for (ax, ay), (bx, by) in zip(ring, np.roll(ring, -1, axis=0)):
+        if ay == by:
+            continue
+        crosses = (ay > Y) != (by > Y)
+        x_cross = ax + (Y - ay) * (bx - ax) / (by - ay)
+        inside ^= crosses & (X < x_cross)
+    return inside
+
+
+def polygon_mask(geojson, xs, ys):
+    """Boolean mask of the pixel centres that fall inside the GeoJSON polygons"""
+    mask = np.zeros((len(ys), len(xs)), dtype=bool)
+    for polygon in iter_polygons(geojson):
+        inside = np.zeros_like(mask)
+        # Holes flip the outer ring back off
+        for ring in polygon:
+            inside ^= _ring_contains(ring, xs, ys)
+        mask |= inside
+    return mask
+
+
+def buffer_mask(geojson, xs, ys, distance_m):
+    """Pixel centres inside the polygons or within distance_m of their boundary"""
+    mask = polygon_mask(geojson, xs, ys)
+    lat0 = float(np.mean(ys))
+    kx = math.radians(1) * EARTH_RADIUS_M * math.cos(math.radians(lat0))
+    ky = math.radians(1) * EARTH_RADIUS_M
+    X, Y = np.meshgrid(np.asarray(xs) * kx, np.asarray(ys) * ky)
+    for polygon in iter_polygons(geojson):
+        for ring in polygon:
+            ring = np.asarray(ring, dtype=float)[:, :2] * (kx, ky)
+            for (ax, ay), (bx, by) in zip(ring[:-1], ring[1:]):
+                dx, dy = bx - ax, by - ay
+                length2 = dx * dx + dy * dy
+                if length2 == 0:
+                    t = 0.0
+                else:
+                    t = np.clip(((X - ax) * dx + (Y - ay) * dy) / length2, 0, 1)
+                mask |= (X - ax - t * dx) ** 2 + (Y - ay - t * dy) ** 2 <= distance_m ** 2
+    return mask
+
+
+class Composite:
+    """Memory-mapped band arrays of one composite period"""
+
+    def __init__(self, directory):
+        with open(os.path.join(directory, 'grid.json')) as f:
+            grid = json.load(f)
+        self.x0, self.dx, _, self.y0, _, self.dy = grid['transform']
+        self.nodata = grid.get('nodata')
+        self.image_count = grid.get('image_count')
+        self.bands = {
+            band: np.load(os.path.join(directory, f"{band}.npy"), mmap_mode='r')
+            for band in S2_BANDS
+        }
+        self.shape = self.bands['B2'].shape
+
+    def window(self, bbox, pad_m=0):
+        """(rows, cols) slices covering bbox plus pad_m metres, clipped to the grid"""
+        min_lon, min_lat, max_lon, max_lat = bbox
+        pad_lat = math.degrees(pad_m / EARTH_RADIUS_M)
+        pad_lon = pad_lat / math.cos(math.radians((min_lat + max_lat) / 2))
+        cols = sorted(((min_lon - pad_lon - self.x0) / self.dx, (max_lon + pad_lon - self.x0) / self.dx))
+        rows = sorted(((min_lat - pad_lat - self.y0) / self.dy, (max_lat + pad_lat - self.y0) / self.dy))
+        rows = slice(max(0, math.floor(rows[0])), min(self.shape[0], math.ceil(rows[1])))
+        cols = slice(max(0, math.floor(cols[0])), min(self.shape[1], math.ceil(cols[1])))
+        return rows, cols
+
+    def centres(self, rows, cols):
+        """Lon of each column and lat of each row of a window"""
+        xs = self.x0 + (np.arange(cols.start, cols.stop) + 0.5) * self.dx
+        ys = self.y0 + (np.arange(rows.start, rows.stop) + 0.5) * self.dy
+        return xs, ys
+
+    def read(self, rows, cols, bands=S2_BANDS):
+        """Band values of a window as float64, NaN where there is no data"""
+        values = {}
+        for band in bands:
+            data = np.asarray(self.bands[band][rows, cols], dtype=np.float64)
+            if self.nodata is not None:
+                data[data == self.nodata] = np.nan
+            values[band] = data
+        return values
+
+    def pixel_area(self, rows, cols):
+        """Area (m^2) of every pixel in a window"""
+        edges = np.radians(self.y0 + np.arange(rows.start, rows.stop + 1) * self.dy)
+        row_area = EARTH_RADIUS_M ** 2 * math.radians(abs(self.dx)) * np.abs(np.diff(np.sin(edges)))
+        return np.repeat(row_area[:, None], cols.stop - cols.start, axis=1)
+
+
+def load_composite(start, end):
+    """The composite for a period, or None if it has not been exported.
+
+    Loaded composites are kept while their grid.json is unchanged; a missing
+    one is looked for again on every call, so a period exported while the
+    app runs is picked up.
+    """
+    directory = period_dir(start, end)
+    try:
+        mtime = os.stat(os.path.join(directory, 'grid.json')).st_mtime_ns
+    except FileNotFoundError:
+        with _composites_lock:
+            _composites.pop(directory, None)
+        return None
+    with _composites_lock:
+        cached = _composites.get(directory)
+        if cached is None or cached[0] != mtime:
+            cached = _composites[directory] = (mtime, Composite(directory))
+        return cached[1]
+
+
+def _mean_stats(composite, lake):
+    """Mean of every index over the lake's pixels; None where no pixel has data"""
+    rows, cols = composite.window(lake.bbox)
+    if rows.start >= rows.stop or cols.start >= cols.stop:
+        return {}
+    mask = polygon_mask(lake.geojson, *composite.centres(rows, cols))
+    indices = compute_indices(composite.read(rows, cols))
+    stats = {}
+    for band in INDEX_BANDS:
+        values = indices[band][mask]
+        values = values[~np.isnan(values)]
+        stats[band] = float(values.mean()) if values.size else None
+    stats['image_count'] = composite.image_count
+    return stats
+
+
+def lake_batches(lakes):
+    """One batch: local reductions read a window per lake and have no request limits"""
+    lakes = list(lakes)
+    return [lakes] if lakes else []
+
+
+def lake_period_batches(lakes, periods, max_periods):
+    """(lakes, periods) pairs covering every lake x period, max_periods at a time"""
+    lakes = list(lakes)
+    if not lakes:
+        return []
+    return [(lakes, periods[i:i + max_periods]) for i in range(0, len(periods), max_periods)]
+
+
+def lake_means(lakes, year):
+    """Mean index values of every lake for one year; empty if there is no composite for it"""
+    composite = load_composite(f"{year}-01-01", f"{year}-12-31")
+    if composite is None:
+        return {}
+    return {lake.id: _mean_stats(composite, lake) for lake in lakes}
+
+
+def period_means(lake, periods):
+    """Mean index values of one lake for each period (see periods.Period); empty for periods without a composite"""
+    stats_by_period = {}
+    for period in periods:
+        composite = load_composite(period.start, period.end)
+        stats_by_period[period.key] = _mean_stats(composite, lake) if composite is not None else {}
+    return stats_by_period
+
+
+def lake_period_means(lakes, periods):
+    """Mean index values of every lake for each period; empty for periods without a composite"""
+    stats_by_lake = {lake.id: {} for lake in lakes}
+    for period in periods:
+        composite = load_composite(period.start, period.end)
+        for lake in lakes:
+            stats_by_lake[lake.id][period.key] = _mean_stats(composite, lake) if composite is not None else {}
+    return stats_by_lake
+
+
+def land_cover_areas(lake, start, end):
+    """Area (m^2) of each land cover class in the lake's catchment, plus the total; empty if there is no composite"""
+    composite = load_composite(start, end)
+    if composite is None:
+        return {}
+
+    rows, cols = composite.window(lake.bbox, pad_m=CATCHMENT_BUFFER_M)
+    catchment = buffer_mask(lake.geojson, *composite.centres(rows, cols), CATCHMENT_BUFFER_M)
+    bands = composite.read(rows, cols, bands=('B3', 'B4', 'B8', 'B11'))
+    pixel_area = composite.pixel_area(rows, cols)
+
+    # Simple land use classification, as in ee_engine
+    ndvi = normalized_difference(bands['B8'], bands['B4'])
+    ndbi = normalized_difference(bands['B11'], bands['B8'])
+    mndwi = normalized_difference(bands['B3'], bands['B11'])
+    with np.errstate(invalid='ignore'):
+        classes = {
+            'urban': (ndbi > 0.1) & (ndvi < 0.2),
+            'industrial': (ndbi > 0.2) & (ndvi < 0.1),
+            'water': mndwi > 0.3,
+            'vegetation': ndvi > 0.4
+        }
+
+    areas = {name: float(pixel_area[catchment & classes[name]].sum()) for name in LAND_COVER_BITS}
+    areas['total'] = float(pixel_area[catchment].sum())
+    return areas
+
+
+def save_composite(start, end, bands, transform, nodata=0, image_count=None, data_dir=None):
+    """Write band arrays for a period in the layout load_composite reads"""
+    directory = period_dir(start, end, data_dir)
+    os.makedirs(directory, exist_ok=True)
+    for band in S2_BANDS:
+        np.save(os.path.join(directory, f"{band}.npy"), np.asarray(bands[band], dtype=np.float32))
+    with open(os.path.join(directory, 'grid.json'), 'w') as f:
+        json.dump({'transform': list(transform), 'nodata': nodata, 'image_count': image_count}, f)
+    with _composites_lock:
+        _composites.pop(directory, None)
+    return directory
@@ -0,0 +1,140 @@
+"""Structured logging with request ids, and per-request timing breakdowns.
+
+Every module logs through ``logging.getLogger('neer.<module>')``. Records
+are written to stderr as one JSON object per line (``NEER_LOG_FORMAT=text``
+for plain lines) and carry the id of the request being served, taken from
+an incoming ``X-Request-ID`` header or generated. Extra fields go in
+``extra={'fields': {...}}``; they are only formatted when the record is
+actually emitted.
+
+While a request is served, time spent in Earth Engine calls and JSON
+encoding is added to its timings (also from the Earth Engine pool threads,
+which inherit the request context). Requests slower than
+``NEER_SLOW_REQUEST_MS`` are logged with that breakdown.
+"""
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+LOG_FORMAT = os.environ.get('NEER_LOG_FORMAT', 'json').lower()
+LOG_LEVEL = os.environ.get('NEER_LOG_LEVEL', 'INFO').upper()
+
+# Requests taking longer than this (ms) are logged with a timing breakdown; 0 disables
+SLOW_REQUEST_MS = float(os.environ.get('NEER_SLOW_REQUEST_MS', 2000))
+
+_request_id = contextvars.ContextVar('request_id', default=None)
+_timings = contextvars.ContextVar('request_timings', default=None)
+_configured = False
+_configure_lock = threading.Lock()
+
+
+class RequestTimings:
+    """Milliseconds and counts per phase of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self._ms = defaultdict(float)
+        self._counts = defaultdict(int)
+        self.notes = {}
+
+    def add(self, phase, ms):
+        with self._lock:
+            self._ms[phase] += ms
+            self._counts[phase] += 1
+
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+    def breakdown(self):
+        with self._lock:
+            breakdown = {f"{phase}_ms": round(ms, 1) for phase, ms in self._ms.items()}
+            breakdown.update({f"{phase}_count": count for phase, count in self._counts.items()})
+        breakdown.update(self.notes)
+        return breakdown
+
+
+def start_request(request_id=None):
+    """Begin a request's context: its id (generated if not given) and timings"""
+    request_id = request_id or uuid.uuid4().hex
+    _request_id.set(request_id)
+    _timings.set(RequestTimings())
+    return request_id
+
+
+def request_id():
+    return _request_id.get()
+
+
+def current_timings():
+    return _timings.get()
+
+
+def add_timing(phase, ms):
+    """Add time spent in a phase to the current request, if there is one"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.add(phase, ms)
+
+
+def note(name, value):
+    """Attach a value (e.g. why mock data was served) to the current request's breakdown"""
+    timings = _timings.get()
+    if timings is not None:
+        timings.notes[name] = value
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f".{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if getattr(record, 'request_id', None):
+            entry['request_id'] = record.request_id
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        line = super().format(record)
+        fields = getattr(record, 'fields', None)
+        if fields:
+            line += " " + " ".join(f"{name}={value}" for name, value in fields.items())
+        return line
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = _request_id.get()
+        return True
+
+
+def configure():
+    """Install the handler on the 'neer' logger once per process"""
+    global _configured
+    with _configure_lock:
+        if _configured:
+            return
+        _configured = True
+        handler = logging.StreamHandler(sys.stderr)
+        handler.addFilter(RequestIdFilter())
+        if LOG_FORMAT == 'text':
+            handler.setFormatter(TextFormatter('%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s'))
+        else:
+            handler.setFormatter(JsonFormatter())
+        logger = logging.getLogger('neer')
+        logger.addHandler(handler)
+        logger.setLevel(LOG_LEVEL)
+        logger.propagate = False
@@ -0,0 +1,185 @@
+"""Prometheus metrics, served in the text exposition format at /metrics.
+
+Counters and histograms are updated on the hot path with one lock and a
+bisect. Values that modules already keep (cache hit counters) are read
+through callbacks when /metrics is scraped, so they cost nothing between
+scrapes.
+
+Metrics live in the process that recorded them: behind gunicorn each worker
+exposes its own, and /metrics reports the worker that served the scrape
+(label ``pid``).
+"""
+import bisect
+import os
+import threading
+
+# Seconds; from a cached response up to a long Earth Engine reduction
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                # One count per bucket plus +Inf, then the sum
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def _samples(self):
+        with self._lock:
+            values = {key: list(counts) for key, counts in self._values.items()}
+        lines = []
+        for key, counts in values.items():
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float('inf')), counts):
+                cumulative += count
+                labels = _labels(self.labelnames, key, [('le', _number(bound))])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(counts[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Callback(_Metric):
+    """Counter or gauge whose values ({label values: value}) come from a function at scrape time"""
+
+    def __init__(self, name, documentation, labels, collect, kind='gauge'):
+        super().__init__(name, documentation, labels)
+        self.kind = kind
+        self.collect = collect
+
+    def _samples(self):
+        try:
+            values = self.collect()
+        except Exception as e:
+            return [f"# {self.name} unavailable: {_escape(e)}"]
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def callback(self, name, documentation, labels, collect, kind='gauge'):
+        return self.register(Callback(name, documentation, labels, collect, kind))
+
+    def render(self):
+        """Every metric in the Prometheus text format"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = [
+            "# HELP neer_process_info Process serving this scrape",
+            "# TYPE neer_process_info gauge",
+            f'neer_process_info{{pid="{os.getpid()}"}} 1'
+        ]
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'neer_http_request_duration_seconds', "Time to produce a response, by route",
+    labels=('method', 'route', 'status')
+)
+JSON_SERIALIZE_SECONDS = REGISTRY.histogram(
+    'neer_json_serialize_seconds', "Time spent encoding JSON bodies, by route",
+    labels=('route',)
+)
+EE_CALL_SECONDS = REGISTRY.histogram(
+    'neer_ee_call_duration_seconds', "Earth Engine round trip latency, retries included",
+    labels=('operation',)
+)
+EE_CALLS = REGISTRY.counter(
+    'neer_ee_calls_total', "Earth Engine round trips by outcome (ok or error)",
+    labels=('operation', 'outcome')
+)
+EE_RETRIES = REGISTRY.counter(
+    'neer_ee_retries_total', "Earth Engine calls retried after a quota or transient error",
+    labels=('operation',)
+)
+MOCK_FALLBACKS = REGISTRY.counter(
+    'neer_mock_fallbacks_total', "Responses served from mock data (demo mode) instead of real results",
+    labels=('endpoint', 'reason')
+)
+STALE_RESPONSES = REGISTRY.counter(
+    'neer_stale_responses_total', "Responses served from an expired result while it is refreshed",
+    labels=('endpoint',)
+)
+UNAVAILABLE_RESPONSES = REGISTRY.counter(
+    'neer_unavailable_responses_total', "Requests answered 503 because no result was available in time",
+    labels=('endpoint', 'reason')
+)
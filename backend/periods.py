@@ -0,0 +1,122 @@
+"""Composite periods at each temporal granularity.
+
+* ``annual``   - calendar years, key ``2023``
+* ``seasonal`` - the IMD seasons: winter (Jan-Feb), pre-monsoon (Mar-May),
+  south-west monsoon (Jun-Sep) and north-east monsoon (Oct-Dec), key
+  ``2023-sw_monsoon``
+* ``monthly``  - calendar months, key ``2023-06``
+* ``rolling``  - consecutive N-day windows stepped from a fixed epoch, so a
+  window's key (its start date, ``2023-06-01``) is the same on every run
+
+A period's end date is exclusive, as in Earth Engine's filterDate.
+"""
+import os
+from dataclasses import dataclass
+from datetime import date, timedelta
+
+GRANULARITIES = ('annual', 'seasonal', 'monthly', 'rolling')
+
+# (name, first month, first month of the next season)
+SEASONS = (
+    ('winter', 1, 3),
+    ('pre_monsoon', 3, 6),
+    ('sw_monsoon', 6, 10),
+    ('ne_monsoon', 10, 13)
+)
+
+# COPERNICUS/S2_SR has no scenes before 2017, so earlier years can never be computed
+FIRST_YEAR = 2017
+
+DEFAULT_ROLLING_DAYS = 30
+# Rolling windows are counted from here (before the first Sentinel-2 L2A scenes)
+ROLLING_EPOCH = date(2015, 1, 1)
+
+# Scenes keep arriving for a few days after a period ends
+SETTLE_DAYS = int(os.environ.get('NEER_PERIOD_SETTLE_DAYS', 7))
+
+
+@dataclass(frozen=True)
+class Period:
+    """One composite window; start inclusive, end exclusive (ISO dates)"""
+    key: str
+    start: str
+    end: str
+
+    @property
+    def year(self):
+        return int(self.start[:4])
+
+
+def data_years():
+    """Every year with Sentinel-2 data, up to the current (still open) one"""
+    return range(FIRST_YEAR, date.today().year + 1)
+
+
+def check_years(start_year, end_year):
+    """Raise ValueError unless start_year..end_year is an ordered range within data_years()"""
+    years = data_years()
+    if start_year > end_year or start_year not in years or end_year not in years:
+        raise ValueError(f"Invalid year range. Please use years between {years[0]}-{years[-1]}")
+
+
+def granularity_name(granularity, days=None):
+    """Storage name of a granularity; rolling windows include their length"""
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}")
+    if granularity == 'rolling':
+        days = days or DEFAULT_ROLLING_DAYS
+        if days < 1:
+            raise ValueError("Rolling windows need at least one day")
+        return f"rolling-{days}d"
+    return granularity
+
+
+def _next_month(year, month):
+    return (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def _periods(granularity, first_year, last_year, days):
+    """Every period starting in first_year..last_year, oldest first"""
+    if granularity == 'annual':
+        for year in range(first_year, last_year + 1):
+            # The end date predates this module: Dec 31 is excluded, as it
+            # always was, so annual values stay comparable with stored ones
+            yield Period(str(year), f"{year}-01-01", f"{year}-12-31")
+    elif granularity == 'seasonal':
+        for year in range(first_year, last_year + 1):
+            for name, first_month, next_month in SEASONS:
+                end = date(year + 1, 1, 1) if next_month == 13 else date(year, next_month, 1)
+                yield Period(f"{year}-{name}", date(year, first_month, 1).isoformat(), end.isoformat())
+    elif granularity == 'monthly':
+        for year in range(first_year, last_year + 1):
+            for month in range(1, 13):
+                start = date(year, month, 1)
+                yield Period(start.strftime('%Y-%m'), start.isoformat(), date(*_next_month(year, month), 1).isoformat())
+    else:
+        step = timedelta(days=days)
+        first = date(first_year, 1, 1)
+        start = ROLLING_EPOCH + step * max(0, (first - ROLLING_EPOCH).days // days)
+        while start.year <= last_year:
+            if start >= first:
+                yield Period(start.isoformat(), start.isoformat(), (start + step).isoformat())
+            start += step
+
+
+def annual_period(year):
+    """The period of one calendar year"""
+    return next(_periods('annual', year, year, None))
+
+
+def periods_between(granularity, first_year, last_year, days=None, today=None):
+    """Periods starting in first_year..last_year that have already begun"""
+    today = (today or date.today()).isoformat()
+    return [
+        period for period in _periods(granularity, first_year, last_year, days or DEFAULT_ROLLING_DAYS)
+        if period.start <= today
+    ]
+
+
+def is_final(period, today=None):
+    """True once a period has ended and its late scenes have settled"""
+    end = date.fromisoformat(period.end)
+    return end + timedelta(days=SETTLE_DAYS) <= (today or date.today())
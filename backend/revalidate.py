@@ -0,0 +1,164 @@
+"""Stale-while-revalidate serving of computed payloads.
+
+Endpoints read their payload from the result cache. A fresh entry is
+served as is. An expired one is still served, marked stale with the time
+it was computed, while a background refresh computes the new one, so
+requests only ever wait for a cache read. Only when nothing has ever been
+computed for a key does a request wait for the computation, and then at
+most REFRESH_DEADLINE seconds; the computation carries on in the
+background and fills the cache for the next request. Once a request has
+missed the deadline, later requests for that key fail at once until the
+computation finishes.
+
+Refreshes run on their own small pool (not the Earth Engine pool, which
+they fan out to) and are deduplicated per key within a process.
+"""
+import contextvars
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+log = logging.getLogger('neer.revalidate')
+
+# Longest a request waits (seconds) for a payload that has never been computed
+REFRESH_DEADLINE = float(os.environ.get('NEER_REFRESH_DEADLINE', 15))
+
+REFRESH_WORKERS = int(os.environ.get('NEER_REFRESH_WORKERS', 4))
+
+# value; as_of: when it was computed (epoch seconds); expires_at: None if it
+# never expires; stale: past expires_at; cached: whether it was stored
+Served = namedtuple('Served', 'value as_of expires_at stale cached')
+
+
+class RefreshPending(Exception):
+    """The payload is still being computed after the refresh deadline"""
+
+
+class Revalidator:
+    """Serves cached payloads, fresh or stale, and refreshes stale ones in the background"""
+
+    def __init__(self, cache, deadline=REFRESH_DEADLINE, workers=REFRESH_WORKERS, on_refresh=None):
+        """
+        cache: a ResultCache
+        on_refresh: optional callable(key), called after a new value is stored
+        """
+        self.cache = cache
+        self.deadline = deadline
+        self.on_refresh = on_refresh
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='refresh')
+        self._lock = threading.Lock()
+        self._refreshing = {}
+        # Keys whose refresh in flight has already outlived the deadline
+        self._overdue = set()
+        self.served = {'fresh': 0, 'stale': 0}
+        self.refreshes = 0
+        self.failures = 0
+        self.deadlines_missed = 0
+
+    def cached(self, key, compute, ttl=None, keep=bool, refresh=True):
+        """The cached payload of key as Served, or None if there is none.
+
+        A stale payload is refreshed in the background with compute() when
+        refresh is true (pass False while the engine is known to be down).
+        """
+        entry = self.cache.lookup(key)
+        if entry is None:
+            return None
+        value, created_at, expires_at = entry
+        stale = expires_at is not None and expires_at <= time.time()
+        if stale and refresh:
+            self.refresh(key, compute, ttl, keep)
+        with self._lock:
+            self.served['stale' if stale else 'fresh'] += 1
+        return Served(value, created_at, expires_at, stale, True)
+
+    def get(self, key, compute, ttl=None, keep=bool, refresh=True):
+        """The cached payload of key, or one computed within the deadline.
+
+        Returns None when nothing is cached and refresh is false. Raises
+        RefreshPending when the computation outlives the deadline, and the
+        computation's own exception when it fails.
+        """
+        served = self.cached(key, compute, ttl, keep, refresh)
+        if served is not None or not refresh:
+            return served
+        future = self.refresh(key, compute, ttl, keep)
+        with self._lock:
+            overdue = key in self._overdue
+        if overdue:
+            raise RefreshPending(f"Still computing after {self.deadline:g}s")
+        try:
+            return future.result(timeout=self.deadline)
+        except FutureTimeoutError:
+            with self._lock:
+                self.deadlines_missed += 1
+                if self._refreshing.get(key) is future:
+                    self._overdue.add(key)
+            raise RefreshPending(f"Still computing after {self.deadline:g}s") from None
+
+    def fresh(self, key, compute, ttl=None, keep=bool):
+        """The payload of key, computed now unless a fresh one is cached.
+
+        For background work such as precomputation: it waits for the
+        computation without a deadline, sharing and storing it as refresh().
+        """
+        entry = self.cache.lookup(key)
+        if entry is not None and (entry[2] is None or entry[2] > time.time()):
+            return entry[0]
+        return self.refresh(key, compute, ttl, keep).result().value
+
+    def refresh(self, key, compute, ttl=None, keep=bool):
+        """Future of a new Served for key, sharing a refresh already in flight.
+
+        The value is stored with ttl only if keep(value) is true, so empty or
+        partial results are served once but never replace a good one.
+        """
+        with self._lock:
+            future = self._refreshing.get(key)
+            if future is not None:
+                return future
+            future = self._refreshing[key] = Future()
+            self.refreshes += 1
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, key, compute, ttl, keep, future)
+        return future
+
+    def _run(self, key, compute, ttl, keep, future):
+        try:
+            value = compute()
+            now = time.time()
+            cached = bool(keep(value))
+            if cached:
+                self.cache.set(key, value, ttl)
+                if self.on_refresh is not None:
+                    self.on_refresh(key)
+            served = Served(value, now, now + ttl if ttl is not None else None, False, cached)
+        except BaseException as e:
+            with self._lock:
+                self.failures += 1
+                del self._refreshing[key]
+                self._overdue.discard(key)
+            log.warning("Refreshing %s failed: %s", key, e, extra={'fields': {'key': key}})
+            future.set_exception(e)
+            return
+        with self._lock:
+            del self._refreshing[key]
+            self._overdue.discard(key)
+        future.set_result(served)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'served_fresh': self.served['fresh'],
+                'served_stale': self.served['stale'],
+                'refreshing': len(self._refreshing),
+                'overdue': len(self._overdue),
+                'refreshes': self.refreshes,
+                'failures': self.failures,
+                'deadlines_missed': self.deadlines_missed,
+                'deadline_seconds': self.deadline
+            }
@@ -0,0 +1,214 @@
+"""Water quality rules, evaluated on whole arrays at once.
+
+Every endpoint derives BOD, the health class, pollution causes, suggestions,
+trend labels and alerts from index means through these functions. Inputs
+are a mapping of index name to array-like (dict of NumPy arrays, pandas
+DataFrame, or dict of scalars), any shape; a lakes x periods matrix is
+evaluated in one pass. Missing values (NaN or None) count as 0 in the
+cause and alert rules, as the per-record code always did.
+
+The thresholds live in the tables below.
+"""
+import numpy as np
+
+# BOD (mg/L) estimated from NDWI
+BOD_SLOPE = 26.303
+BOD_INTERCEPT = 7.546
+
+# (class, BOD above which it applies), checked in order
+HEALTH_CLASSES = (
+    ('Poor', 8),
+    ('Moderate', 4),
+    ('Good', -np.inf)
+)
+
+# (index, comparison, threshold, cause, suggestion), reported in this order
+POLLUTION_RULES = (
+    ('FAI', '>', 0.05, "Algal bloom", "Limit nutrient runoff"),
+    ('NDWI', '<', 0.2, "Water scarcity", "Increase water inflow"),
+    ('SWIR_Ratio', '>', 1.5, "Chemical or sediment pollution", "Investigate industrial discharges"),
+    ('Turbidity', '>', 1000, "High sediment or garbage dumping", "Reduce catchment erosion / waste dumping")
+)
+NO_CAUSES = "No major issues"
+NO_ACTION = "No action needed"
+
+# A BOD change (mg/L) within this band from the previous period is stable
+TREND_TOLERANCE = 1.0
+TRENDS = ('improving', 'degrading', 'stable')
+
+# Year-over-year BOD increase (mg/L) raising an alert, by severity; highest first
+BOD_ALERTS = (
+    ('high', 5),
+    ('medium', 3)
+)
+
+# (index, comparison, threshold, alert type, severity) on the current period
+INDEX_ALERTS = (
+    ('NDCI', '>', 0.2, 'algal_bloom', 'medium'),
+    ('Turbidity', '>', 800, 'high_turbidity', 'medium')
+)
+
+_COMPARISONS = {'>': np.greater, '<': np.less, '>=': np.greater_equal, '<=': np.less_equal}
+
+
+def _values(indices, name, fill=None):
+    """An index as a float array; missing entries NaN, or fill"""
+    if name in indices:
+        values = np.asarray(indices[name], dtype=float)
+    else:
+        values = np.full(np.shape(next(iter(indices.values()), np.nan)), np.nan)
+    if fill is not None:
+        values = np.where(np.isnan(values), fill, values)
+    return values
+
+
+def _rule(indices, name, comparison, threshold):
+    with np.errstate(invalid='ignore'):
+        return _COMPARISONS[comparison](_values(indices, name, fill=0.0), threshold)
+
+
+def bod(ndwi):
+    """BOD (mg/L) for NDWI values; NaN where NDWI is missing"""
+    return np.asarray(ndwi, dtype=float) * BOD_SLOPE + BOD_INTERCEPT
+
+
+def _codes(conditions, default):
+    """Index of the first true condition for each element, else default"""
+    codes = np.full(np.shape(conditions[0]), default, dtype=np.int8)
+    # Assigned last to first, so earlier conditions win
+    for code in range(len(conditions) - 1, -1, -1):
+        codes[conditions[code]] = code
+    return codes
+
+
+# Labels are looked up by integer code; the last entry is for missing values
+_HEALTH_LABELS = np.array([label for label, _ in HEALTH_CLASSES] + [None], dtype=object)
+_TREND_LABELS = np.array(['baseline', 'improving', 'degrading', 'stable', None], dtype=object)
+
+
+def health(bod_values):
+    """Health class for BOD values; None where BOD is missing"""
+    bod_values = np.asarray(bod_values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        conditions = [bod_values > threshold for _, threshold in HEALTH_CLASSES]
+    codes = _codes([np.isnan(bod_values)] + conditions, default=len(HEALTH_CLASSES) + 1) - 1
+    return np.asarray(_HEALTH_LABELS[codes], dtype=object)
+
+
+def _combination_labels(column):
+    """Joined labels for every combination of POLLUTION_RULES, indexed by bitmask"""
+    labels = []
+    for mask in range(2 ** len(POLLUTION_RULES)):
+        parts = [rule[column] for bit, rule in enumerate(POLLUTION_RULES) if mask & (1 << bit)]
+        labels.append(", ".join(parts))
+    return np.array(labels, dtype=object)
+
+
+_CAUSES = _combination_labels(3)
+_CAUSES[0] = NO_CAUSES
+_SUGGESTIONS = _combination_labels(4)
+_SUGGESTIONS[0] = NO_ACTION
+
+
+def pollution(indices):
+    """(causes, suggestions) strings for every element of the index arrays"""
+    mask = 0
+    for bit, (name, comparison, threshold, _, _) in enumerate(POLLUTION_RULES):
+        mask = mask | (_rule(indices, name, comparison, threshold).astype(np.int64) << bit)
+    mask = np.asarray(mask)
+    return np.asarray(_CAUSES[mask], dtype=object), np.asarray(_SUGGESTIONS[mask], dtype=object)
+
+
+def classify_trend(bod_values, previous_bod):
+    """Trend label of each BOD against the previous one; 'baseline' without one"""
+    bod_values, previous_bod = np.broadcast_arrays(
+        np.asarray(bod_values, dtype=float), np.asarray(previous_bod, dtype=float)
+    )
+    with np.errstate(invalid='ignore'):
+        codes = _codes([
+            np.isnan(bod_values),
+            np.isnan(previous_bod),
+            bod_values < previous_bod - TREND_TOLERANCE,
+            bod_values > previous_bod + TREND_TOLERANCE
+        ], default=4) - 1
+    # Missing BOD (code -1) takes the last label, None
+    return np.asarray(_TREND_LABELS[codes], dtype=object)
+
+
+def previous_valid(values, axis=-1):
+    """Along axis, the last non-NaN value before each position (NaN if none)"""
+    values = np.moveaxis(np.asarray(values, dtype=float), axis, -1)
+    if values.shape[-1] == 0:
+        return np.moveaxis(values.copy(), -1, axis)
+    positions = np.arange(values.shape[-1])
+    last = np.maximum.accumulate(np.where(np.isnan(values), -1, positions), axis=-1)
+    # The last valid position strictly before each one
+    before = np.concatenate([np.full(last.shape[:-1] + (1,), -1), last[..., :-1]], axis=-1)
+    previous = np.take_along_axis(values, np.maximum(before, 0), axis=-1)
+    previous = np.where(before >= 0, previous, np.nan)
+    return np.moveaxis(previous, -1, axis)
+
+
+def trends(bod_values, axis=-1):
+    """Trend labels along the periods axis; periods without BOD are skipped"""
+    return classify_trend(bod_values, previous_valid(bod_values, axis=axis))
+
+
+def trend_counts(labels, axis=None):
+    """{trend: count} of the labels, over all of them or per row along axis"""
+    labels = np.asarray(labels, dtype=object)
+    return {trend: np.sum(labels == trend, axis=axis) for trend in TRENDS}
+
+
+def overall_trend(counts):
+    """Overall trend from trend counts (scalars or arrays)"""
+    degrading = np.asarray(counts['degrading'])
+    improving = np.asarray(counts['improving'])
+    return np.select([degrading > improving, improving > degrading], ['degrading', 'improving'], default='stable')
+
+
+def evaluate(indices, trend_axis=None):
+    """BOD, health, causes and suggestions for every element of the index arrays.
+
+    With trend_axis (the periods axis), trend labels are added too.
+    """
+    bod_values = bod(_values(indices, 'NDWI'))
+    causes, suggestions = pollution(indices)
+    result = {
+        'bod': bod_values,
+        'health': health(bod_values),
+        'causes': causes,
+        'suggestions': suggestions
+    }
+    if trend_axis is not None:
+        result['trend'] = trends(bod_values, axis=trend_axis)
+    return result
+
+
+def alerts(previous, current):
+    """Alert flags for each lake comparing two periods of index values.
+
+    Returns the BOD values, their change, the BOD alert severity (None if
+    none) and {alert type: (severity, flags)} for the index alerts.
+    """
+    previous_bod = bod(_values(previous, 'NDWI'))
+    current_bod = bod(_values(current, 'NDWI'))
+    change = current_bod - previous_bod
+    with np.errstate(invalid='ignore'):
+        severity = np.select(
+            [change > threshold for _, threshold in BOD_ALERTS],
+            [name for name, _ in BOD_ALERTS],
+            default=''
+        ).astype(object)
+    severity = np.where(severity == '', None, severity)
+    index_alerts = {
+        alert_type: (alert_severity, _rule(current, name, comparison, threshold))
+        for name, comparison, threshold, alert_type, alert_severity in INDEX_ALERTS
+    }
+    return {
+        'previous_bod': previous_bod,
+        'current_bod': current_bod,
+        'change': change,
+        'severity': severity,
+        'index_alerts': index_alerts
+    }
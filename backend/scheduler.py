@@ -0,0 +1,260 @@
+"""Background precomputation of Earth Engine results.
+
+A persistent SQLite job queue feeds a bounded worker pool. Every cycle
+re-enqueues the full set of jobs (all lakes x all years); jobs whose
+results are already cached finish immediately, so in steady state only the
+current year and expired entries cost Earth Engine time. Jobs are ordered
+by priority first and then by how recently a user asked for the same data.
+
+With several worker processes only one of them runs the scheduler; the
+others just record requests (touch) in the shared queue. Requests are
+recorded in memory and written in one batch: by the scheduler before it
+claims jobs, and by other processes at most every TOUCH_FLUSH_INTERVAL
+seconds, so serving a request never waits for a commit of its own.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+log = logging.getLogger('neer.scheduler')
+
+try:
+    import fcntl
+except ImportError:  # Windows: single process only
+    fcntl = None
+
+# Longest (seconds) a process without the scheduler keeps request times in memory
+TOUCH_FLUSH_INTERVAL = 30
+
+PENDING = 'pending'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def job_key(kind, params):
+    return f"{kind}:{json.dumps(params, sort_keys=True)}"
+
+
+def _isoformat(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class PrecomputeScheduler:
+    """Runs precompute jobs from a persistent queue on a bounded thread pool"""
+
+    def __init__(self, db_path, handlers, plan, workers=2, interval=6 * 3600, gate=None):
+        """
+        handlers: kind -> callable(**params) doing the work
+        plan: callable returning [(kind, params, priority), ...] for one full cycle
+        gate: optional callable; jobs are only started while it returns True
+        """
+        self.db_path = db_path
+        self.handlers = handlers
+        self.plan = plan
+        self.gate = gate
+        self.workers = workers
+        self.interval = interval
+        self._local = threading.local()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._thread = None
+        self._pool = None
+        self._leader_lock = None
+        self.cycle_started_at = None
+        self.next_cycle_at = None
+        self._touched = {}
+        self._touch_lock = threading.Lock()
+        self._touches_flushed_at = time.monotonic()
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not be used across fork(); workers of a
+        # pre-forking server open their own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS precompute_jobs ("
+            " key TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " priority INTEGER NOT NULL DEFAULT 0,"
+            " state TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " last_requested REAL NOT NULL DEFAULT 0,"
+            " updated_at REAL NOT NULL,"
+            " error TEXT)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS precompute_jobs_queue"
+            " ON precompute_jobs (state, priority DESC, last_requested DESC)"
+        )
+        conn.commit()
+
+    def enqueue(self, kind, params, priority=0):
+        """Add a job, or put an existing one back on the queue"""
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO precompute_jobs (key, kind, params, priority, state, updated_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET priority = excluded.priority,"
+            " state = CASE WHEN state = 'running' THEN state ELSE excluded.state END,"
+            " updated_at = excluded.updated_at",
+            (job_key(kind, params), kind, json.dumps(params, sort_keys=True), priority, PENDING, time.time())
+        )
+        conn.commit()
+        self._wake.set()
+
+    def touch(self, kind, params):
+        """Record that a user asked for this data so its job is refreshed first"""
+        with self._touch_lock:
+            self._touched[job_key(kind, params)] = time.time()
+            due = self._thread is None and time.monotonic() - self._touches_flushed_at >= TOUCH_FLUSH_INTERVAL
+        if due:
+            self.flush_touches()
+
+    def flush_touches(self):
+        """Write the request times recorded by touch() in one batch"""
+        with self._touch_lock:
+            touched, self._touched = self._touched, {}
+            self._touches_flushed_at = time.monotonic()
+        if not touched:
+            return
+        try:
+            conn = self._connect()
+            conn.executemany(
+                "UPDATE precompute_jobs SET last_requested = MAX(last_requested, ?) WHERE key = ?",
+                [(requested, key) for key, requested in touched.items()]
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            log.warning("Precompute touch failed: %s", e)
+
+    def schedule_cycle(self):
+        """Enqueue every planned job for a fresh precompute cycle"""
+        self.flush_touches()
+        self.cycle_started_at = time.time()
+        self.next_cycle_at = self.cycle_started_at + self.interval
+        jobs = self.plan()
+        for kind, params, priority in jobs:
+            self.enqueue(kind, params, priority)
+        log.info("Precompute cycle scheduled %d jobs", len(jobs))
+
+    def _claim(self, limit):
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT key, kind, params FROM precompute_jobs WHERE state = ?"
+            " ORDER BY priority DESC, last_requested DESC, updated_at ASC LIMIT ?",
+            (PENDING, limit)
+        ).fetchall()
+        for key, _, _ in rows:
+            conn.execute(
+                "UPDATE precompute_jobs SET state = ?, attempts = attempts + 1, updated_at = ? WHERE key = ?",
+                (RUNNING, time.time(), key)
+            )
+        conn.commit()
+        return rows
+
+    def _finish(self, key, error=None):
+        conn = self._connect()
+        conn.execute(
+            "UPDATE precompute_jobs SET state = ?, error = ?, updated_at = ? WHERE key = ?",
+            (FAILED if error else DONE, error, time.time(), key)
+        )
+        conn.commit()
+
+    def _run(self, key, kind, params):
+        try:
+            self.handlers[kind](**json.loads(params))
+            self._finish(key)
+        except Exception as e:
+            log.exception("Precompute job %s failed: %s", key, e)
+            self._finish(key, error=str(e))
+        finally:
+            with self._lock:
+                self._running -= 1
+            self._wake.set()
+
+    def _loop(self):
+        self.schedule_cycle()
+        while not self._stop.is_set():
+            self._wake.clear()
+            if time.time() >= self.next_cycle_at:
+                self.schedule_cycle()
+            with self._lock:
+                free = self.workers - self._running
+            if free > 0 and (self.gate is None or self.gate()):
+                self.flush_touches()
+                for key, kind, params in self._claim(free):
+                    with self._lock:
+                        self._running += 1
+                    self._pool.submit(self._run, key, kind, params)
+            self._wake.wait(timeout=5)
+
+    def _acquire_leader(self):
+        """Take the cross-process lock so only one process runs the scheduler"""
+        if fcntl is None:
+            return True
+        lock_file = open(f"{self.db_path}.lock", 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._leader_lock = lock_file
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if not self._acquire_leader():
+            log.info("Precompute scheduler already running in another process")
+            return
+        # Jobs interrupted by a restart go back on the queue
+        conn = self._connect()
+        conn.execute("UPDATE precompute_jobs SET state = ? WHERE state = ?", (PENDING, RUNNING))
+        conn.commit()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='precompute')
+        self._thread = threading.Thread(target=self._loop, name='precompute-scheduler', daemon=True)
+        self._thread.start()
+        log.info("Precompute scheduler started with %d workers", self.workers)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def status(self):
+        """Queue depth and progress of the current cycle"""
+        counts = dict(self._connect().execute(
+            "SELECT state, COUNT(*) FROM precompute_jobs GROUP BY state"
+        ).fetchall())
+        total = sum(counts.values())
+        finished = counts.get(DONE, 0) + counts.get(FAILED, 0)
+        return {
+            'enabled': self._thread is not None,
+            'workers': self.workers,
+            'queue_depth': counts.get(PENDING, 0),
+            'running': counts.get(RUNNING, 0),
+            'done': counts.get(DONE, 0),
+            'failed': counts.get(FAILED, 0),
+            'progress_percent': round(finished / total * 100, 1) if total else 100.0,
+            'cycle_started_at': _isoformat(self.cycle_started_at),
+            'next_cycle_at': _isoformat(self.next_cycle_at)
+        }
@@ -0,0 +1,77 @@
+"""Single-flight coalescing of identical in-flight computations.
+
+When several requests need the same result at once (users opening the
+same year, or the dashboard panels loading together), only the first
+caller for a key runs the computation; the others wait for it and get the
+same result, or the same exception. Keys are released as soon as the
+computation ends, so later callers go to the caches it filled instead.
+
+do_many() coalesces per key within a batch: a caller computes, in one
+call, only the keys nobody else is computing and waits for the rest.
+Leaders compute before they wait, so two callers leading each other's
+keys cannot deadlock.
+
+Coalescing is per process; workers of a pre-forking server share results
+only once they reach the SQLite caches.
+"""
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """Shares one in-flight computation per key between concurrent callers"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.led = 0
+        self.coalesced = 0
+
+    def do(self, key, compute):
+        """Result of compute(), or of the call already in flight for key"""
+        return self.do_many([key], lambda keys: {key: compute()})[key]
+
+    def do_many(self, keys, compute):
+        """{key: result} for every key.
+
+        compute(keys) is called once with the keys no other caller is
+        computing and returns {key: result} for them (missing keys give None).
+        """
+        leading = []
+        waiting = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                call = self._calls.get(key)
+                if call is None:
+                    self._calls[key] = Future()
+                    leading.append(key)
+                else:
+                    waiting[key] = call
+            self.led += len(leading)
+            self.coalesced += len(waiting)
+
+        results = {}
+        if leading:
+            try:
+                computed = compute(leading)
+            except BaseException as e:
+                self._finish(leading, error=e)
+                raise
+            results = {key: computed.get(key) for key in leading}
+            self._finish(leading, results=results)
+        for key, call in waiting.items():
+            results[key] = call.result()
+        return results
+
+    def _finish(self, keys, results=None, error=None):
+        with self._lock:
+            calls = [self._calls.pop(key) for key in keys]
+        for key, call in zip(keys, calls):
+            if error is not None:
+                call.set_exception(error)
+            else:
+                call.set_result(results[key])
+
+    def stats(self):
+        with self._lock:
+            return {'in_flight': len(self._calls), 'led': self.led, 'coalesced': self.coalesced}
@@ -0,0 +1,93 @@
+"""Startup timing and deferred imports.
+
+app.py imports this module first and records how long each startup phase
+takes: importing its dependencies, opening the caches, parsing the lake
+registry, create_app() and, in the background, initializing Earth Engine.
+The report is logged once startup has finished and served at /ready.
+
+Heavy modules that are not needed to answer requests from the caches
+(the Earth Engine client) are imported with lazy_import(), on first use,
+and that import is timed as a phase of its own.
+"""
+import importlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger('neer.startup')
+
+_started = time.perf_counter()
+_lock = threading.Lock()
+_phases = {}
+_checkpoint = _started
+_finished_ms = None
+
+
+def record(name, ms):
+    """Add a phase to the report (a phase recorded again keeps its first timing)"""
+    with _lock:
+        _phases.setdefault(name, round(ms, 1))
+
+
+def checkpoint(name):
+    """Record the time since the previous checkpoint (or since this module was imported) as a phase"""
+    global _checkpoint
+    now = time.perf_counter()
+    with _lock:
+        started, _checkpoint = _checkpoint, now
+    record(name, (now - started) * 1000)
+
+
+@contextmanager
+def phase(name):
+    """Time the enclosed block as one phase"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, (time.perf_counter() - started) * 1000)
+
+
+def finish(**fields):
+    """Mark startup as finished and log the report, once"""
+    global _finished_ms
+    with _lock:
+        if _finished_ms is not None:
+            return
+        _finished_ms = round((time.perf_counter() - _started) * 1000, 1)
+    log.info("Startup finished in %.0f ms", _finished_ms, extra={'fields': {**report(), **fields}})
+
+
+def report():
+    """{'phases': {name: ms}, 'finished_ms': ms since app.py started importing, or None}"""
+    with _lock:
+        return {'phases': dict(_phases), 'finished_ms': _finished_ms}
+
+
+class LazyModule:
+    """Stands in for a module until an attribute is used, then imports it"""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with phase(f"import_{self._name}"):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,59 @@
+"""Streaming responses: NDJSON and Server-Sent Events.
+
+A client opts in with ``Accept: application/x-ndjson`` or
+``Accept: text/event-stream``, or with ``?stream=ndjson`` / ``?stream=sse``
+where it cannot set headers (EventSource). Records are written as soon as
+they are produced, each as an event name plus JSON data:
+
+* NDJSON - one ``{"event": ..., "data": ...}`` object per line
+* SSE    - ``event: ...`` and ``data: ...`` lines per message
+
+Streams end with a ``summary`` event, or an ``error`` event if producing
+the records failed part way.
+"""
+import logging
+
+from flask import Response, current_app, stream_with_context
+
+log = logging.getLogger('neer.streaming')
+
+MIMETYPES = {
+    'ndjson': 'application/x-ndjson',
+    'sse': 'text/event-stream'
+}
+
+
+def stream_format(request):
+    """'ndjson', 'sse', or None when the client wants a plain JSON response"""
+    requested = request.args.get('stream')
+    if requested in MIMETYPES:
+        return requested
+    # Plain JSON wins ties, so */* and browsers keep the buffered response
+    best = request.accept_mimetypes.best_match(['application/json', *MIMETYPES.values()])
+    for name, mimetype in MIMETYPES.items():
+        if best == mimetype:
+            return name
+    return None
+
+
+def _encode(fmt, event, data):
+    if fmt == 'sse':
+        return f"event: {event}\ndata: {current_app.json.dumps(data, separators=(',', ':'))}\n\n"
+    return current_app.json.dumps({'event': event, 'data': data}, separators=(',', ':')) + "\n"
+
+
+def stream_response(fmt, events):
+    """Response writing (event, data) pairs from an iterable as they arrive"""
+    def generate():
+        try:
+            for event, data in events:
+                yield _encode(fmt, event, data)
+        except Exception as e:
+            log.exception("Stream failed: %s", e)
+            yield _encode(fmt, 'error', {'error': str(e)})
+
+    response = Response(stream_with_context(generate()), mimetype=MIMETYPES[fmt])
+    response.headers['Cache-Control'] = 'no-cache'
+    # Stop reverse proxies (nginx, Railway's edge) from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,214 @@
+"""Persistent per-lake time series of index observations.
+
+One row per (lake, granularity, period) holds the mean of every index,
+the derived BOD and metadata about the composite it came from, in an
+indexed SQLite table. Writes are idempotent upserts; reads are range scans
+on (lake, granularity, period start).
+
+Each row records the lake boundary checksum, engine and algorithm version
+it was computed with. Rows computed from anything else are treated as
+missing, so they are recomputed and overwritten rather than served.
+Periods that are not final yet (the current year) also count as missing
+once they are older than the caller's max_age.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from cache import ALGORITHM_VERSION
+
+DEFAULT_TIMESERIES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'neer_timeseries.sqlite3')
+
+# Column for each index band
+INDEX_COLUMNS = {
+    'NDWI': 'ndwi',
+    'NDCI': 'ndci',
+    'FAI': 'fai',
+    'MCI': 'mci',
+    'Turbidity': 'turbidity',
+    'SWIR_Ratio': 'swir_ratio'
+}
+
+# Lakes per IN (...) query, well under SQLite's bound parameter limit
+MAX_QUERY_LAKES = 500
+
+
+class TimeSeriesStore:
+    """Indexed SQLite store of per-lake, per-period observations"""
+
+    def __init__(self, path=DEFAULT_TIMESERIES_PATH, engine='ee', version=ALGORITHM_VERSION):
+        self.path = path
+        self.engine = engine
+        self.version = version
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Periods callers found stored (hits) or had to compute (misses)
+        self.hits = 0
+        self.misses = 0
+        self._init_db()
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        # A connection must not be used across fork(); workers of a
+        # pre-forking server open their own
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS observations ("
+            " lake_id TEXT NOT NULL,"
+            " granularity TEXT NOT NULL,"
+            " period TEXT NOT NULL,"
+            " period_start TEXT NOT NULL,"
+            " period_end TEXT NOT NULL,"
+            + "".join(f" {column} REAL," for column in INDEX_COLUMNS.values()) +
+            " bod REAL,"
+            " metadata TEXT,"
+            " final INTEGER NOT NULL DEFAULT 0,"
+            " lake_checksum TEXT NOT NULL,"
+            " engine TEXT NOT NULL,"
+            " algorithm_version INTEGER NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " PRIMARY KEY (lake_id, granularity, period))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS observations_range"
+            " ON observations (lake_id, granularity, period_start)"
+        )
+        conn.commit()
+
+    def upsert(self, lake, granularity, observations):
+        """Insert or replace observations for one lake.
+
+        observations: iterable of dicts with period, start, end, stats
+        ({band: mean}), bod, final and optional metadata
+        """
+        return self.upsert_many(granularity, ((lake, obs) for obs in observations))
+
+    def upsert_many(self, granularity, observations):
+        """Insert or replace (lake, observation) pairs of many lakes in one transaction"""
+        now = time.time()
+        rows = [
+            (
+                lake.id, granularity, str(obs['period']), obs['start'], obs['end'],
+                *(obs['stats'].get(band) for band in INDEX_COLUMNS),
+                obs.get('bod'),
+                json.dumps(obs.get('metadata') or {}, sort_keys=True),
+                int(bool(obs.get('final'))),
+                lake.checksum, self.engine, self.version, now
+            )
+            for lake, obs in observations
+        ]
+        if not rows:
+            return 0
+        columns = ", ".join(INDEX_COLUMNS.values())
+        placeholders = ", ".join("?" * (len(INDEX_COLUMNS) + 12))
+        updates = ", ".join(
+            f"{column} = excluded.{column}"
+            for column in [
+                'period_start', 'period_end', *INDEX_COLUMNS.values(), 'bod', 'metadata',
+                'final', 'lake_checksum', 'engine', 'algorithm_version', 'updated_at'
+            ]
+        )
+        conn = self._connect()
+        conn.executemany(
+            f"INSERT INTO observations (lake_id, granularity, period, period_start, period_end, {columns},"
+            " bod, metadata, final, lake_checksum, engine, algorithm_version, updated_at)"
+            f" VALUES ({placeholders})"
+            f" ON CONFLICT(lake_id, granularity, period) DO UPDATE SET {updates}",
+            rows
+        )
+        conn.commit()
+        return len(rows)
+
+    def _rows(self, lake, granularity, where, params, max_age):
+        """Current rows for a lake; max_age (seconds) applies to non-final rows"""
+        query = (
+            "SELECT * FROM observations WHERE lake_id = ? AND granularity = ?"
+            " AND lake_checksum = ? AND engine = ? AND algorithm_version = ?"
+            f" AND {where}"
+        )
+        params = [lake.id, granularity, lake.checksum, self.engine, self.version, *params]
+        if max_age is not None:
+            query += " AND (final = 1 OR updated_at >= ?)"
+            params.append(time.time() - max_age)
+        return self._connect().execute(query + " ORDER BY period_start", params).fetchall()
+
+    def get(self, lake, granularity, periods, max_age=None):
+        """{period: observation} for the requested periods that are stored and current"""
+        periods = [str(period) for period in periods]
+        if not periods:
+            return {}
+        rows = self._rows(
+            lake, granularity,
+            f"period IN ({', '.join('?' * len(periods))})", periods,
+            max_age
+        )
+        return {row['period']: self._observation(row) for row in rows}
+
+    def range(self, lake, granularity, start, end, max_age=None):
+        """Observations whose period starts within [start, end] (ISO dates), oldest first"""
+        rows = self._rows(lake, granularity, "period_start BETWEEN ? AND ?", [start, end], max_age)
+        return [self._observation(row) for row in rows]
+
+    def range_many(self, lakes, granularity, start, end, max_age=None):
+        """{lake id: {period: observation}} for several lakes, one range scan per MAX_QUERY_LAKES"""
+        lakes = list(lakes)
+        checksums = {lake.id: lake.checksum for lake in lakes}
+        observations = {lake.id: {} for lake in lakes}
+        conn = self._connect()
+        for i in range(0, len(lakes), MAX_QUERY_LAKES):
+            ids = [lake.id for lake in lakes[i:i + MAX_QUERY_LAKES]]
+            query = (
+                f"SELECT * FROM observations WHERE lake_id IN ({', '.join('?' * len(ids))})"
+                " AND granularity = ? AND engine = ? AND algorithm_version = ?"
+                " AND period_start BETWEEN ? AND ?"
+            )
+            params = [*ids, granularity, self.engine, self.version, start, end]
+            if max_age is not None:
+                query += " AND (final = 1 OR updated_at >= ?)"
+                params.append(time.time() - max_age)
+            for row in conn.execute(query + " ORDER BY period_start", params):
+                # Each lake has its own boundary checksum
+                if row['lake_checksum'] == checksums[row['lake_id']]:
+                    observations[row['lake_id']][row['period']] = self._observation(row)
+        return observations
+
+    @staticmethod
+    def _observation(row):
+        return {
+            'period': row['period'],
+            'start': row['period_start'],
+            'end': row['period_end'],
+            'stats': {band: row[column] for band, column in INDEX_COLUMNS.items()},
+            'bod': row['bod'],
+            'metadata': json.loads(row['metadata'] or '{}'),
+            'final': bool(row['final']),
+            'updated_at': row['updated_at']
+        }
+
+    def count_lookups(self, hits, misses):
+        """Record how many requested periods were stored and how many were missing"""
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def lookups(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
+
+    def stats(self):
+        conn = self._connect()
+        count, lakes = conn.execute(
+            "SELECT COUNT(*), COUNT(DISTINCT lake_id) FROM observations"
+        ).fetchone()
+        return {'observations': count, 'lakes': lakes, **self.lookups()}
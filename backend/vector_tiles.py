@@ -0,0 +1,255 @@
+"""Mapbox Vector Tiles (MVT 2.1) for lake outlines and catchments.
+
+Lake outlines and their 2 km catchment buffers are projected to Web
+Mercator once per registry snapshot and indexed in an STRtree, so a tile
+only looks at the lakes that reach it. Each tile clips them to its extent
+(plus a small buffer), simplifies them to the tile's resolution, snaps
+them to the integer tile grid and encodes them. The protobuf encoding is
+written out by hand; the format needs only varints and length-delimited
+fields.
+
+Layers:
+
+* ``lakes``      - outlines, with the latest cached metrics as attributes
+* ``catchments`` - the buffers used for land cover analysis
+"""
+import math
+import struct
+
+import numpy as np
+import shapely
+from shapely.affinity import affine_transform
+from shapely.geometry import MultiPolygon, Polygon, box
+from shapely.geometry.polygon import orient
+
+from lake_registry import iter_polygons
+
+EXTENT = 4096
+# Tile units drawn outside the tile so strokes do not show seams
+BUFFER = 64
+MAX_ZOOM = 22
+# Simplification tolerance in tile units (16 units = 1 pixel of a 256 px tile)
+SIMPLIFY_TOLERANCE = 4
+
+MERCATOR_RADIUS = 6378137.0
+MERCATOR_HALF_WORLD = math.pi * MERCATOR_RADIUS
+MAX_LATITUDE = 85.0511287798
+
+MOVE_TO, LINE_TO, CLOSE_PATH = 1, 2, 7
+POLYGON = 3
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 63)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, payload):
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _uint_field(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(value) for value in values))
+
+
+def _encode_value(value):
+    """An MVT Value message"""
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        return _uint_field(6, _zigzag(value))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def _command(command, count):
+    return (command & 0x7) | (count << 3)
+
+
+def encode_polygons(polygons):
+    """MVT geometry commands for polygons already in (oriented) tile coordinates"""
+    commands = []
+    cursor_x = cursor_y = 0
+    for polygon in polygons:
+        for ring in [polygon.exterior, *polygon.interiors]:
+            # The closing point is implied by ClosePath
+            points = [(int(x), int(y)) for x, y in ring.coords[:-1]]
+            if len(points) < 3:
+                continue
+            for index, (x, y) in enumerate(points):
+                if index == 0:
+                    commands.append(_command(MOVE_TO, 1))
+                elif index == 1:
+                    commands.append(_command(LINE_TO, len(points) - 1))
+                commands.append(_zigzag(x - cursor_x))
+                commands.append(_zigzag(y - cursor_y))
+                cursor_x, cursor_y = x, y
+            commands.append(_command(CLOSE_PATH, 1))
+    return commands
+
+
+def encode_layer(name, features):
+    """An MVT Layer message; features are (id, properties, geometry commands)"""
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+    for feature_id, properties, commands in features:
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_id = (type(value).__name__, value)
+            if value_id not in value_index:
+                value_index[value_id] = len(values)
+                values.append(value)
+            tags.extend((key_index[key], value_index[value_id]))
+        encoded_features.append(_bytes_field(2, b''.join([
+            _uint_field(1, feature_id),
+            _packed_field(2, tags),
+            _uint_field(3, POLYGON),
+            _packed_field(4, commands)
+        ])))
+    return b''.join([
+        _uint_field(15, 2),
+        _bytes_field(1, name.encode('utf-8')),
+        *encoded_features,
+        *(_bytes_field(3, key.encode('utf-8')) for key in keys),
+        *(_bytes_field(4, _encode_value(value)) for value in values),
+        _uint_field(5, EXTENT)
+    ])
+
+
+def encode_tile(layers):
+    """An MVT Tile message from {layer name: features}; empty layers are left out"""
+    return b''.join(
+        _bytes_field(3, encode_layer(name, features))
+        for name, features in layers.items() if features
+    )
+
+
+def to_mercator(coords):
+    """(N, 2) lon/lat array to Web Mercator metres"""
+    lon = np.radians(coords[:, 0])
+    lat = np.radians(coords[:, 1].clip(-MAX_LATITUDE, MAX_LATITUDE))
+    return np.column_stack([
+        MERCATOR_RADIUS * lon,
+        MERCATOR_RADIUS * np.log(np.tan(np.pi / 4 + lat / 2))
+    ])
+
+
+def tile_bounds(z, x, y):
+    """(minx, miny, maxx, maxy) of a tile in Web Mercator metres"""
+    size = 2 * MERCATOR_HALF_WORLD / (2 ** z)
+    minx = -MERCATOR_HALF_WORLD + x * size
+    maxy = MERCATOR_HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds, z):
+    """Columns and rows of the zoom z tiles covering Web Mercator bounds"""
+    size = 2 * MERCATOR_HALF_WORLD / (2 ** z)
+    last = 2 ** z - 1
+    minx, miny, maxx, maxy = bounds
+    cols = range(
+        max(0, math.floor((minx + MERCATOR_HALF_WORLD) / size)),
+        min(last, math.floor((maxx + MERCATOR_HALF_WORLD) / size)) + 1
+    )
+    rows = range(
+        max(0, math.floor((MERCATOR_HALF_WORLD - maxy) / size)),
+        min(last, math.floor((MERCATOR_HALF_WORLD - miny) / size)) + 1
+    )
+    return cols, rows
+
+
+class TileSource:
+    """Lake outlines and catchments in Web Mercator, ready to cut into tiles"""
+
+    def __init__(self, lakes, catchment_m):
+        self.lakes = tuple(lakes)
+        self.catchment_m = catchment_m
+        self.outlines = []
+        self.catchments = []
+        for lake in self.lakes:
+            outline = shapely.transform(
+                MultiPolygon([Polygon(rings[0], rings[1:]) for rings in iter_polygons(lake.geojson)]),
+                to_mercator
+            ).buffer(0)
+            # Mercator stretches distances by 1 / cos(latitude)
+            stretch = 1 / math.cos(math.radians(lake.centroid[1]))
+            self.outlines.append(outline)
+            self.catchments.append(outline.buffer(catchment_m * stretch))
+        self.bounds = shapely.total_bounds(self.catchments) if self.catchments else None
+        self.index = shapely.STRtree(self.catchments)
+
+    def _cut(self, geometry, bounds):
+        """Clip, simplify and snap a Web Mercator geometry to tile coordinates"""
+        minx, miny, maxx, maxy = bounds
+        scale = EXTENT / (maxx - minx)
+        local = affine_transform(geometry, [scale, 0, 0, -scale, -minx * scale, maxy * scale])
+        clipped = local.intersection(box(-BUFFER, -BUFFER, EXTENT + BUFFER, EXTENT + BUFFER))
+        simplified = clipped.simplify(SIMPLIFY_TOLERANCE, preserve_topology=True)
+        snapped = shapely.set_precision(simplified, grid_size=1)
+        # MVT exterior rings have positive area in tile coordinates (y down)
+        return [orient(part, sign=1.0) for part in getattr(snapped, 'geoms', [snapped])
+                if part.geom_type == 'Polygon' and not part.is_empty]
+
+    def render(self, z, x, y, metrics=None):
+        """Encoded tile; metrics maps lake id to attributes for the lakes layer"""
+        bounds = tile_bounds(z, x, y)
+        pad = BUFFER * (bounds[2] - bounds[0]) / EXTENT
+        area = box(bounds[0] - pad, bounds[1] - pad, bounds[2] + pad, bounds[3] + pad)
+        metrics = metrics or {}
+
+        lakes, catchments = [], []
+        for index in sorted(self.index.query(area, predicate='intersects')):
+            lake = self.lakes[index]
+            catchment = encode_polygons(self._cut(self.catchments[index], bounds))
+            if catchment:
+                catchments.append((index + 1, {
+                    'id': lake.id,
+                    'name': lake.name,
+                    'buffer_m': self.catchment_m
+                }, catchment))
+            if self.outlines[index].intersects(area):
+                outline = encode_polygons(self._cut(self.outlines[index], bounds))
+                if outline:
+                    properties = {'id': lake.id, 'name': lake.name, 'area_m2': round(lake.area_m2)}
+                    properties.update(metrics.get(lake.id, {}))
+                    lakes.append((index + 1, properties, outline))
+
+        return encode_tile({'catchments': catchments, 'lakes': lakes})
+
+    def tiles(self, zooms):
+        """(z, x, y) of every tile touching a catchment at the given zoom levels"""
+        if self.bounds is None:
+            return
+        for z in zooms:
+            cols, rows = tile_range(self.bounds, z)
+            for x in cols:
+                for y in rows:
+                    # Lakes spread over a district leave most tiles of their extent empty
+                    if len(self.index.query(box(*tile_bounds(z, x, y)), predicate='intersects')):
+                        yield z, x, y
@@ -0,0 +1,9 @@
+"""WSGI entry point for production servers: gunicorn -c gunicorn.conf.py wsgi:app"""
+import os
+
+from app import app, create_app
+
+# With gunicorn.conf.py each worker initializes itself in post_fork, so a
+# preloading master never talks to Earth Engine or starts threads
+if os.environ.get('NEER_INIT_IN_WORKERS') != '1':
+    create_app()
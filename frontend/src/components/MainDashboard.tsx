@@ -20,7 +20,7 @@ import IndexChart from "./IndexChart";
 import AlertsPanel from "./AlertsPanel";
 import HistoricalTrends from "./HistoricalTrends";
 import PollutionMappingPanel from "./PollutionMappingPanel";
-import { getAllLakes, Lake } from "../services/apiService";
+import { dataYears, streamAllLakes, Lake } from "../services/apiService";
 import "leaflet/dist/leaflet.css";
 
 interface TabPanelProps {
@@ -53,26 +53,38 @@ const MainDashboard: React.FC = () => {
   const [tabValue, setTabValue] = useState(0);
 
   useEffect(() => {
-    fetchLakeData();
+    // Stop the previous year's stream so its lakes are not added to this one
+    const controller = new AbortController();
+    fetchLakeData(controller.signal);
+    return () => controller.abort();
   }, [selectedYear]);
 
   const handleTabChange = (event: React.SyntheticEvent, newValue: number) => {
     setTabValue(newValue);
   };
 
-  const fetchLakeData = async () => {
+  const fetchLakeData = async (signal: AbortSignal) => {
     try {
       setLoading(true);
       console.log('Fetching lake data for year:', selectedYear);
-      const data = await getAllLakes(selectedYear);
+      setLakes([]);
+      // Show each lake as soon as the backend has it
+      const data = await streamAllLakes(selectedYear, (lake) => {
+        setLakes((previous) => [...previous, lake]);
+        setLoading(false);
+      }, signal);
       console.log('Received lake data:', data);
-      setLakes(data);
     } catch (error) {
+      if (signal.aborted) {
+        return;
+      }
       console.error("Error fetching lake data:", error);
       // Add an alert to show the user what's wrong
       alert(`Error fetching lake data: ${error}`);
     } finally {
-      setLoading(false);
+      if (!signal.aborted) {
+        setLoading(false);
+      }
     }
   };
 
@@ -124,7 +136,7 @@ const MainDashboard: React.FC = () => {
               onChange={(e) => setSelectedYear(e.target.value as number)}
               label="Select Year"
             >
-              {Array.from({ length: 10 }, (_, i) => 2024 - i).map((year) => (
+              {dataYears().map((year) => (
                 <MenuItem key={year} value={year}>
                   {year}
                 </MenuItem>
@@ -146,10 +158,10 @@ const MainDashboard: React.FC = () => {
                 attribution='&copy; <a href="https://www.openstreetmap.org/copyright">OpenStreetMap</a> contributors'
               />
 
-              {lakes.map((lake) => (
+              {lakes.filter((lake) => lake.geometry).map((lake) => (
                 <GeoJSON
                   key={lake.id}
-                  data={lake.geometry}
+                  data={lake.geometry!}
                   style={{
                     fillColor: getHealthColor(lake.waterHealth),
                     fillOpacity: 0.6,
@@ -1,6 +1,20 @@
+import { FeatureCollection, Polygon } from "geojson";
+
 // Use environment variable for API URL, fallback to localhost for development
 const API_BASE_URL = process.env.REACT_APP_API_URL || "http://localhost:5000/api";
 
+// First year with Sentinel-2 surface reflectance data (FIRST_YEAR in backend/periods.py)
+export const FIRST_YEAR = 2017;
+
+// Years the API accepts, newest first: FIRST_YEAR to the current year
+export const dataYears = (): number[] => {
+  const years: number[] = [];
+  for (let year = new Date().getFullYear(); year >= FIRST_YEAR; year--) {
+    years.push(year);
+  }
+  return years;
+};
+
 export interface Lake {
   id: string;
   name: string;
@@ -14,10 +28,38 @@ export interface Lake {
   waterHealth: string;
   pollutionCauses: string;
   suggestions: string;
-  geometry: any;
+  geometry?: FeatureCollection;
   year: number;
 }
 
+// Lake outlines as served by /lakes/geometries (TopoJSON, quantized and delta-encoded)
+export interface LakeTopology {
+  type: "Topology";
+  zoom: number;
+  bbox: number[];
+  transform: {
+    scale: [number, number];
+    translate: [number, number];
+  };
+  objects: {
+    lakes: {
+      type: "GeometryCollection";
+      geometries: {
+        type: "MultiPolygon";
+        id: string;
+        properties: {
+          name: string;
+          bbox: number[];
+          centroid: number[];
+          area_m2: number;
+        };
+        arcs: number[][][];
+      }[];
+    };
+  };
+  arcs: number[][][];
+}
+
 export interface HistoricalData {
   year: number;
   ndwi: number;
@@ -29,10 +71,17 @@ export interface HistoricalData {
   trend: string;
   turbidity: number;
   swir_ratio: number;
+  // Set for granularities finer than annual
+  period?: string;
+  start?: string;
+  end?: string;
 }
 
+export type Granularity = "annual" | "seasonal" | "monthly" | "rolling";
+
 export interface HistoricalResponse {
   historical_data: HistoricalData[];
+  granularity?: string;
   trend_analysis: {
     overall_trend: string;
     trend_counts: {
@@ -44,6 +93,37 @@ export interface HistoricalResponse {
   };
 }
 
+// Columnar history of several lakes: each field holds one row per period,
+// with one value per lake (null where the lake has no data)
+export interface HistoryMatrix {
+  granularity: string;
+  lakes: string[];
+  periods: string[];
+  start: string[];
+  end: string[];
+  indices: {
+    ndwi?: (number | null)[][];
+    ndci?: (number | null)[][];
+    fai?: (number | null)[][];
+    mci?: (number | null)[][];
+    turbidity?: (number | null)[][];
+    swir_ratio?: (number | null)[][];
+    bodLevel?: (number | null)[][];
+    waterHealth?: (string | null)[][];
+    trend?: (string | null)[][];
+  };
+  trend_analysis: {
+    overall_trend: string[];
+    trend_counts: {
+      improving: number[];
+      degrading: number[];
+      stable: number[];
+    };
+    data_points: number[];
+  };
+  failed: string[];
+}
+
 export interface Alert {
   id: string;
   lake_name: string;
@@ -84,28 +164,198 @@ export interface PollutionMapping {
   recommendations: string[];
 }
 
-export const getAllLakes = async (year: number = 2024): Promise<Lake[]> => {
-  const response = await fetch(`${API_BASE_URL}/lakes?year=${year}`);
+const decodeArc = (arc: number[][], topology: LakeTopology): number[][] => {
+  const [scaleX, scaleY] = topology.transform.scale;
+  const [translateX, translateY] = topology.transform.translate;
+  let x = 0;
+  let y = 0;
+  return arc.map(([dx, dy]) => {
+    x += dx;
+    y += dy;
+    return [x * scaleX + translateX, y * scaleY + translateY];
+  });
+};
+
+// One GeoJSON FeatureCollection per lake id
+export const decodeLakeGeometries = (
+  topology: LakeTopology
+): Record<string, FeatureCollection> => {
+  const rings = topology.arcs.map((arc) => decodeArc(arc, topology));
+  const geometries: Record<string, FeatureCollection> = {};
+  topology.objects.lakes.geometries.forEach((lake) => {
+    geometries[lake.id] = {
+      type: "FeatureCollection",
+      features: lake.arcs.map((polygon) => ({
+        type: "Feature",
+        properties: { name: lake.properties.name },
+        geometry: {
+          type: "Polygon",
+          coordinates: polygon.map(([index]) => rings[index]),
+        } as Polygon,
+      })),
+    };
+  });
+  return geometries;
+};
+
+// Outlines never change between years, so each zoom level is fetched once
+const geometryRequests = new Map<number, Promise<Record<string, FeatureCollection>>>();
+
+export const getLakeGeometries = (
+  zoom: number = 14
+): Promise<Record<string, FeatureCollection>> => {
+  if (!geometryRequests.has(zoom)) {
+    const request = fetch(`${API_BASE_URL}/lakes/geometries?zoom=${zoom}`)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error("Failed to fetch lake geometries");
+        }
+        return response.json();
+      })
+      .then(decodeLakeGeometries)
+      .catch((error) => {
+        geometryRequests.delete(zoom);
+        throw error;
+      });
+    geometryRequests.set(zoom, request);
+  }
+  return geometryRequests.get(zoom)!;
+};
+
+export const getAllLakes = async (year: number = 2024, zoom: number = 13): Promise<Lake[]> => {
+  const [response, geometries] = await Promise.all([
+    fetch(`${API_BASE_URL}/lakes?year=${year}`),
+    getLakeGeometries(zoom).catch((error) => {
+      console.error("Error fetching lake geometries:", error);
+      return {} as Record<string, FeatureCollection>;
+    }),
+  ]);
   if (!response.ok) {
     throw new Error("Failed to fetch lakes data");
   }
-  return response.json();
+  const lakes: Lake[] = await response.json();
+  return lakes.map((lake) => ({ ...lake, geometry: geometries[lake.id] }));
+};
+
+export interface StreamEvent<T> {
+  event: "lake" | "point" | "summary" | "error";
+  data: T;
+}
+
+// Reads an NDJSON stream (see backend/streaming.py), calling onEvent per line
+const streamNdjson = async (
+  url: string,
+  onEvent: (event: StreamEvent<any>) => void,
+  signal?: AbortSignal
+) => {
+  const response = await fetch(url, { headers: { Accept: "application/x-ndjson" }, signal });
+  if (!response.ok || !response.body) {
+    throw new Error(`Failed to stream ${url}`);
+  }
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = "";
+  for (;;) {
+    const { done, value } = await reader.read();
+    buffered += decoder.decode(value, { stream: !done });
+    const lines = buffered.split("\n");
+    buffered = lines.pop() ?? "";
+    for (const line of lines) {
+      if (line.trim()) {
+        onEvent(JSON.parse(line));
+      }
+    }
+    if (done) {
+      return;
+    }
+  }
+};
+
+// Like getAllLakes, but calls onLake as each lake arrives; aborting signal
+// cancels the stream and no further lakes are passed to onLake
+export const streamAllLakes = async (
+  year: number,
+  onLake: (lake: Lake) => void,
+  signal?: AbortSignal,
+  zoom: number = 13
+): Promise<Lake[]> => {
+  const geometries = getLakeGeometries(zoom).catch((error) => {
+    console.error("Error fetching lake geometries:", error);
+    return {} as Record<string, FeatureCollection>;
+  });
+  const lakes: Lake[] = [];
+  const pending: Promise<void>[] = [];
+  await streamNdjson(`${API_BASE_URL}/lakes?year=${year}`, (event) => {
+    if (event.event === "lake") {
+      pending.push(
+        geometries.then((byId) => {
+          if (signal?.aborted) {
+            return;
+          }
+          const lake = { ...event.data, geometry: byId[event.data.id] };
+          lakes.push(lake);
+          onLake(lake);
+        })
+      );
+    } else if (event.event === "error") {
+      throw new Error(event.data.error);
+    }
+  }, signal);
+  await Promise.all(pending);
+  return lakes;
 };
 
 export const getLakeHistory = async (
   lakeId: string,
   startYear: number = 2020,
-  endYear: number = 2024
+  endYear: number = 2024,
+  granularity: Granularity = "annual",
+  days?: number
 ): Promise<HistoricalResponse> => {
-  const response = await fetch(
-    `${API_BASE_URL}/lakes/${lakeId}/history?start_year=${startYear}&end_year=${endYear}`
-  );
+  const params = new URLSearchParams({
+    start_year: String(startYear),
+    end_year: String(endYear),
+    granularity,
+  });
+  if (days) {
+    params.set("days", String(days));
+  }
+  const response = await fetch(`${API_BASE_URL}/lakes/${lakeId}/history?${params}`);
   if (!response.ok) {
     throw new Error("Failed to fetch lake history");
   }
   return response.json();
 };
 
+export const getHistoryMatrix = async (
+  lakeIds: string[] = [],
+  startYear: number = 2020,
+  endYear: number = 2024,
+  indices: string[] = [],
+  granularity: Granularity = "annual",
+  days?: number
+): Promise<HistoryMatrix> => {
+  const params = new URLSearchParams({
+    start: String(startYear),
+    end: String(endYear),
+    granularity,
+  });
+  if (lakeIds.length) {
+    params.set("lakes", lakeIds.join(","));
+  }
+  if (indices.length) {
+    params.set("indices", indices.join(","));
+  }
+  if (days) {
+    params.set("days", String(days));
+  }
+  const response = await fetch(`${API_BASE_URL}/history?${params}`);
+  if (!response.ok) {
+    throw new Error("Failed to fetch lake histories");
+  }
+  return response.json();
+};
+
 export const getWaterQualityAlerts = async (): Promise<AlertsResponse> => {
   const response = await fetch(`${API_BASE_URL}/alerts`);
   if (!response.ok) {